@@ -28,22 +28,55 @@ def create_app(config_object=None):
     from blueprints.webhooks import webhooks_bp
     from blueprints.public_api import public_api_bp
     from blueprints.settings import settings_bp
-    from blueprints.scheduler import scheduler_bp
+    from blueprints.scheduler_bp import scheduler_bp
+    from blueprints.health import health_bp
+    from blueprints.pipelines import pipelines_bp
+    from blueprints.results import results_bp
     app.register_blueprint(extraction_bp)
     app.register_blueprint(scripts_bp)
     app.register_blueprint(webhooks_bp)
     app.register_blueprint(scheduler_bp)
     app.register_blueprint(public_api_bp)
     app.register_blueprint(settings_bp)
+    app.register_blueprint(health_bp)
+    app.register_blueprint(pipelines_bp)
+    app.register_blueprint(results_bp)
 
+    # Schema/data migrations run once and are skipped on warm boots via persisted markers
+    from services.migrations import run_migrations
     with app.app_context():
-        db.create_all()
-        _migrate_existing_data(app)
+        run_migrations(app)
+
+    # Load precompiled rule-set artifacts, if any are configured
+    from services.ruleset import load_artifacts
+    load_artifacts(app)
+
+    # Start runner workers (and warm interpreters when RUNNER_BACKEND='warm')
+    from services.script_runner import init_runner
+    init_runner(app)
+
+    # Pipeline runs whose process died with them can never finish; close them
+    from services.pipeline_runner import recover_runs
+    recover_runs(app)
 
     # Start scheduler and re-register persisted jobs (outside app_context — scheduler is global)
     from services.scheduler_service import init_scheduler
     init_scheduler(app)
 
+    # Background Gist sync outbox worker, plus the optional periodic reconciliation
+    from services.gist_sync import init_gist_sync
+    from services.gist_reconcile import schedule_reconcile
+    init_gist_sync(app)
+    schedule_reconcile(app)
+
+    # Optional retention of spooled webhook payloads (WEBHOOK_PAYLOAD_RETENTION_DAYS)
+    from services.webhook_ingest import schedule_payload_pruning
+    schedule_payload_pruning(app)
+
+    # Optional watched drop folder (DROP_FOLDER)
+    from services.drop_folder import init_drop_folder
+    init_drop_folder(app)
+
     # Enable CORS
     from flask_cors import CORS
     CORS(app)
@@ -51,43 +84,5 @@ def create_app(config_object=None):
     return app
 
 
-def _migrate_existing_data(app):
-    """One-time migration: import rules.json and scripts/*.py into the database."""
-    from models.rule import ExtractionRule
-    from models.script import Script
-
-    # Migrate rules from config/rules.json
-    rules_file = app.config['RULES_FILE']
-    if os.path.exists(rules_file):
-        try:
-            with open(rules_file, 'r') as f:
-                rules = json.load(f)
-            for rule in rules:
-                if rule.get('field_name') and rule.get('regex'):
-                    exists = ExtractionRule.query.filter_by(
-                        field_name=rule['field_name'],
-                        regex=rule['regex']
-                    ).first()
-                    if not exists:
-                        db.session.add(ExtractionRule(
-                            id=rule.get('id'),
-                            field_name=rule['field_name'],
-                            regex=rule['regex'],
-                        ))
-            db.session.commit()
-        except Exception as e:
-            print(f"Warning: could not migrate rules: {e}")
-
-    # Migrate scripts/*.py files
-    scripts_folder = app.config['SCRIPTS_FOLDER']
-    if os.path.exists(scripts_folder):
-        for filename in os.listdir(scripts_folder):
-            if filename.endswith('.py'):
-                exists = Script.query.filter_by(filename=filename).first()
-                if not exists:
-                    db.session.add(Script(name=filename, filename=filename))
-        db.session.commit()
-
-
 if __name__ == '__main__':
     create_app().run(debug=True, use_reloader=False)
@@ -1,11 +1,20 @@
 import os
 import uuid
 import json
-from flask import Blueprint, request, jsonify, render_template, send_from_directory, current_app, Response
+from flask import Blueprint, request, jsonify, render_template, send_from_directory, current_app, Response, stream_with_context
 from extensions import db
 from models.rule import ExtractionRule
 from models.template import ExtractionTemplate
-from extraction_engine import extract_text_from_pdf, apply_rules
+from services.exporter import ExportError, FORMATS, stream_export
+from services.results_store import extract_document, get_document
+from services.reextract import start_job as start_reextract
+from services.template_classifier import (
+    classify, document_features, index_stats as classifier_stats, invalidate as invalidate_classifier,
+)
+from services.ruleset import (
+    RuleSetError, export_ruleset, parse_artifact, register_ruleset, unregister_ruleset,
+    list_rulesets, persist_ruleset, reload_artifacts, diff_rulesets, resolve_rules, get_ruleset,
+)
 
 extraction_bp = Blueprint('extraction', __name__)
 
@@ -50,10 +59,12 @@ def manage_templates():
         if not name:
             return jsonify({'error': 'Name is required'}), 400
             
-        template = ExtractionTemplate(name=name, description=description)
+        template = ExtractionTemplate(name=name, description=description,
+                                      filename_pattern=data.get('filename_pattern') or None)
         db.session.add(template)
         try:
             db.session.commit()
+            invalidate_classifier()
             return jsonify(template.to_dict()), 201
         except Exception as e:
             db.session.rollback()
@@ -67,14 +78,40 @@ def template_detail(template_id):
         data = request.json
         template.name = data.get('name', template.name)
         template.description = data.get('description', template.description)
+        if 'filename_pattern' in data:
+            template.filename_pattern = data['filename_pattern'] or None
         db.session.commit()
+        invalidate_classifier()
         return jsonify(template.to_dict())
         
     elif request.method == 'DELETE':
         db.session.delete(template)
         db.session.commit()
+        _rules_changed(None)  # Its rules were part of the all-rules set
         return jsonify({'message': 'Template deleted'})
 
+@extraction_bp.route('/api/templates/classify', methods=['POST'])
+def classify_uploaded():
+    """Which template an uploaded PDF would be extracted with, and the runner-up scores."""
+    filename = (request.json or {}).get('filename')
+    if not filename:
+        return jsonify({'error': 'Filename is required'}), 400
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], os.path.basename(filename))
+    if not os.path.exists(filepath):
+        return jsonify({'error': 'File not found'}), 404
+    try:
+        document, _ = get_document(filepath)
+        db.session.commit()
+        return jsonify(classify(current_app, document_features(document)))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@extraction_bp.route('/api/templates/classifier', methods=['GET'])
+def classifier_index():
+    return jsonify(classifier_stats(current_app))
+
 # --- Rule Management ---
 
 @extraction_bp.route('/api/templates/<template_id>/rules', methods=['GET', 'POST'])
@@ -94,7 +131,7 @@ def manage_template_rules(template_id):
         )
         db.session.add(rule)
         db.session.commit()
-        return jsonify(rule.to_dict()), 201
+        return jsonify(_with_warning(rule.to_dict(), _rules_changed(template_id))), 201
 
 @extraction_bp.route('/api/templates/<template_id>/rules/<rule_id>', methods=['PUT', 'DELETE'])
 def manage_template_rule_detail(template_id, rule_id):
@@ -109,12 +146,127 @@ def manage_template_rule_detail(template_id, rule_id):
         rule.field_name = data.get('field_name', rule.field_name)
         rule.regex = data.get('regex', rule.regex)
         db.session.commit()
-        return jsonify(rule.to_dict())
+        return jsonify(_with_warning(rule.to_dict(), _rules_changed(template_id)))
 
     elif request.method == 'DELETE':
         db.session.delete(rule)
         db.session.commit()
-        return jsonify({'message': 'Rule deleted', 'id': rule_id})
+        return jsonify(_with_warning({'message': 'Rule deleted', 'id': rule_id}, _rules_changed(template_id)))
+
+
+def _rules_changed(template_id):
+    """
+    Rebuild the classifier index and bring stored results up to date in the
+    background: the template's, and those extracted without a template,
+    which ran every rule.
+
+    Returns a warning when a rule-set artifact loaded in this process
+    overrides the template's DB rules: the edit is saved but extraction
+    keeps using the artifact until it is unloaded.
+    """
+    invalidate_classifier()
+    overridden = bool(template_id) and get_ruleset(template_id) is not None
+    if current_app.config.get('REEXTRACT_ON_RULE_CHANGE'):
+        app = current_app._get_current_object()
+        if template_id and not overridden:
+            start_reextract(app, template_id)
+        start_reextract(app, None)
+    if overridden:
+        return (f"A loaded rule-set artifact overrides this template's rules; the change is saved but "
+                f"has no effect until the artifact is unloaded (DELETE /api/rulesets/{template_id})")
+    return None
+
+
+def _with_warning(body, warning):
+    if warning:
+        body['warning'] = warning
+    return body
+
+# --- Rule-Set Artifacts ---
+
+@extraction_bp.route('/api/templates/<template_id>/ruleset', methods=['GET'])
+def export_template_ruleset(template_id):
+    """Download the template's validated rule set as a hashed artifact."""
+    template = ExtractionTemplate.query.get_or_404(template_id)
+    try:
+        artifact = export_ruleset(template)
+    except RuleSetError as e:
+        return jsonify({'error': str(e)}), 422
+
+    return Response(
+        json.dumps(artifact, indent=2),
+        mimetype="application/json",
+        headers={
+            "Content-disposition": f"attachment; filename=ruleset_{template.id}.json",
+            "ETag": f'"{artifact["content_hash"]}"',
+        }
+    )
+
+
+@extraction_bp.route('/api/templates/<template_id>/ruleset/diff', methods=['POST'])
+def diff_template_ruleset(template_id):
+    """Compare an artifact (request body) against the template's current DB rules."""
+    template = ExtractionTemplate.query.get_or_404(template_id)
+    try:
+        current = export_ruleset(template)
+        incoming = parse_artifact(request.json).to_artifact()
+    except RuleSetError as e:
+        return jsonify({'error': str(e)}), 422
+
+    result = diff_rulesets(current['rules'], incoming['rules'])
+    result['current_hash'] = current['content_hash']
+    result['incoming_hash'] = incoming['content_hash']
+    result['identical'] = current['content_hash'] == incoming['content_hash']
+    return jsonify(result)
+
+
+@extraction_bp.route('/api/rulesets', methods=['GET'])
+def loaded_rulesets():
+    """List rule-set artifacts currently loaded in this process."""
+    return jsonify(list_rulesets())
+
+
+@extraction_bp.route('/api/rulesets/import', methods=['POST'])
+def import_ruleset():
+    """
+    Load an artifact (request body) into this process.
+    With ?persist=true the rules are also written to the DB, replacing the
+    template's existing rules.
+    """
+    try:
+        ruleset = parse_artifact(request.json, source='import')
+    except RuleSetError as e:
+        return jsonify({'error': str(e)}), 422
+
+    if request.args.get('persist', '').lower() in ('1', 'true', 'yes'):
+        try:
+            template = persist_ruleset(ruleset)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+        ruleset.template = {'id': template.id, 'name': template.name, 'description': template.description}
+
+    try:
+        register_ruleset(ruleset)
+    except RuleSetError as e:
+        return jsonify({'error': str(e)}), 422
+    return jsonify(ruleset.to_dict()), 201
+
+
+@extraction_bp.route('/api/rulesets/reload', methods=['POST'])
+def reload_rulesets():
+    """Hot-reload artifacts from RULESET_ARTIFACTS whose files changed; unload deleted ones."""
+    return jsonify(reload_artifacts(current_app))
+
+
+@extraction_bp.route('/api/rulesets/<template_id>', methods=['DELETE'])
+def unload_ruleset(template_id):
+    """Drop a loaded artifact so the template falls back to its DB rules."""
+    if not unregister_ruleset(template_id):
+        return jsonify({'error': 'Rule set not loaded'}), 404
+    return jsonify({'message': 'Rule set unloaded', 'template_id': template_id})
+
 
 @extraction_bp.route('/rules', methods=['GET', 'POST', 'DELETE'])
 def manage_rules():
@@ -146,15 +298,23 @@ def manage_rules():
             db.session.add(rule)
 
         db.session.commit()
-        return jsonify({'message': 'Rule saved', 'rule': rule.to_dict()})
+        warning = _rules_changed(rule.template_id)
+        return jsonify(_with_warning({'message': 'Rule saved', 'rule': rule.to_dict()}, warning))
 
     elif request.method == 'DELETE':
         rule_id = request.args.get('id')
         rule = ExtractionRule.query.get(rule_id)
+        warning = None
         if rule:
             db.session.delete(rule)
             db.session.commit()
-        return jsonify({'message': 'Rule deleted'})
+            warning = _rules_changed(rule.template_id)
+        return jsonify(_with_warning({'message': 'Rule deleted'}, warning))
+
+
+def _rules_for_template(template_id):
+    """A loaded rule-set artifact first, then the template's DB rules, else all rules."""
+    return resolve_rules(template_id)[0]
 
 
 @extraction_bp.route('/extract', methods=['POST'])
@@ -172,34 +332,81 @@ def extract_data():
         return jsonify({'error': 'File not found'}), 404
 
     try:
-        # Filter rules by template if provided, else use all (or maybe specific global ones?)
-        # For now, if template provided, use ONLY template rules.
-        # If not provided, fetch ALL rules (backward compatibility)
-        if template_id:
-            rules = ExtractionRule.query.filter_by(template_id=template_id).all()
-        else:
-            rules = ExtractionRule.query.all()
-            
-        rules_dicts = [r.to_dict() for r in rules]
-        text = extract_text_from_pdf(filepath)
-        extracted_data = apply_rules(text, rules_dicts)
-        return jsonify({'text': text, 'data': extracted_data})
+        # With a template only its rules run (a loaded rule-set artifact skips the DB).
+        # Without one the template classifier picks a template; only when nothing
+        # matches (or CLASSIFIER_ENABLED is off) do ALL rules run, as they used to.
+        # The result is stored; an unchanged PDF + rule set returns the stored one.
+        result, text, cached = extract_document(filepath, template_id, filename=filename)
+        return jsonify({'text': text, 'data': result.get_data(), 'result_id': result.id, 'cached': cached,
+                        'template_id': result.template_id, 'classifier_score': result.classifier_score,
+                        'page_sources': result.document.get_page_sources()})
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @extraction_bp.route('/export', methods=['POST'])
 def export_data():
-    data = request.json
-    extracted_data = data.get('data')
+    """
+    Without `format`: the original single-result JSON download.
+
+    With `format` (csv, jsonl, xlsx, parquet — body or query string) the
+    export is streamed and list matches are flattened into rows. Sources:
+      data       one result dict
+      results    [{"document": ..., "data": {...}}, ...]
+      filenames  uploaded PDFs, extracted one at a time with template_id's rules
+    """
+    data = request.json or {}
     filename = data.get('filename', 'export')
-    
-    if not extracted_data:
+    fmt = (data.get('format') or request.args.get('format') or '').lower()
+
+    if not fmt:
+        extracted_data = data.get('data')
+        if not extracted_data:
+            return jsonify({'error': 'No data to export'}), 400
+
+        json_str = json.dumps(extracted_data, indent=4)
+
+        return Response(
+            json_str,
+            mimetype="application/json",
+            headers={"Content-disposition": f"attachment; filename={filename}.json"}
+        )
+
+    fields = None
+    include_error = False
+    if data.get('filenames'):
+        rules_dicts = _rules_for_template(data.get('template_id'))
+        fields = list(dict.fromkeys(r['field_name'] for r in rules_dicts if r.get('field_name')))
+        records = _extract_records(current_app.config['UPLOAD_FOLDER'], data['filenames'], data.get('template_id'))
+        include_error = True
+    elif data.get('results'):
+        records = data['results']
+    elif data.get('data'):
+        records = [{'document': data.get('document', filename), 'data': data['data']}]
+    else:
         return jsonify({'error': 'No data to export'}), 400
-        
-    json_str = json.dumps(extracted_data, indent=4)
-    
+
+    try:
+        chunks = stream_export(fmt, records, fields=fields, include_error=include_error,
+                               chunk_rows=current_app.config.get('EXPORT_CHUNK_ROWS', 1000))
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+
+    mimetype, extension = FORMATS[fmt]
     return Response(
-        json_str,
-        mimetype="application/json",
-        headers={"Content-disposition": f"attachment; filename={filename}.json"}
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-disposition": f"attachment; filename={filename}.{extension}"}
     )
+
+
+def _extract_records(upload_folder, filenames, template_id):
+    """Extract uploaded PDFs lazily (stored results are reused), one record per file."""
+    for name in filenames:
+        filepath = os.path.join(upload_folder, os.path.basename(name))
+        try:
+            result, _, _ = extract_document(filepath, template_id, filename=name)
+            yield {'document': name, 'data': result.get_data(), 'error': None}
+        except Exception as e:
+            db.session.rollback()
+            yield {'document': name, 'data': {}, 'error': str(e)}
@@ -0,0 +1,79 @@
+"""
+Health and readiness probes for load balancers.
+
+GET /healthz — liveness: the process is up and serving requests. Touches nothing.
+GET /readyz  — readiness: DB round-trip latency, scheduler state, free disk in
+               BUILDS_FOLDER / UPLOAD_FOLDER and runner backlog (plus live warm
+               zygotes, for information). Returns 503 when any check fails so
+               traffic drains away from the node.
+"""
+import shutil
+import time
+
+from flask import Blueprint, jsonify, current_app
+from sqlalchemy import text
+
+from extensions import db
+
+health_bp = Blueprint('health', __name__)
+
+
+@health_bp.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+
+@health_bp.route('/readyz')
+def readyz():
+    config = current_app.config
+    checks = {
+        'database': _check_database(config['HEALTH_MAX_DB_LATENCY_MS']),
+        'scheduler': _check_scheduler(),
+        'disk': _check_disk(
+            [config['BUILDS_FOLDER'], config['UPLOAD_FOLDER']],
+            config['HEALTH_MIN_FREE_DISK_MB'],
+        ),
+        'runner': _check_runner(config['HEALTH_MAX_QUEUED_BUILDS']),
+    }
+    ready = all(c['ok'] for c in checks.values())
+    return jsonify({'status': 'ready' if ready else 'unavailable', 'checks': checks}), (200 if ready else 503)
+
+
+def _check_database(max_latency_ms):
+    start = time.perf_counter()
+    try:
+        db.session.execute(text('SELECT 1'))
+    except Exception as e:
+        db.session.rollback()
+        return {'ok': False, 'error': str(e)}
+    latency_ms = round((time.perf_counter() - start) * 1000, 2)
+    return {'ok': latency_ms <= max_latency_ms, 'latency_ms': latency_ms}
+
+
+def _check_scheduler():
+    from services.scheduler_service import scheduler, get_leader_status
+    result = {'ok': scheduler.running, 'running': scheduler.running}
+    result.update(get_leader_status())
+    return result
+
+
+def _check_disk(folders, min_free_mb):
+    result = {'ok': True}
+    for folder in folders:
+        try:
+            free_mb = shutil.disk_usage(folder).free // (1024 * 1024)
+        except OSError as e:
+            result['ok'] = False
+            result[folder] = {'error': str(e)}
+            continue
+        result[folder] = {'free_mb': free_mb}
+        if free_mb < min_free_mb:
+            result['ok'] = False
+    return result
+
+
+def _check_runner(max_queued_builds):
+    from services.script_runner import get_runner_stats
+    stats = get_runner_stats(current_app)
+    stats['ok'] = stats['queued'] < max_queued_builds
+    return stats
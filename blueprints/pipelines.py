@@ -0,0 +1,116 @@
+"""
+Pipeline API.
+
+GET/POST   /api/pipelines                 — list / create (name, description, steps)
+GET/PUT/DELETE /api/pipelines/<id>        — fetch / replace / delete
+POST       /api/pipelines/<id>/run        — start a run
+GET        /api/pipelines/<id>/runs       — recent runs
+GET        /api/pipeline-runs/<run_id>    — run status with per-step roll-up
+
+Steps are given as [{"name": "load", "script_id": "...", "depends_on": []}, ...].
+"""
+import json
+
+from flask import Blueprint, request, jsonify, current_app
+from extensions import db
+from models.pipeline import Pipeline, PipelineStep, PipelineRun
+from services.pipeline_runner import PipelineError, validate_steps, start_run, run_summary
+
+pipelines_bp = Blueprint('pipelines', __name__)
+
+
+def _set_steps(pipeline, steps):
+    ordered = validate_steps(steps)
+    pipeline.steps = [
+        PipelineStep(
+            name=step['name'],
+            script_id=step['script_id'],
+            depends_on=json.dumps(step['depends_on']),
+            position=position,
+        )
+        for position, step in enumerate(ordered)
+    ]
+
+
+@pipelines_bp.route('/api/pipelines', methods=['GET', 'POST'])
+def handle_pipelines():
+    if request.method == 'GET':
+        pipelines = Pipeline.query.order_by(Pipeline.name).all()
+        return jsonify([p.to_dict() for p in pipelines])
+
+    data = request.json or {}
+    name = data.get('name', '').strip()
+    if not name:
+        return jsonify({'error': 'Name required'}), 400
+    if Pipeline.query.filter_by(name=name).first():
+        return jsonify({'error': 'A pipeline with this name already exists'}), 409
+
+    pipeline = Pipeline(name=name, description=data.get('description', ''))
+    try:
+        _set_steps(pipeline, data.get('steps') or [])
+    except PipelineError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.add(pipeline)
+    db.session.commit()
+    return jsonify(pipeline.to_dict()), 201
+
+
+@pipelines_bp.route('/api/pipelines/<pipeline_id>', methods=['GET', 'PUT', 'DELETE'])
+def manage_pipeline(pipeline_id):
+    pipeline = db.session.get(Pipeline, pipeline_id)
+    if not pipeline:
+        return jsonify({'error': 'Pipeline not found'}), 404
+
+    if request.method == 'GET':
+        return jsonify(pipeline.to_dict())
+
+    if request.method == 'DELETE':
+        if PipelineRun.query.filter_by(pipeline_id=pipeline.id, finished_at=None).first():
+            return jsonify({'error': 'Pipeline has a run in progress'}), 409
+        PipelineRun.query.filter_by(pipeline_id=pipeline.id).delete()
+        db.session.delete(pipeline)
+        db.session.commit()
+        return jsonify({'message': 'Deleted'})
+
+    data = request.json or {}
+    if 'name' in data:
+        pipeline.name = data['name'].strip() or pipeline.name
+    if 'description' in data:
+        pipeline.description = data['description']
+    if 'steps' in data:
+        if PipelineRun.query.filter_by(pipeline_id=pipeline.id, finished_at=None).first():
+            return jsonify({'error': 'Cannot change steps while a run is in progress'}), 409
+        try:
+            _set_steps(pipeline, data['steps'] or [])
+        except PipelineError as e:
+            return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    return jsonify(pipeline.to_dict())
+
+
+@pipelines_bp.route('/api/pipelines/<pipeline_id>/run', methods=['POST'])
+def run_pipeline(pipeline_id):
+    pipeline = db.session.get(Pipeline, pipeline_id)
+    if not pipeline:
+        return jsonify({'error': 'Pipeline not found'}), 404
+
+    app = current_app._get_current_object()
+    run = start_run(app, pipeline)
+    return jsonify({'run_id': run.id, 'status': 'started'}), 202
+
+
+@pipelines_bp.route('/api/pipelines/<pipeline_id>/runs')
+def list_pipeline_runs(pipeline_id):
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    runs = PipelineRun.query.filter_by(pipeline_id=pipeline_id)\
+        .order_by(PipelineRun.started_at.desc())\
+        .limit(limit).all()
+    return jsonify([r.to_dict() for r in runs])
+
+
+@pipelines_bp.route('/api/pipeline-runs/<run_id>')
+def get_pipeline_run(run_id):
+    run = db.session.get(PipelineRun, run_id)
+    if not run:
+        return jsonify({'error': 'Pipeline run not found'}), 404
+    return jsonify(run_summary(run))
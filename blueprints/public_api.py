@@ -23,9 +23,13 @@ from extensions import db
 from models.api_key import APIKey
 from models.rule import ExtractionRule
 from models.script import Script, Build
-from extraction_engine import extract_text_from_pdf, apply_rules
+from extraction_engine import extract_pdf_pages, join_pages, apply_rules
 from services.auth import require_api_key
+from services.ruleset import get_ruleset, resolve_rules
 from services.script_runner import execute_script_async
+from services.script_store import has_content
+from services.ocr import page_ocr
+from services.template_classifier import classify, fingerprint
 
 public_api_bp = Blueprint('public_api', __name__)
 
@@ -40,8 +44,13 @@ def extract():
     """
     Accept a PDF file via multipart/form-data and run all configured rules.
 
-    Optional query param:
-        rule_ids — comma-separated list of rule UUIDs to run instead of all
+    Optional query params:
+        rule_ids    — comma-separated list of rule UUIDs to run instead of all
+        template_id — run only this template's rules (served from a loaded
+                      rule-set artifact when one is available)
+
+    With neither, the template is picked automatically from the document
+    (services.template_classifier); all rules run only when none matches.
 
     Returns:
         {
@@ -49,6 +58,9 @@ def extract():
           "filename": "invoice.pdf",
           "extracted_fields": {"Invoice Number": "INV-1234"},
           "rules_applied": 5,
+          "template_id": "...",
+          "classification": {"template_id": "...", "score": 0.62, ...},
+          "page_sources": ["text", "ocr"],
           "metadata": {"api_version": "v1"}
         }
     """
@@ -63,17 +75,30 @@ def extract():
 
     # Determine which rules to apply
     rule_ids_param = request.args.get('rule_ids', '').strip()
-    if rule_ids_param:
-        ids = [r.strip() for r in rule_ids_param.split(',') if r.strip()]
-        rules_qs = ExtractionRule.query.filter(ExtractionRule.id.in_(ids)).all()
-    else:
-        rules_qs = ExtractionRule.query.all()
-
-    if not rules_qs:
-        return jsonify({'error': 'No extraction rules configured'}), 422
+    template_id = request.args.get('template_id', '').strip()
+    classify_template = (not rule_ids_param and not template_id
+                         and current_app.config.get('CLASSIFIER_ENABLED', True))
+    rules_dicts = None
+    if not classify_template:
+        ruleset = get_ruleset(template_id) if template_id and not rule_ids_param else None
+        if ruleset:
+            rules_dicts = ruleset.rule_dicts()
+        else:
+            if rule_ids_param:
+                ids = [r.strip() for r in rule_ids_param.split(',') if r.strip()]
+                rules_qs = ExtractionRule.query.filter(ExtractionRule.id.in_(ids)).all()
+            elif template_id:
+                rules_qs = ExtractionRule.query.filter_by(template_id=template_id).all()
+            else:
+                rules_qs = ExtractionRule.query.all()
+            rules_dicts = [{'field_name': r.field_name, 'regex': r.regex} for r in rules_qs]
+
+        if not rules_dicts:
+            return jsonify({'error': 'No extraction rules configured'}), 422
 
     # Save to a temp file and extract
     tmp_path = None
+    classification = None
     try:
         suffix = '.pdf'
         with tempfile.NamedTemporaryFile(
@@ -84,8 +109,14 @@ def extract():
             tmp_path = tmp.name
             file.save(tmp)
 
-        text = extract_text_from_pdf(tmp_path)
-        rules_dicts = [{'field_name': r.field_name, 'regex': r.regex} for r in rules_qs]
+        pages, layout, sources = extract_pdf_pages(tmp_path, ocr=page_ocr(current_app))
+        text = join_pages(pages)
+        if classify_template:
+            classification = classify(current_app, fingerprint(pages[0] if pages else '', layout))
+            template_id = classification['template_id'] or ''
+            rules_dicts = resolve_rules(template_id or None)[0]
+            if not rules_dicts:
+                return jsonify({'error': 'No extraction rules configured'}), 422
         extracted = apply_rules(text, rules_dicts)
     except Exception as e:
         return jsonify({'error': f'Extraction failed: {str(e)}'}), 500
@@ -100,7 +131,10 @@ def extract():
         'success': True,
         'filename': file.filename,
         'extracted_fields': extracted,
-        'rules_applied': len(rules_qs),
+        'rules_applied': len(rules_dicts),
+        'template_id': template_id or None,
+        'classification': classification,
+        'page_sources': sources,
         'metadata': {'api_version': 'v1'},
     })
 
@@ -124,9 +158,9 @@ def run_script_api(script_id):
     if not script:
         return jsonify({'error': 'Script not found'}), 404
 
+    if not has_content(current_app, script):
+        return jsonify({'error': 'Script has no content'}), 404
     script_path = os.path.join(current_app.config['SCRIPTS_FOLDER'], script.filename)
-    if not os.path.exists(script_path):
-        return jsonify({'error': 'Script file not found on disk'}), 404
 
     build = Build(script_id=script.id, status='pending', triggered_by='api')
     db.session.add(build)
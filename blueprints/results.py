@@ -0,0 +1,177 @@
+"""
+Stored extraction results API.
+
+POST /api/results/extract        — extract an uploaded PDF and store the result
+                                   (filename, template_id, force); reuses the
+                                   stored result when the PDF and rules are unchanged;
+                                   force also retries pages whose OCR failed
+GET  /api/results                — query: template_id, field + value / contains /
+                                   min / max, since, until, document_hash, limit, offset;
+                                   all_versions=1 includes results superseded by newer rules
+GET  /api/results/aggregate      — per-field counts and numeric sum/min/max/avg over
+                                   the same filters; fields=a,b and group_by=day|template
+GET  /api/results/export         — stream the matching results (format=csv|jsonl|xlsx|parquet)
+GET/DELETE /api/results/<id>     — one result, with the text source of each page
+
+GET/POST   /api/results/reextract       — list jobs (template_id filter) / start one
+                                          for {"template_id": ...}
+GET/DELETE /api/results/reextract/<id>  — job progress / cancel
+
+Re-extraction jobs live in the memory of the worker process that started them
+(each job names it as 'worker'): other workers don't list them and answer 404,
+and a restart forgets them. Starting a new job resumes where one left off.
+GET        /api/results/drop-folder     — drop folder ingestion status
+GET        /api/results/ocr             — OCR fallback availability and page/cache counters
+"""
+import os
+
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from extensions import db
+from models.extraction_result import ExtractionResult
+from models.template import ExtractionTemplate
+from services.exporter import ExportError, FORMATS, stream_export
+from services.results_store import extract_document, filtered_results, aggregate
+from services.reextract import start_job, get_job, cancel_job, list_jobs
+from services.drop_folder import get_status as drop_folder_status
+from services.ocr import get_stats as ocr_stats
+
+results_bp = Blueprint('results', __name__)
+
+
+def _filters():
+    args = request.args
+    filters = {
+        'template_id': args.get('template_id'),
+        'field': args.get('field'),
+        'value': args.get('value'),
+        'contains': args.get('contains'),
+        'value_min': args.get('min', type=float),
+        'value_max': args.get('max', type=float),
+        'since': args.get('since'),
+        'until': args.get('until'),
+        'document_hash': args.get('document_hash'),
+        'all_versions': args.get('all_versions', '').lower() in ('1', 'true', 'yes') or None,
+    }
+    return {k: v for k, v in filters.items() if v is not None}
+
+
+@results_bp.route('/api/results/extract', methods=['POST'])
+def extract_and_store():
+    data = request.json or {}
+    filename = data.get('filename')
+    if not filename:
+        return jsonify({'error': 'Filename is required'}), 400
+
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], os.path.basename(filename))
+    if not os.path.exists(filepath):
+        return jsonify({'error': 'File not found'}), 404
+
+    try:
+        result, _, cached = extract_document(filepath, data.get('template_id'), filename=filename,
+                                             force=bool(data.get('force')))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    return jsonify({**result.to_dict(), 'cached': cached}), 200 if cached else 201
+
+
+@results_bp.route('/api/results', methods=['GET'])
+def list_results():
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    offset = request.args.get('offset', 0, type=int)
+    try:
+        query = filtered_results(**_filters())
+        total = query.count()
+        results = query.order_by(ExtractionResult.created_at.desc()).offset(offset).limit(limit).all()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    return jsonify({
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'results': [r.to_dict() for r in results],
+    })
+
+
+@results_bp.route('/api/results/aggregate', methods=['GET'])
+def aggregate_results():
+    group_by = request.args.get('group_by')
+    if group_by not in (None, 'day', 'template'):
+        return jsonify({'error': "group_by must be 'day' or 'template'"}), 400
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    try:
+        return jsonify(aggregate(fields, group_by=group_by, **_filters()))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+
+
+@results_bp.route('/api/results/export', methods=['GET'])
+def export_results():
+    fmt = request.args.get('format', 'csv').lower()
+    try:
+        query = filtered_results(**_filters()).order_by(ExtractionResult.created_at)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+
+    def records():
+        for result in query.yield_per(500):
+            yield {'document': result.filename or result.document_hash, 'data': result.get_data()}
+
+    try:
+        chunks = stream_export(fmt, records(), chunk_rows=current_app.config.get('EXPORT_CHUNK_ROWS', 1000))
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+
+    mimetype, extension = FORMATS[fmt]
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-disposition": f"attachment; filename=results.{extension}"}
+    )
+
+
+@results_bp.route('/api/results/reextract', methods=['GET', 'POST'])
+def reextract_jobs():
+    if request.method == 'GET':
+        return jsonify(list_jobs(request.args.get('template_id')))
+
+    template_id = (request.json or {}).get('template_id')
+    if template_id and not db.session.get(ExtractionTemplate, template_id):
+        return jsonify({'error': 'Template not found'}), 404
+    return jsonify(start_job(current_app._get_current_object(), template_id)), 202
+
+
+@results_bp.route('/api/results/reextract/<job_id>', methods=['GET', 'DELETE'])
+def reextract_job(job_id):
+    job = cancel_job(job_id) if request.method == 'DELETE' else get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found (jobs are only known to the worker process '
+                                 'that started them, and not kept across restarts)'}), 404
+    return jsonify(job)
+
+
+@results_bp.route('/api/results/drop-folder', methods=['GET'])
+def drop_folder():
+    status = drop_folder_status()
+    if not status['folder']:
+        return jsonify({'error': 'Drop folder ingestion is not enabled (set DROP_FOLDER)'}), 404
+    return jsonify(status)
+
+
+@results_bp.route('/api/results/ocr', methods=['GET'])
+def ocr_status():
+    return jsonify(ocr_stats(current_app))
+
+
+@results_bp.route('/api/results/<result_id>', methods=['GET', 'DELETE'])
+def result_detail(result_id):
+    result = db.session.get(ExtractionResult, result_id)
+    if not result:
+        return jsonify({'error': 'Result not found'}), 404
+
+    if request.method == 'DELETE':
+        db.session.delete(result)
+        db.session.commit()
+        return jsonify({'message': 'Result deleted'})
+
+    return jsonify({**result.to_dict(), 'page_sources': result.document.get_page_sources()})
@@ -8,7 +8,9 @@ GET  /api/scripts/<id>/schedule  — get current schedule + next run time
 from flask import Blueprint, request, jsonify
 from extensions import db
 from models.script import Script
-from services.scheduler_service import register_schedule, remove_schedule, get_next_run_time
+from services.scheduler_service import (
+    register_schedule, remove_schedule, record_schedule_change, get_next_run_time,
+)
 
 scheduler_bp = Blueprint('scheduler', __name__)
 
@@ -44,6 +46,7 @@ def manage_schedule(script_id):
 
         script.schedule_cron = cron or None
         script.schedule_enabled = enabled
+        record_schedule_change(script.id)
         db.session.commit()
 
         from flask import current_app
@@ -58,6 +61,7 @@ def manage_schedule(script_id):
     elif request.method == 'DELETE':
         script.schedule_cron = None
         script.schedule_enabled = False
+        record_schedule_change(script.id)
         db.session.commit()
         remove_schedule(script.id)
         return jsonify({'message': 'Schedule removed'})
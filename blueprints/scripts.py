@@ -1,15 +1,38 @@
 import os
 import secrets
+import mimetypes
+import sqlite3
 from datetime import datetime
-import requests
-from flask import Blueprint, request, jsonify, render_template, current_app, Response, stream_with_context
+from sqlalchemy.exc import IntegrityError
+from flask import Blueprint, request, jsonify, render_template, current_app, Response, stream_with_context, send_file
 from extensions import db
 from models.script import Script, Build
-from models.setting import Setting
-from services.script_runner import execute_script_async, get_output_queue
+from models.artifact import BuildArtifact
+from models.script_version import ScriptVersion
+from services.script_runner import execute_script_async, get_output_queue, cancel_build
+from services.webhook_ingest import invalidate_token, invalidate_script
+from services.script_envs import list_envs
+from services.artifact_store import blob_path
+from services.log_index import search as search_logs, stats as log_index_stats, start_backfill
+from services.build_logs import count_lines, read_lines, tail_lines
+from services.script_store import (
+    ScriptConflict, save_content, get_content, has_content, load_blob, list_versions,
+)
+from services.gist_reconcile import run_async as run_reconcile, get_status as get_reconcile_status
+from services.gist_sync import (
+    enqueue_sync, cancel_sync, get_sync_status, sync_script_to_gist, delete_script_gist,
+)
 
 scripts_bp = Blueprint('scripts', __name__)
 
+# Accepted values for the per-script resource limits (None/'' clears one)
+LIMIT_RANGES = {
+    'timeout_seconds': (1, 7 * 24 * 3600),
+    'cpu_limit_seconds': (1, 7 * 24 * 3600),
+    'memory_limit_mb': (1, 1024 * 1024),
+    'nice': (0, 19),
+}
+
 
 @scripts_bp.route('/scripts')
 def scripts_page():
@@ -31,10 +54,22 @@ def handle_scripts():
         if not script_name.endswith('.py'):
             script_name += '.py'
 
-        filepath = os.path.join(current_app.config['SCRIPTS_FOLDER'], script_name)
-
-        with open(filepath, 'w') as f:
-            f.write(content)
+        limits = {}
+        for field, (low, high) in LIMIT_RANGES.items():
+            if field not in data:
+                continue
+            value = data[field]
+            if value in (None, ''):
+                limits[field] = None
+                continue
+            try:
+                if isinstance(value, bool):
+                    raise ValueError
+                limits[field] = int(value)
+            except (TypeError, ValueError):
+                return jsonify({'error': f'{field} must be an integer'}), 400
+            if not low <= limits[field] <= high:
+                return jsonify({'error': f'{field} must be between {low} and {high}'}), 400
 
         # Look up existing script by id (preferred) or name
         if script_id:
@@ -48,134 +83,80 @@ def handle_scripts():
         else:
             # Update filename in case name was changed
             script.filename = script_name
-
-        # Update fields
-        if 'sync_to_gist' in data:
-            script.sync_to_gist = data['sync_to_gist']
-
-        db.session.commit()
-
-        # Sync to Gist if enabled
-        gist_error = None
-        if script.sync_to_gist:
-            try:
-                sync_script_to_gist(script, content)
-                db.session.commit()  # Commit gist_id/url/filename updates
-            except Exception as e:
-                gist_error = str(e)
-                print(f"Failed to sync to Gist: {e}")
+            invalidate_script(script.id)
+
+        try:
+            # Content goes to the versioned store; base_hash guards against overwriting a newer save
+            save_content(current_app, script, content, base_hash=data.get('base_hash'))
+
+            # Update fields
+            if 'sync_to_gist' in data:
+                script.sync_to_gist = data['sync_to_gist']
+            if 'requirements' in data:
+                script.requirements = (data['requirements'] or '').strip() or None
+            for field, value in limits.items():
+                setattr(script, field, value)
+
+            db.session.flush()  # Assign the id of a new script
+
+            # Gist sync happens in the background outbox worker, never inline
+            if script.sync_to_gist:
+                enqueue_sync(current_app, script.id)
+            else:
+                cancel_sync(script.id)
+            db.session.commit()
+        except ScriptConflict as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 409
+        except IntegrityError:
+            # Another save took the same version number (or stored the same blob) first
+            db.session.rollback()
+            return jsonify({'error': 'Script was modified concurrently, please retry'}), 409
 
         response = script.to_dict()
         response['message'] = 'Script saved'
-        if gist_error:
-            response['gist_error'] = gist_error
+        if script.sync_to_gist:
+            response['gist_sync'] = 'queued'
         return jsonify(response)
 
 
-def _calculate_gist_filename(script):
-    """Calculate the gist filename based on script name and collection."""
-    gist_filename = script.name
-    if script.collection:
-        col_name = "".join(c for c in script.collection.name if c.isalnum() or c in (' ', '_', '-')).strip().replace(' ', '_')
-        gist_filename = f"{col_name}_{script.name}"
-    if not gist_filename.endswith('.py'):
-        gist_filename += '.py'
-    return gist_filename
-
-
-def sync_script_to_gist(script, content):
-    token_setting = Setting.query.get('github_token')
-    if not token_setting or not token_setting.value:
-        raise Exception("No GitHub token configured. Please set your GitHub token in Settings.")
-
-    token = token_setting.value
-    headers = {
-        'Authorization': f'token {token}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-
-    new_filename = _calculate_gist_filename(script)
-    old_filename = script.gist_filename  # Previously tracked filename
-
-    if script.gist_id:
-        # Build files payload for PATCH
-        files = {new_filename: {"content": content}}
-
-        # If the filename changed, delete the old file from the gist
-        if old_filename and old_filename != new_filename:
-            files[old_filename] = None  # null = delete file from gist
-
-        collection_label = f" [{script.collection.name}]" if script.collection else ""
-        payload = {
-            "description": f"Script: {script.name}{collection_label} (Document Extraction Portal)",
-            "files": files
-        }
-        url = f"https://api.github.com/gists/{script.gist_id}"
-        resp = requests.patch(url, json=payload, headers=headers)
-    else:
-        # Create new Gist
-        collection_label = f" [{script.collection.name}]" if script.collection else ""
-        payload = {
-            "description": f"Script: {script.name}{collection_label} (Document Extraction Portal)",
-            "public": False,
-            "files": {new_filename: {"content": content}}
-        }
-        url = "https://api.github.com/gists"
-        resp = requests.post(url, json=payload, headers=headers)
-
-    if resp.status_code in (200, 201):
-        data = resp.json()
-        script.gist_id = data['id']
-        script.gist_url = data['html_url']
-        script.gist_filename = new_filename
-    else:
-        raise Exception(f"Gist API Error {resp.status_code}: {resp.text}")
-
-
-def delete_script_gist(script):
-    """Delete the gist from GitHub and clear gist fields on the script."""
-    token_setting = Setting.query.get('github_token')
-    if not token_setting or not token_setting.value:
-        raise Exception("No GitHub token configured.")
-
-    if not script.gist_id:
-        return  # Nothing to delete
-
-    token = token_setting.value
-    headers = {
-        'Authorization': f'token {token}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-
-    url = f"https://api.github.com/gists/{script.gist_id}"
-    resp = requests.delete(url, headers=headers)
-
-    if resp.status_code not in (204, 404):
-        raise Exception(f"Gist Delete Error {resp.status_code}: {resp.text}")
-
-    script.gist_id = None
-    script.gist_url = None
-    script.gist_filename = None
-
-
 @scripts_bp.route('/api/scripts/<script_id>')
 def get_script_content(script_id):
     script = Script.query.get(script_id)
     if not script:
         return jsonify({'error': 'Script not found'}), 404
 
-    filepath = os.path.join(current_app.config['SCRIPTS_FOLDER'], script.filename)
-    if not os.path.exists(filepath):
-        return jsonify({'error': 'Script file not found on disk'}), 404
-
-    with open(filepath, 'r') as f:
-        content = f.read()
+    content = get_content(current_app, script)
+    if content is None:
+        return jsonify({'error': 'Script has no content'}), 404
 
     result = script.to_dict()
     result['content'] = content
     return jsonify(result)
 
 
+@scripts_bp.route('/api/scripts/<script_id>/versions')
+def list_script_versions(script_id):
+    script = db.session.get(Script, script_id)
+    if not script:
+        return jsonify({'error': 'Script not found'}), 404
+    return jsonify(list_versions(script.id))
+
+
+@scripts_bp.route('/api/scripts/<script_id>/versions/<content_hash>')
+def get_script_version(script_id, content_hash):
+    """Content of a past version. Immutable, so it can be cached forever."""
+    if not ScriptVersion.query.filter_by(script_id=script_id, content_hash=content_hash).first():
+        return jsonify({'error': 'Version not found'}), 404
+    content = load_blob(current_app, content_hash)
+    if content is None:
+        return jsonify({'error': 'Version content missing'}), 404
+    return Response(content, mimetype='text/plain', headers={
+        'ETag': f'"{content_hash}"',
+        'Cache-Control': 'public, max-age=31536000, immutable',
+    })
+
+
 @scripts_bp.route('/api/scripts/<script_id>/run', methods=['POST'])
 def run_script(script_id):
     """
@@ -186,9 +167,9 @@ def run_script(script_id):
     if not script:
         return jsonify({'error': 'Script not found'}), 404
 
+    if not has_content(current_app, script):
+        return jsonify({'error': 'Script has no content'}), 404
     script_path = os.path.join(current_app.config['SCRIPTS_FOLDER'], script.filename)
-    if not os.path.exists(script_path):
-        return jsonify({'error': 'Script file not found on disk'}), 404
 
     build = Build(script_id=script.id, status='pending', triggered_by='manual')
     db.session.add(build)
@@ -221,17 +202,27 @@ def stream_build_output(build_id):
             with app.app_context():
                 build = db.session.get(Build, build_id)
             if build and build.log_file and os.path.exists(build.log_file):
-                with open(build.log_file, 'r', encoding='utf-8', errors='replace') as f:
-                    for line in f:
-                        yield f"data: {line}\n\n"
+                # Replay only the tail; older lines are available via /api/builds/<id>/log
+                max_lines = app.config.get('BUILD_OUTPUT_TAIL_LINES', 5000)
+                skipped = count_lines(build.log_file) - max_lines
+                if skipped > 0:
+                    yield f"data: [... {skipped} earlier lines not shown; see /api/builds/{build_id}/log]\n\n"
+                tail = tail_lines(build.log_file, max_lines).decode('utf-8', errors='replace')
+                for line in tail.splitlines(keepends=True):
+                    yield f"data: {line}\n\n"
             yield "data: [DONE]\n\n"
             return
 
-        # Stream live output from the queue
+        # Stream live output from the queue. Quiet scripts get keepalive
+        # comments instead of a premature [DONE]; runaway scripts are bounded
+        # by their timeout, which ends the stream via the sentinel.
         while True:
             try:
-                line = q.get(timeout=30)  # 30s timeout guards against hung scripts
+                line = q.get(timeout=30)
             except Exception:
+                if get_output_queue(build_id) is q:
+                    yield ": keepalive\n\n"
+                    continue
                 yield "data: [DONE]\n\n"
                 break
 
@@ -252,6 +243,25 @@ def stream_build_output(build_id):
     )
 
 
+@scripts_bp.route('/api/builds/<build_id>/cancel', methods=['POST'])
+def cancel_build_endpoint(build_id):
+    """
+    Stop a queued or running build. Running builds get SIGTERM on their
+    process group, then SIGKILL after RUNNER_KILL_GRACE seconds.
+    """
+    build = db.session.get(Build, build_id)
+    if not build:
+        return jsonify({'error': 'Build not found'}), 404
+
+    result = cancel_build(current_app._get_current_object(), build_id)
+    if result is None:
+        if build.status in ('pending', 'running'):
+            return jsonify({'error': 'Build is not running on this server'}), 409
+        return jsonify({'error': f'Build already finished ({build.status})'}), 409
+
+    return jsonify({'build_id': build_id, 'status': result}), 202
+
+
 @scripts_bp.route('/api/scripts/<script_id>/webhook/regenerate', methods=['POST'])
 def regenerate_webhook(script_id):
     """Generate a new webhook token for a script, invalidating the old one."""
@@ -259,6 +269,7 @@ def regenerate_webhook(script_id):
     if not script:
         return jsonify({'error': 'Script not found'}), 404
 
+    invalidate_token(script.webhook_token)
     script.webhook_token = secrets.token_urlsafe(32)
     db.session.commit()
     return jsonify({'webhook_token': script.webhook_token})
@@ -283,13 +294,146 @@ def get_build_output(script_id, build_id):
         return jsonify({'error': 'Build not found'}), 404
 
     if build.log_file and os.path.exists(build.log_file):
-        with open(build.log_file, 'r', encoding='utf-8', errors='replace') as f:
-            content = f.read()
-        return jsonify({'output': content})
+        # Only the tail goes into JSON; /api/builds/<id>/log pages through the rest
+        max_lines = current_app.config.get('BUILD_OUTPUT_TAIL_LINES', 5000)
+        total = count_lines(build.log_file)
+        content = tail_lines(build.log_file, max_lines).decode('utf-8', errors='replace')
+        return jsonify({'output': content, 'total_lines': total, 'truncated': total > max_lines})
 
     return jsonify({'output': ''})
 
 
+@scripts_bp.route('/api/builds/<build_id>/log')
+def read_build_log(build_id):
+    """
+    Raw log bytes as text/plain, never JSON-wrapped.
+      (no args)            whole file, with HTTP Range support
+      ?offset=N&limit=M    M lines starting at 0-based line N
+      ?tail=N              last N lines
+    X-Log-Total-Lines and X-Log-Size describe the whole log for paging.
+    """
+    build = db.session.get(Build, build_id)
+    if not build:
+        return jsonify({'error': 'Build not found'}), 404
+    if not build.log_file or not os.path.exists(build.log_file):
+        return jsonify({'error': 'Log not found'}), 404
+
+    log_file = build.log_file
+    if 'tail' not in request.args and 'offset' not in request.args:
+        return send_file(os.path.abspath(log_file), mimetype='text/plain', conditional=True)
+
+    total = count_lines(log_file)
+    if 'tail' in request.args:
+        n = max(0, min(request.args.get('tail', 100, type=int), 100000))
+        body = tail_lines(log_file, n)
+        first = max(0, total - n)
+    else:
+        first = max(0, request.args.get('offset', 0, type=int))
+        limit = max(1, min(request.args.get('limit', 1000, type=int), 100000))
+        body = read_lines(log_file, first, limit)
+
+    return Response(body, mimetype='text/plain', headers={
+        'X-Log-Offset': str(first),
+        'X-Log-Total-Lines': str(total),
+        'X-Log-Size': str(os.path.getsize(log_file)),
+        'Cache-Control': 'no-cache',
+    })
+
+
+def _parse_time_arg(value):
+    """Epoch seconds or an ISO-8601 timestamp."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+@scripts_bp.route('/api/builds/search')
+def search_build_logs():
+    """
+    Full-text search over build output.
+    ?q=<phrase>&script_id=&status=&since=&until=&context=2&limit=50
+    Pass syntax=fts to use FTS5 query syntax (AND/OR/NEAR, prefix*) instead of a phrase.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        since = _parse_time_arg(request.args.get('since'))
+        until = _parse_time_arg(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since/until must be epoch seconds or ISO-8601'}), 400
+
+    try:
+        hits = search_logs(
+            query,
+            script_id=request.args.get('script_id') or None,
+            status=request.args.get('status') or None,
+            since=since,
+            until=until,
+            context=max(0, min(request.args.get('context', 2, type=int), 20)),
+            limit=max(1, min(request.args.get('limit', 50, type=int), 500)),
+            raw=request.args.get('syntax') == 'fts',
+        )
+    except sqlite3.OperationalError as e:
+        return jsonify({'error': f'Invalid search query: {e}'}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    # dropped > 0 means some lines never made it into the index, so hits may be incomplete
+    return jsonify({'hits': hits, 'count': len(hits), 'dropped_lines': log_index_stats()['dropped']})
+
+
+@scripts_bp.route('/api/builds/search/index', methods=['GET', 'POST'])
+def build_log_index():
+    """
+    GET: index status (queued, dropped lines, backfill progress).
+    POST: start indexing finished builds the index doesn't have yet.
+    """
+    if request.method == 'GET':
+        return jsonify(log_index_stats())
+    try:
+        started = start_backfill(current_app._get_current_object())
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    if not started:
+        return jsonify({'error': 'A backfill is already running', **log_index_stats()}), 409
+    return jsonify(log_index_stats()), 202
+
+
+@scripts_bp.route('/api/builds/<build_id>/artifacts')
+def list_build_artifacts(build_id):
+    build = db.session.get(Build, build_id)
+    if not build:
+        return jsonify({'error': 'Build not found'}), 404
+    artifacts = BuildArtifact.query.filter_by(build_id=build_id).order_by(BuildArtifact.name).all()
+    return jsonify([a.to_dict() for a in artifacts])
+
+
+@scripts_bp.route('/api/builds/<build_id>/artifacts/<path:name>')
+def download_build_artifact(build_id, name):
+    """Serve an artifact from the store; conditional=True handles Range and If-None-Match."""
+    artifact = BuildArtifact.query.filter_by(build_id=build_id, name=name).first()
+    if not artifact:
+        return jsonify({'error': 'Artifact not found'}), 404
+
+    path = blob_path(current_app, artifact.sha256)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Artifact content missing from store'}), 410
+
+    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    return send_file(path, mimetype=mimetype, as_attachment=True,
+                     download_name=os.path.basename(name),
+                     conditional=True, etag=artifact.sha256, max_age=86400)
+
+
+@scripts_bp.route('/api/envs')
+def list_script_envs():
+    """Cached per-script dependency environments on this node."""
+    return jsonify(list_envs(current_app))
+
+
 # --- Collection Endpoints ---
 
 from models.collection import Collection
@@ -355,22 +499,46 @@ def force_gist_sync(script_id):
     if not script:
         return jsonify({'error': 'Script not found'}), 404
 
-    script_path = os.path.join(current_app.config['SCRIPTS_FOLDER'], script.filename)
-    if not os.path.exists(script_path):
-        return jsonify({'error': 'Script file not found on disk'}), 404
-
-    with open(script_path, 'r') as f:
-        content = f.read()
+    content = get_content(current_app, script)
+    if content is None:
+        return jsonify({'error': 'Script has no content'}), 404
 
     try:
-        sync_script_to_gist(script, content)
+        sync_script_to_gist(current_app, script, content)
         script.sync_to_gist = True
+        cancel_sync(script.id)  # Content is now up to date
         db.session.commit()
         return jsonify({'message': 'Gist synced', 'gist_id': script.gist_id, 'gist_url': script.gist_url})
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
 
+@scripts_bp.route('/api/scripts/<script_id>/gist/status')
+def gist_sync_status(script_id):
+    """Outbox state for a script: synced, pending (with attempts/next_attempt_at) or failed."""
+    script = db.session.get(Script, script_id)
+    if not script:
+        return jsonify({'error': 'Script not found'}), 404
+    return jsonify(get_sync_status(script.id))
+
+
+@scripts_bp.route('/api/gists/reconcile', methods=['GET', 'POST'])
+def gist_reconcile():
+    """
+    POST starts a background reconciliation of all synced scripts against
+    their gists (?dry_run=true only reports drift). GET returns progress and
+    the last summary.
+    """
+    if request.method == 'GET':
+        return jsonify(get_reconcile_status())
+
+    dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+    if not run_reconcile(current_app._get_current_object(), dry_run=dry_run):
+        return jsonify({'error': 'A reconciliation is already running'}), 409
+    return jsonify({'status': 'started', 'dry_run': dry_run}), 202
+
+
 @scripts_bp.route('/api/scripts/<script_id>/gist', methods=['DELETE'])
 def remove_gist(script_id):
     """Delete the GitHub Gist for a script and unlink it."""
@@ -379,7 +547,7 @@ def remove_gist(script_id):
         return jsonify({'error': 'Script not found'}), 404
 
     try:
-        delete_script_gist(script)
+        delete_script_gist(current_app, script)
         script.sync_to_gist = False
         db.session.commit()
         return jsonify({'message': 'Gist deleted and unlinked'})
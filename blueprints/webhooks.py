@@ -2,52 +2,61 @@
 Webhook execution blueprint.
 
 POST /webhooks/<token>  — triggers async execution of the script that owns this token.
-The JSON request body is passed to the script as the WEBHOOK_PAYLOAD env var.
-Returns 202 Accepted immediately with the build_id.
+The JSON request body is passed to the script as the WEBHOOK_PAYLOAD env var, or —
+above WEBHOOK_PAYLOAD_INLINE_LIMIT bytes — spooled to a file whose path is in
+WEBHOOK_PAYLOAD_FILE and which is also fed to the script's stdin (and
+removed once the build finishes).
+Returns 202 Accepted immediately with the build_id; the Build row is written
+by the batched ingest buffer (see services.webhook_ingest).
+
+Redelivered requests carrying a delivery id (Idempotency-Key,
+X-GitHub-Delivery, ...) that is already recorded on a Build, or was seen
+within the dedupe window, return 200 with the original build_id and start
+nothing.
 """
 import json
-import os
+import uuid
 from flask import Blueprint, request, jsonify, current_app
-from extensions import db
-from models.script import Script, Build
-from services.script_runner import execute_script_async
+from services.webhook_ingest import resolve_token, get_delivery_id, claim_delivery, ingest, read_payload
 
 webhooks_bp = Blueprint('webhooks', __name__)
 
 
 @webhooks_bp.route('/webhooks/<token>', methods=['POST'])
 def trigger_webhook(token):
-    script = Script.query.filter_by(webhook_token=token).first()
-    if not script:
+    app = current_app._get_current_object()
+    target = resolve_token(app, token)
+    if not target:
         return jsonify({'error': 'Invalid webhook token'}), 404
 
-    payload = request.get_json(silent=True) or {}
-
-    build = Build(
-        script_id=script.id,
-        status='pending',
-        triggered_by='webhook',
-        webhook_payload=json.dumps(payload),
-    )
-    db.session.add(build)
-    db.session.commit()
-
-    build_dir = os.path.join(current_app.config['BUILDS_FOLDER'], script.filename)
-    os.makedirs(build_dir, exist_ok=True)
-
-    script_path = os.path.join(current_app.config['SCRIPTS_FOLDER'], script.filename)
-    env_vars = {
-        'WEBHOOK_PAYLOAD': json.dumps(payload),
-        'BUILD_ID': build.id,
-        'SCRIPT_ID': script.id,
-    }
-
-    app = current_app._get_current_object()
-    execute_script_async(app, build.id, script_path, build_dir, env_vars=env_vars)
+    build_id = str(uuid.uuid4())
+    delivery_id = get_delivery_id(app, request.headers)
+    if delivery_id:
+        original = claim_delivery(app, target['script_id'], delivery_id, build_id)
+        if original:
+            return jsonify({
+                'message': 'Duplicate delivery ignored',
+                'build_id': original,
+                'script': target['name'],
+                'duplicate': True,
+                'stream_url': f'/api/builds/{original}/stream',
+            }), 200
+
+    # Content-Length can't be trusted to be there (chunked bodies), so read up to the limit
+    body, payload_path = read_payload(app, target, build_id, request.stream) if request.is_json else (b'', None)
+    if payload_path:
+        # Large body: stream straight to disk, never parse or copy it into env/DB
+        ingest(app, target, delivery_id=delivery_id, build_id=build_id, payload_path=payload_path)
+    else:
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            payload = {}
+        ingest(app, target, json.dumps(payload or {}), delivery_id=delivery_id, build_id=build_id)
 
     return jsonify({
         'message': 'Execution triggered',
-        'build_id': build.id,
-        'script': script.name,
-        'stream_url': f'/api/builds/{build.id}/stream',
+        'build_id': build_id,
+        'script': target['name'],
+        'stream_url': f'/api/builds/{build_id}/stream',
     }), 202
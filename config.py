@@ -1,6 +1,11 @@
 import os
 
 
+def _env_int(name, default=None):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-change-me')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
@@ -8,4 +13,109 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     SCRIPTS_FOLDER = 'scripts'
     BUILDS_FOLDER = 'builds'
+    # Per-node read-through cache of script versions from the content store
+    SCRIPT_CACHE_FOLDER = os.environ.get('SCRIPT_CACHE_FOLDER', 'script_cache')
+    SCRIPT_CACHE_MAX_BYTES = int(os.environ.get('SCRIPT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    ARTIFACT_STORE_FOLDER = os.environ.get('ARTIFACT_STORE_FOLDER', 'artifacts')
     RULES_FILE = 'config/rules.json'
+    # Rows per chunk when streaming CSV/JSONL/XLSX/Parquet exports
+    EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 1000))
+    # Re-extraction of stored results after rule edits (0 workers = one per CPU).
+    # Jobs are tracked in memory by the process that started them: other workers
+    # don't list them and a restart drops them. Starting a new job resumes the
+    # work, since results already brought up to date are skipped.
+    REEXTRACT_ON_RULE_CHANGE = os.environ.get('REEXTRACT_ON_RULE_CHANGE', '1') != '0'
+    REEXTRACT_BATCH_SIZE = int(os.environ.get('REEXTRACT_BATCH_SIZE', 500))
+    REEXTRACT_WORKERS = int(os.environ.get('REEXTRACT_WORKERS', 0))
+    # OCR for pages without a text layer (needs pytesseract + tesseract; 0 workers = one per CPU)
+    OCR_ENABLED = os.environ.get('OCR_ENABLED', '1') != '0'
+    OCR_TESSERACT_CMD = os.environ.get('OCR_TESSERACT_CMD', 'tesseract')
+    OCR_LANG = os.environ.get('OCR_LANG', 'eng')
+    OCR_DPI = int(os.environ.get('OCR_DPI', 300))
+    OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 0))
+    OCR_PAGE_TIMEOUT = int(os.environ.get('OCR_PAGE_TIMEOUT', 120))
+    OCR_CACHE_FOLDER = os.environ.get('OCR_CACHE_FOLDER', 'ocr_cache')
+    # Automatic template selection when extracting without a template
+    CLASSIFIER_ENABLED = os.environ.get('CLASSIFIER_ENABLED', '1') != '0'
+    CLASSIFIER_MIN_SCORE = float(os.environ.get('CLASSIFIER_MIN_SCORE', 0.15))
+    CLASSIFIER_RULE_WEIGHT = float(os.environ.get('CLASSIFIER_RULE_WEIGHT', 2.0))
+    CLASSIFIER_EXAMPLES = int(os.environ.get('CLASSIFIER_EXAMPLES', 50))  # per template
+    CLASSIFIER_CHECK_SECONDS = float(os.environ.get('CLASSIFIER_CHECK_SECONDS', 5))
+    # Full rebuild at most this often to pick up new example documents
+    CLASSIFIER_REBUILD_SECONDS = float(os.environ.get('CLASSIFIER_REBUILD_SECONDS', 300))
+    # Watched drop folder for scanner/SFTP ingestion (unset = disabled). Pollers of
+    # one folder must all run on one host: claims use flock, which NFS/CIFS don't share
+    DROP_FOLDER = os.environ.get('DROP_FOLDER')
+    DROP_FOLDER_POLL_INTERVAL = float(os.environ.get('DROP_FOLDER_POLL_INTERVAL', 2))
+    DROP_FOLDER_WORKERS = int(os.environ.get('DROP_FOLDER_WORKERS', 2))
+    DROP_FOLDER_SETTLE_SECONDS = float(os.environ.get('DROP_FOLDER_SETTLE_SECONDS', 2))  # unchanged this long = fully written
+
+    # Precompiled rule-set artifacts (file or directory of *.json) loaded at boot
+    RULESET_ARTIFACTS = os.environ.get('RULESET_ARTIFACTS')
+
+    # Readiness thresholds for /readyz
+    HEALTH_MAX_DB_LATENCY_MS = int(os.environ.get('HEALTH_MAX_DB_LATENCY_MS', 250))
+    HEALTH_MIN_FREE_DISK_MB = int(os.environ.get('HEALTH_MIN_FREE_DISK_MB', 500))
+    HEALTH_MAX_QUEUED_BUILDS = int(os.environ.get('HEALTH_MAX_QUEUED_BUILDS', 16))
+
+    # Only the process holding the scheduler lease fires cron jobs
+    SCHEDULER_LEADER_ELECTION = os.environ.get('SCHEDULER_LEADER_ELECTION', '1') != '0'
+    SCHEDULER_LEASE_TTL = int(os.environ.get('SCHEDULER_LEASE_TTL', 15))
+    # Seconds between polls of the schedule_changes feed
+    SCHEDULER_SYNC_INTERVAL = float(os.environ.get('SCHEDULER_SYNC_INTERVAL', 2))
+    # Change rows this recent are re-read on every poll, in case a lower id committed late
+    SCHEDULER_CHANGE_OVERLAP = int(os.environ.get('SCHEDULER_CHANGE_OVERLAP', 300))
+
+    # Concurrent script builds per process; extra builds queue as 'pending'
+    RUNNER_MAX_WORKERS = int(os.environ.get('RUNNER_MAX_WORKERS', 4))
+    # 'subprocess' (fresh interpreter per build) or 'warm' (fork from pre-warmed zygotes)
+    RUNNER_BACKEND = os.environ.get('RUNNER_BACKEND', 'subprocess')
+    RUNNER_WARM_POOL_SIZE = int(os.environ.get('RUNNER_WARM_POOL_SIZE', 1))
+    RUNNER_PRELOAD_MODULES = os.environ.get('RUNNER_PRELOAD_MODULES', '')
+    # Defaults for scripts without their own limits (unset = unlimited)
+    RUNNER_DEFAULT_TIMEOUT = _env_int('RUNNER_DEFAULT_TIMEOUT')
+    RUNNER_DEFAULT_CPU_SECONDS = _env_int('RUNNER_DEFAULT_CPU_SECONDS')
+    RUNNER_DEFAULT_MEMORY_MB = _env_int('RUNNER_DEFAULT_MEMORY_MB')
+    RUNNER_DEFAULT_NICE = _env_int('RUNNER_DEFAULT_NICE', 0)
+    # Per-script virtualenvs, built offline from a local wheelhouse and LRU-evicted
+    ENVS_FOLDER = os.environ.get('ENVS_FOLDER', 'envs')
+    WHEELHOUSE_FOLDER = os.environ.get('WHEELHOUSE_FOLDER', 'wheelhouse')
+    ENVS_MAX_COUNT = _env_int('ENVS_MAX_COUNT', 20)
+    # Seconds between SIGTERM and SIGKILL when a build's process group is stopped
+    RUNNER_KILL_GRACE = int(os.environ.get('RUNNER_KILL_GRACE', 5))
+    # Lines of a finished build's log returned by the JSON output endpoint and SSE replay
+    BUILD_OUTPUT_TAIL_LINES = int(os.environ.get('BUILD_OUTPUT_TAIL_LINES', 5000))
+    # Full-text index of build output (separate SQLite/FTS5 database)
+    LOG_INDEX_ENABLED = os.environ.get('LOG_INDEX_ENABLED', '1') != '0'
+    LOG_INDEX_PATH = os.environ.get('LOG_INDEX_PATH', os.path.join('builds', 'log_index.db'))
+    LOG_INDEX_FLUSH_BATCH = int(os.environ.get('LOG_INDEX_FLUSH_BATCH', 1000))
+    # Random delay (seconds) added to each cron fire time to spread bursts
+    SCHEDULER_JITTER_SECONDS = int(os.environ.get('SCHEDULER_JITTER_SECONDS', 0))
+    SCHEDULER_MISFIRE_GRACE = int(os.environ.get('SCHEDULER_MISFIRE_GRACE', 60))
+
+    # GitHub Gist sync outbox (GIST_API_URL can point at a local fake server)
+    GIST_API_URL = os.environ.get('GIST_API_URL', 'https://api.github.com')
+    GIST_HTTP_TIMEOUT = (5, float(os.environ.get('GIST_HTTP_TIMEOUT', 15)))  # (connect, read)
+    GIST_SYNC_DEBOUNCE = float(os.environ.get('GIST_SYNC_DEBOUNCE', 1))
+    GIST_SYNC_POLL_INTERVAL = float(os.environ.get('GIST_SYNC_POLL_INTERVAL', 2))
+    GIST_SYNC_BACKOFF = int(os.environ.get('GIST_SYNC_BACKOFF', 5))
+    GIST_SYNC_MAX_BACKOFF = int(os.environ.get('GIST_SYNC_MAX_BACKOFF', 600))
+    GIST_SYNC_MAX_ATTEMPTS = int(os.environ.get('GIST_SYNC_MAX_ATTEMPTS', 8))
+    # Bulk reconciliation: parallel checks, request rate cap and the rate-limit floor
+    GIST_RECONCILE_CONCURRENCY = int(os.environ.get('GIST_RECONCILE_CONCURRENCY', 8))
+    GIST_RECONCILE_RATE = float(os.environ.get('GIST_RECONCILE_RATE', 10))  # requests/s
+    GIST_RECONCILE_MIN_REMAINING = int(os.environ.get('GIST_RECONCILE_MIN_REMAINING', 50))
+    GIST_RECONCILE_INTERVAL = int(os.environ.get('GIST_RECONCILE_INTERVAL', 0))  # seconds, 0 = manual only
+
+    # Webhook fast path: token cache, delivery dedupe and batched ingest
+    WEBHOOK_TOKEN_CACHE_TTL = int(os.environ.get('WEBHOOK_TOKEN_CACHE_TTL', 30))
+    WEBHOOK_DEDUPE_WINDOW = int(os.environ.get('WEBHOOK_DEDUPE_WINDOW', 3600))
+    WEBHOOK_DEDUPE_HEADERS = ('Idempotency-Key', 'X-GitHub-Delivery', 'X-Delivery-Id', 'X-Request-Id')
+    WEBHOOK_FLUSH_INTERVAL = float(os.environ.get('WEBHOOK_FLUSH_INTERVAL', 0.05))
+    WEBHOOK_FLUSH_BATCH = int(os.environ.get('WEBHOOK_FLUSH_BATCH', 200))
+    # A buffered delivery whose insert keeps failing is dropped after this many tries
+    WEBHOOK_FLUSH_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_FLUSH_MAX_ATTEMPTS', 5))
+    # Bodies above this many bytes are spooled to a file instead of WEBHOOK_PAYLOAD
+    WEBHOOK_PAYLOAD_INLINE_LIMIT = int(os.environ.get('WEBHOOK_PAYLOAD_INLINE_LIMIT', 64 * 1024))
+    # Spooled payloads of builds finished this many days ago are deleted (0 = keep them with the build)
+    WEBHOOK_PAYLOAD_RETENTION_DAYS = int(os.environ.get('WEBHOOK_PAYLOAD_RETENTION_DAYS', 0))
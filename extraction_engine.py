@@ -1,25 +1,114 @@
-import pdfplumber
+import hashlib
 import re
 
-def extract_text_from_pdf(pdf_path):
+# Flags every extraction rule is matched with
+RULE_FLAGS = re.MULTILINE | re.IGNORECASE
+
+
+def compile_rule(pattern):
     """
-    Extracts all text from a PDF file.
+    Compiles a rule regex with the standard rule flags.
+    Raises re.error for invalid patterns.
     """
-    text = ""
+    return re.compile(pattern, RULE_FLAGS)
+
+
+def page_content_hash(page):
+    """
+    sha256 of a page's images (data and placement) plus its size and
+    rotation, falling back to its content streams when it has no images.
+    The same scanned page hashes the same in any PDF it is copied into.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{round(page.width)}x{round(page.height)}r{page.rotation}".encode())
+    images = [image for image in page.images if image.get('stream') is not None]
+    for image in images:
+        digest.update(f"{round(image['x0'])},{round(image['top'])},{round(image['x1'])},{round(image['bottom'])}".encode())
+        digest.update(image['stream'].get_rawdata() or b'')
+    if not images:
+        from pdfminer.pdftypes import resolve1
+
+        for stream in page.page_obj.contents or []:
+            stream = resolve1(stream)
+            if hasattr(stream, 'get_rawdata'):
+                digest.update(stream.get_rawdata() or b'')
+    return digest.hexdigest()
+
+
+def extract_pdf_pages(pdf_path, layout_words=150, ocr=None):
+    """
+    Extracts the text of every page, plus the first page's layout:
+    {'width', 'height', 'words': [(text, x0, top), ...]} with at most
+    layout_words words (None for an empty PDF). One pdfplumber pass.
+
+    Pages without a text layer (scans) come back empty unless `ocr` is given:
+    a callable (pdf_path, [(page_index, page_hash), ...]) -> {page_index: text},
+    see services.ocr. Returns (pages, layout, sources) where sources[i] is
+    'text', 'ocr', 'empty' (nothing to read, or OCR found nothing),
+    'ocr_failed' (OCR was tried and failed) or 'none' (no text layer and not
+    OCR'd: OCR off or unavailable).
+    """
+    import pdfplumber  # Imported lazily: it's heavy and only needed when a PDF is read
+
+    pages = []
+    sources = []
+    without_text = []
+    layout = None
     try:
         with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+            for i, page in enumerate(pdf.pages):
+                page_text = page.extract_text() or ""
+                pages.append(page_text)
+                if page_text.strip():
+                    sources.append('text')
+                elif ocr is None:
+                    sources.append('none')
+                elif page.images:
+                    sources.append('none')  # Until OCR reads it
+                    without_text.append((i, page_content_hash(page)))
+                else:
+                    sources.append('empty')
+                if i == 0 and layout_words:
+                    words = page.extract_words()[:layout_words]
+                    layout = {
+                        'width': float(page.width),
+                        'height': float(page.height),
+                        'words': [(w['text'], float(w['x0']), float(w['top'])) for w in words],
+                    }
     except Exception as e:
         print(f"Error reading PDF: {e}")
         raise e
-    return text
+
+    if without_text:
+        texts = ocr(pdf_path, without_text)
+        for i, _ in without_text:
+            page_text = texts.get(i)
+            if page_text is None:
+                sources[i] = 'ocr_failed'
+            elif page_text.strip():
+                pages[i] = page_text
+                sources[i] = 'ocr'
+            else:
+                sources[i] = 'empty'
+    return pages, layout, sources
+
+
+def join_pages(pages):
+    return "".join(page + "\n" for page in pages if page)
+
+
+def extract_text_from_pdf(pdf_path, ocr=None):
+    """
+    Extracts all text from a PDF file.
+    """
+    pages, _, _ = extract_pdf_pages(pdf_path, layout_words=0, ocr=ocr)
+    return join_pages(pages)
+
 
 def apply_rules(text, rules):
     """
     Applies regex rules to the extracted text.
+    Rules may carry a precompiled pattern under 'compiled' (see services.ruleset).
     """
     extracted_data = {}
     
@@ -31,7 +120,11 @@ def apply_rules(text, rules):
             continue
             
         try:
-            matches = re.findall(pattern, text, re.MULTILINE | re.IGNORECASE)
+            compiled = rule.get('compiled')
+            if compiled is not None:
+                matches = compiled.findall(text)
+            else:
+                matches = re.findall(pattern, text, RULE_FLAGS)
             # Default behavior: take the first match or all depending on requirement
             # Here we just take the first match for simplicity, or a list if multiple expected
             if matches:
@@ -45,3 +138,25 @@ def apply_rules(text, rules):
             extracted_data[field_name] = "Invalid Regex"
             
     return extracted_data
+
+
+def reapply_rules(items, rules):
+    """
+    Re-runs rules over already extracted text, one field subset per item.
+    items: [(key, text, field_names)]; returns [(key, {field: value})].
+    Pure function over plain data so it can run in a worker process.
+    """
+    prepared = []
+    for rule in rules:
+        rule = {'field_name': rule.get('field_name'), 'regex': rule.get('regex')}
+        try:
+            rule['compiled'] = compile_rule(rule['regex']) if rule['regex'] else None
+        except re.error:
+            pass  # apply_rules reports it as "Invalid Regex"
+        prepared.append(rule)
+
+    results = []
+    for key, text, field_names in items:
+        wanted = set(field_names)
+        results.append((key, apply_rules(text, [r for r in prepared if r['field_name'] in wanted])))
+    return results
@@ -20,7 +20,7 @@ import {
 
 export const ScriptsManager = () => {
     const dispatch = useAppDispatch();
-    const { items: scripts, collections, activeScriptId, activeScriptContent, builds, currentBuildOutput, saveStatus, schedule } = useAppSelector((state) => state.scripts);
+    const { items: scripts, collections, activeScriptId, activeScriptContent, activeScriptBaseHash, builds, currentBuildOutput, saveStatus, schedule } = useAppSelector((state) => state.scripts);
     const { settings } = useAppSelector((state) => state.settings);
     const consoleRef = useRef<HTMLDivElement>(null);
     const eventSourceRef = useRef<EventSource | null>(null);
@@ -61,19 +61,30 @@ export const ScriptsManager = () => {
         }
     }, [currentBuildOutput]);
 
-    const handleSave = async () => {
-        if (activeScriptId) {
-            const script = scripts.find(s => s.id === activeScriptId);
-            if (script) {
-                await dispatch(saveScript({
-                    id: activeScriptId,
-                    name: script.name,
-                    content: activeScriptContent,
-                    // @ts-ignore
-                    sync_to_gist: script.sync_to_gist
-                }));
+    // Saves the editor content; base_hash makes the server refuse (409) if someone saved in between
+    const saveActiveScript = async (syncToGist?: boolean) => {
+        if (!activeScriptId) return false;
+        const script = scripts.find(s => s.id === activeScriptId);
+        if (!script) return false;
+
+        const result = await dispatch(saveScript({
+            id: activeScriptId,
+            name: script.name,
+            content: activeScriptContent,
+            base_hash: activeScriptBaseHash ?? undefined,
+            sync_to_gist: syncToGist ?? script.sync_to_gist
+        }));
+        if (saveScript.rejected.match(result) && (result.payload as { conflict?: boolean } | undefined)?.conflict) {
+            if (confirm("This script was changed elsewhere since you opened it. Load the latest version? Your unsaved edits will be lost.")) {
+                dispatch(fetchScriptContent(activeScriptId));
             }
+            return false;
         }
+        return saveScript.fulfilled.match(result);
+    };
+
+    const handleSave = async () => {
+        await saveActiveScript();
     };
 
     const toggleGistSync = async (enabled: boolean) => {
@@ -82,20 +93,10 @@ export const ScriptsManager = () => {
             return;
         }
 
-        if (activeScriptId) {
-            const script = scripts.find(s => s.id === activeScriptId);
-            if (script) {
-                await dispatch(saveScript({
-                    id: activeScriptId,
-                    name: script.name,
-                    content: activeScriptContent,
-                    // @ts-ignore
-                    sync_to_gist: enabled
-                }));
-                // Functionally we should update local state optimistically or wait for fetchScripts
-                // saveScript returns updated script so it should update store
-                dispatch(fetchScripts());
-            }
+        if (await saveActiveScript(enabled)) {
+            // Functionally we should update local state optimistically or wait for fetchScripts
+            // saveScript returns updated script so it should update store
+            dispatch(fetchScripts());
         }
     }
 
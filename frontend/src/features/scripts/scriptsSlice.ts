@@ -18,12 +18,14 @@ export interface Script {
     gist_id?: string
     gist_url?: string
     sync_to_gist?: boolean
+    // Current version in the content store; send back as base_hash to detect conflicting saves
+    content_hash?: string
 }
 
 export interface Build {
     id: string
     script_id: string
-    status: 'pending' | 'success' | 'failure'
+    status: 'pending' | 'running' | 'success' | 'failure' | 'timeout' | 'cpu_limit' | 'memory_limit' | 'misfired' | 'cancelled' | 'skipped'
     started_at: string
     completed_at?: string
     triggered_by: string
@@ -42,6 +44,8 @@ interface ScriptsState {
     collections: Collection[];
     activeScriptId: string | null;
     activeScriptContent: string;
+    // content_hash of the version loaded into the editor, sent as base_hash on save
+    activeScriptBaseHash: string | null;
     builds: Build[];
     currentBuildOutput: string;
     status: 'idle' | 'loading' | 'succeeded' | 'failed';
@@ -60,6 +64,7 @@ const initialState: ScriptsState = {
     collections: [],
     activeScriptId: null,
     activeScriptContent: '',
+    activeScriptBaseHash: null,
     builds: [],
     currentBuildOutput: '',
     status: 'idle',
@@ -88,9 +93,17 @@ export const createScript = createAsyncThunk('scripts/createScript', async (name
     return response.data
 })
 
-export const saveScript = createAsyncThunk('scripts/saveScript', async (data: { id: string; name: string; content: string }) => {
-    const response = await axios.post('/api/scripts', data)
-    return response.data
+export const saveScript = createAsyncThunk('scripts/saveScript', async (data: { id: string; name: string; content: string; base_hash?: string; sync_to_gist?: boolean }, { rejectWithValue }) => {
+    try {
+        const response = await axios.post('/api/scripts', data)
+        return response.data
+    } catch (err) {
+        // 409: someone saved a newer version since base_hash was loaded
+        if (axios.isAxiosError(err) && err.response?.status === 409) {
+            return rejectWithValue({ conflict: true, error: err.response.data?.error as string })
+        }
+        throw err
+    }
 })
 
 export const runScript = createAsyncThunk('scripts/runScript', async (id: string) => {
@@ -167,6 +180,7 @@ const scriptsSlice = createSlice({
         setActiveScript(state, action: PayloadAction<string | null>) {
             state.activeScriptId = action.payload
             state.activeScriptContent = ''
+            state.activeScriptBaseHash = null
             state.currentBuildOutput = ''
             state.builds = []
             state.schedule = { cron: '', enabled: false, nextRun: null, status: 'idle' } // Reset schedule
@@ -189,17 +203,22 @@ const scriptsSlice = createSlice({
             })
             .addCase(fetchScriptContent.fulfilled, (state, action) => {
                 state.activeScriptContent = action.payload.content
+                state.activeScriptBaseHash = action.payload.content_hash ?? null
             })
             .addCase(createScript.fulfilled, (state, action) => {
                 state.items.push(action.payload)
                 state.activeScriptId = action.payload.id
                 state.activeScriptContent = '# New script\nprint("Hello World")'
+                state.activeScriptBaseHash = action.payload.content_hash ?? null
             })
             .addCase(saveScript.pending, (state) => {
                 state.saveStatus = 'saving'
             })
             .addCase(saveScript.fulfilled, (state, action) => {
                 state.saveStatus = 'saved'
+                if (action.payload.id === state.activeScriptId) {
+                    state.activeScriptBaseHash = action.payload.content_hash ?? null
+                }
                 // Update the script item in the list with the returned data (gist_url, gist_id, sync_to_gist, etc.)
                 const idx = state.items.findIndex(s => s.id === action.payload.id)
                 if (idx !== -1) {
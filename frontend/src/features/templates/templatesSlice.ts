@@ -5,6 +5,7 @@ export interface Template {
     id: string
     name: string
     description: string
+    filename_pattern: string | null
     created_at: string
 }
 
@@ -27,7 +28,7 @@ export const fetchTemplates = createAsyncThunk('templates/fetchTemplates', async
     return response.data
 })
 
-export const createTemplate = createAsyncThunk('templates/createTemplate', async (data: { name: string; description?: string }) => {
+export const createTemplate = createAsyncThunk('templates/createTemplate', async (data: { name: string; description?: string; filename_pattern?: string }) => {
     const response = await axios.post('/api/templates', data)
     return response.data
 })
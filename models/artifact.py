@@ -0,0 +1,28 @@
+from datetime import datetime
+from extensions import db
+
+
+class BuildArtifact(db.Model):
+    """
+    An output file a build left in its ARTIFACTS_DIR. The content lives in
+    the artifact store under its sha256, so identical files produced by
+    different builds share one blob.
+    """
+    __tablename__ = 'build_artifacts'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    build_id = db.Column(db.String(36), db.ForeignKey('builds.id'), nullable=False, index=True)
+    name = db.Column(db.String(500), nullable=False)  # Path relative to the artifacts dir
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'build_id': self.build_id,
+            'name': self.name,
+            'sha256': self.sha256,
+            'size': self.size,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
@@ -0,0 +1,85 @@
+import json
+import uuid
+from datetime import datetime
+from extensions import db
+
+
+class ExtractionDocument(db.Model):
+    """Extracted text of a PDF, keyed by the file's sha256, so it is parsed once."""
+    __tablename__ = 'extraction_documents'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    text = db.Column(db.Text, nullable=False)
+    fingerprint = db.Column(db.Text, nullable=True)  # JSON first-page features, see services.template_classifier
+    page_sources = db.Column(db.Text, nullable=True)  # JSON per page: 'text', 'ocr', 'empty', 'ocr_failed' or 'none'
+    size = db.Column(db.BigInteger, nullable=True)
+    extract_ms = db.Column(db.Float, nullable=True)  # pdfplumber time
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def get_page_sources(self):
+        return json.loads(self.page_sources or '[]')
+
+
+class ExtractionResult(db.Model):
+    """The fields one rule-set version extracted from one document."""
+    __tablename__ = 'extraction_results'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    document_hash = db.Column(db.String(64), db.ForeignKey('extraction_documents.sha256'), nullable=False, index=True)
+    filename = db.Column(db.String(500), nullable=True)
+    template_id = db.Column(db.String(36), nullable=True, index=True)
+    ruleset_hash = db.Column(db.String(80), nullable=False)
+    rule_hashes = db.Column(db.Text, nullable=True)  # JSON {field_name: fingerprint of its rules}
+    data = db.Column(db.Text, nullable=False)  # JSON, as returned by apply_rules
+    extract_ms = db.Column(db.Float, nullable=True)  # 0 when the stored text was reused
+    rules_ms = db.Column(db.Float, nullable=True)
+    is_current = db.Column(db.Boolean, default=True, index=True)  # False once re-extracted with newer rules
+    classifier_score = db.Column(db.Float, nullable=True)  # Set when the template was picked automatically
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    fields = db.relationship('ExtractionFieldValue', backref='result', lazy=True,
+                             cascade='all, delete-orphan')
+    document = db.relationship('ExtractionDocument', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_extraction_results_version', 'document_hash', 'template_id', 'ruleset_hash'),
+        db.Index('ix_extraction_results_template_created', 'template_id', 'created_at'),
+    )
+
+    def get_data(self):
+        return json.loads(self.data or '{}')
+
+    def get_rule_hashes(self):
+        return json.loads(self.rule_hashes or '{}')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_hash': self.document_hash,
+            'filename': self.filename,
+            'template_id': self.template_id,
+            'ruleset_hash': self.ruleset_hash,
+            'data': self.get_data(),
+            'extract_ms': self.extract_ms,
+            'rules_ms': self.rules_ms,
+            'is_current': self.is_current,
+            'classifier_score': self.classifier_score,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class ExtractionFieldValue(db.Model):
+    """One matched value of one field, for lookups and aggregates without parsing JSON."""
+    __tablename__ = 'extraction_field_values'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    result_id = db.Column(db.String(36), db.ForeignKey('extraction_results.id'), nullable=False, index=True)
+    field_name = db.Column(db.String(255), nullable=False)
+    match_index = db.Column(db.Integer, default=0)
+    value_text = db.Column(db.Text, nullable=True)
+    value_num = db.Column(db.Float, nullable=True)  # Parsed number, when the value looks like one
+
+    __table_args__ = (
+        db.Index('ix_field_values_text', 'field_name', 'value_text'),
+        db.Index('ix_field_values_num', 'field_name', 'value_num'),
+    )
@@ -0,0 +1,28 @@
+from datetime import datetime
+from extensions import db
+
+
+class GistSyncTask(db.Model):
+    """
+    Pending Gist sync for a script. One row per script, so rapid successive
+    saves collapse into a single upload of whatever is on disk when it runs.
+    """
+    __tablename__ = 'gist_sync_outbox'
+
+    script_id = db.Column(db.String(36), primary_key=True)
+    status = db.Column(db.String(20), default='pending')  # pending, failed
+    requested_at = db.Column(db.DateTime, default=datetime.utcnow)  # Last save that asked for a sync
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    locked_until = db.Column(db.DateTime, nullable=True)  # Claimed by a worker until then
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+    def to_dict(self):
+        return {
+            'script_id': self.script_id,
+            'status': self.status,
+            'requested_at': self.requested_at.isoformat() if self.requested_at else None,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+        }
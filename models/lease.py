@@ -0,0 +1,17 @@
+from extensions import db
+
+
+class Lease(db.Model):
+    """A named, time-bounded lock row used for leader election."""
+    __tablename__ = 'leases'
+
+    name = db.Column(db.String(100), primary_key=True)
+    holder = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'holder': self.holder,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+        }
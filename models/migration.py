@@ -0,0 +1,16 @@
+from datetime import datetime
+from extensions import db
+
+
+class SchemaMigration(db.Model):
+    """Marker row for a migration step that has already been applied."""
+    __tablename__ = 'schema_migrations'
+
+    name = db.Column(db.String(255), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'applied_at': self.applied_at.isoformat() if self.applied_at else None,
+        }
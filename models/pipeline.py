@@ -0,0 +1,77 @@
+import json
+import uuid
+from datetime import datetime
+from extensions import db
+
+
+class Pipeline(db.Model):
+    """A DAG of scripts: each step runs once all the steps it depends on succeeded."""
+    __tablename__ = 'pipelines'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = db.Column(db.String(255), nullable=False, unique=True)
+    description = db.Column(db.Text, default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    steps = db.relationship('PipelineStep', backref='pipeline', lazy=True,
+                            cascade='all, delete-orphan', order_by='PipelineStep.position')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'steps': [s.to_dict() for s in self.steps],
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class PipelineStep(db.Model):
+    __tablename__ = 'pipeline_steps'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    pipeline_id = db.Column(db.String(36), db.ForeignKey('pipelines.id'), nullable=False, index=True)
+    script_id = db.Column(db.String(36), db.ForeignKey('scripts.id'), nullable=False)
+    name = db.Column(db.String(255), nullable=False)  # Unique within the pipeline; used in depends_on
+    depends_on = db.Column(db.Text, default='[]')  # JSON list of step names
+    position = db.Column(db.Integer, default=0)
+
+    script = db.relationship('Script')
+
+    def get_depends_on(self):
+        return json.loads(self.depends_on or '[]')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'script_id': self.script_id,
+            'script_name': self.script.name if self.script else None,
+            'depends_on': self.get_depends_on(),
+        }
+
+
+class PipelineRun(db.Model):
+    """One execution of a pipeline. Step results are the Builds tagged with this run."""
+    __tablename__ = 'pipeline_runs'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    pipeline_id = db.Column(db.String(36), db.ForeignKey('pipelines.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='running')  # running, success, failure
+    triggered_by = db.Column(db.String(50), default='manual')
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # host:pid:boot of the process driving the run; its step callbacks die with it
+    owner = db.Column(db.String(255), nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'pipeline_id': self.pipeline_id,
+            'status': self.status,
+            'triggered_by': self.triggered_by,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,21 @@
+from datetime import datetime
+from extensions import db
+
+
+class ScheduleChange(db.Model):
+    """
+    Append-only change feed for script schedules. Each scheduler process
+    polls for ids above the last one it applied and re-syncs only those scripts.
+    """
+    __tablename__ = 'schedule_changes'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    script_id = db.Column(db.String(36), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'script_id': self.script_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
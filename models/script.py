@@ -23,6 +23,20 @@ class Script(db.Model):
     gist_url = db.Column(db.String(255), nullable=True)
     sync_to_gist = db.Column(db.Boolean, default=False)
     gist_filename = db.Column(db.String(512), nullable=True)  # Last synced filename in gist
+    gist_etag = db.Column(db.String(255), nullable=True)  # Remote ETag as of the last sync/check
+    gist_content_hash = db.Column(db.String(64), nullable=True)  # sha256 of the content last pushed
+
+    # Current version in the content-addressed store (services.script_store)
+    content_hash = db.Column(db.String(64), nullable=True)
+
+    # pip requirement lines; non-empty means the script runs in a cached virtualenv
+    requirements = db.Column(db.Text, nullable=True)
+
+    # Resource limits (None = use the RUNNER_DEFAULT_* setting)
+    timeout_seconds = db.Column(db.Integer, nullable=True)
+    cpu_limit_seconds = db.Column(db.Integer, nullable=True)
+    memory_limit_mb = db.Column(db.Integer, nullable=True)
+    nice = db.Column(db.Integer, nullable=True)
     
     # Foreign Key to Collection
     collection_id = db.Column(db.String(36), db.ForeignKey('collections.id'), nullable=True)
@@ -44,22 +58,40 @@ class Script(db.Model):
             'gist_id': self.gist_id,
             'gist_url': self.gist_url,
             'sync_to_gist': self.sync_to_gist,
-            'gist_filename': self.gist_filename
+            'gist_filename': self.gist_filename,
+            'content_hash': self.content_hash,
+            'requirements': self.requirements,
+            'timeout_seconds': self.timeout_seconds,
+            'cpu_limit_seconds': self.cpu_limit_seconds,
+            'memory_limit_mb': self.memory_limit_mb,
+            'nice': self.nice,
         }
 
 
 class Build(db.Model):
     __tablename__ = 'builds'
+    __table_args__ = (
+        # One build per webhook delivery, however many processes receive retries of it
+        db.Index('uq_builds_script_delivery', 'script_id', 'delivery_id', unique=True),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     script_id = db.Column(db.String(36), db.ForeignKey('scripts.id'), nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, running, success, failure
-    triggered_by = db.Column(db.String(50), default='manual')  # manual, webhook, scheduler
+    # pending, running, success, failure, timeout, cpu_limit, memory_limit, misfired, cancelled, skipped
+    status = db.Column(db.String(20), default='pending')
+    triggered_by = db.Column(db.String(50), default='manual')  # manual, webhook, scheduler, pipeline
     log_file = db.Column(db.String(500), nullable=True)
     started_at = db.Column(db.DateTime, nullable=True)
     finished_at = db.Column(db.DateTime, nullable=True)
     exit_code = db.Column(db.Integer, nullable=True)
     webhook_payload = db.Column(db.Text, nullable=True)
+    payload_path = db.Column(db.String(500), nullable=True)  # Spooled payload file for large webhook bodies
+    peak_rss_kb = db.Column(db.Integer, nullable=True)
+    cpu_seconds = db.Column(db.Float, nullable=True)
+    delivery_id = db.Column(db.String(255), nullable=True, index=True)  # Webhook idempotency key
+    script_hash = db.Column(db.String(64), nullable=True)  # Exact script version the build ran
+    pipeline_run_id = db.Column(db.String(36), nullable=True, index=True)
+    pipeline_step_id = db.Column(db.String(36), nullable=True)
 
     def to_dict(self):
         return {
@@ -68,6 +100,13 @@ class Build(db.Model):
             'status': self.status,
             'triggered_by': self.triggered_by,
             'exit_code': self.exit_code,
+            'peak_rss_kb': self.peak_rss_kb,
+            'cpu_seconds': self.cpu_seconds,
+            'delivery_id': self.delivery_id,
+            'payload_path': self.payload_path,
+            'script_hash': self.script_hash,
+            'pipeline_run_id': self.pipeline_run_id,
+            'pipeline_step_id': self.pipeline_step_id,
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'finished_at': self.finished_at.isoformat() if self.finished_at else None,
             'timestamp': self.started_at.timestamp() if self.started_at else None,
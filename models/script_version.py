@@ -0,0 +1,33 @@
+from datetime import datetime
+from extensions import db
+
+
+class ScriptBlob(db.Model):
+    """Immutable script content, addressed by its sha256."""
+    __tablename__ = 'script_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    content = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ScriptVersion(db.Model):
+    """One saved revision of a script; Script.content_hash points at the current one."""
+    __tablename__ = 'script_versions'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    script_id = db.Column(db.String(36), db.ForeignKey('scripts.id'), nullable=False, index=True)
+    version = db.Column(db.Integer, nullable=False)  # 1, 2, 3... per script
+    content_hash = db.Column(db.String(64), db.ForeignKey('script_blobs.sha256'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('script_id', 'version', name='uq_script_version'),)
+
+    def to_dict(self):
+        return {
+            'script_id': self.script_id,
+            'version': self.version,
+            'content_hash': self.content_hash,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
@@ -8,6 +8,8 @@ class ExtractionTemplate(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(255), nullable=False, unique=True)
     description = db.Column(db.Text, nullable=True)
+    # Glob matched against drop-folder file names, e.g. "INV_*.pdf" (case-insensitive)
+    filename_pattern = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship to Rules
@@ -18,5 +20,6 @@ class ExtractionTemplate(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
+            'filename_pattern': self.filename_pattern,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
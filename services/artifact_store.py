@@ -0,0 +1,80 @@
+"""
+Content-addressed storage for build artifacts.
+
+Every build gets an empty <build_dir>/<build_id>.artifacts/ directory, exposed
+to the script as ARTIFACTS_DIR. When the build finishes, collect_artifacts()
+walks that directory and moves each file into
+
+    ARTIFACT_STORE_FOLDER/<sha256[:2]>/<sha256>
+
+recording a BuildArtifact row (relative name, hash, size) per file. A file
+whose hash is already stored is simply deleted, so a nightly export that
+produces the same CSV every run occupies disk once. Blobs are immutable,
+which lets downloads use the hash as a strong ETag and serve range requests.
+"""
+import hashlib
+import os
+import shutil
+
+
+def artifacts_dir_for(log_file, build_id):
+    return os.path.join(os.path.dirname(log_file), f"{build_id}.artifacts")
+
+
+def blob_path(app, sha256):
+    store = os.path.abspath(app.config['ARTIFACT_STORE_FOLDER'])
+    return os.path.join(store, sha256[:2], sha256)
+
+
+def _hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_file(app, path):
+    """Move a file into the store. Returns (sha256, size)."""
+    sha256 = _hash_file(path)
+    size = os.path.getsize(path)
+    target = blob_path(app, sha256)
+    if os.path.exists(target):
+        os.remove(path)  # Already stored by an earlier build
+        return sha256, size
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.tmp-{os.getpid()}"
+    shutil.move(path, tmp)  # Falls back to copy when the store is on another filesystem
+    os.replace(tmp, target)
+    return sha256, size
+
+
+def collect_artifacts(app, build_id, artifacts_dir) -> list:
+    """
+    Move everything under artifacts_dir into the store and add BuildArtifact
+    rows to the session (caller commits). Symlinks are skipped so a script
+    can't publish files from outside its directory.
+    """
+    from extensions import db
+    from models.artifact import BuildArtifact
+
+    if not os.path.isdir(artifacts_dir):
+        return []
+
+    artifacts = []
+    for root, _, files in os.walk(artifacts_dir):
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            name = os.path.relpath(path, artifacts_dir).replace(os.sep, '/')
+            sha256, size = store_file(app, path)
+            artifact = BuildArtifact(build_id=build_id, name=name, sha256=sha256, size=size)
+            db.session.add(artifact)
+            artifacts.append(artifact)
+    shutil.rmtree(artifacts_dir, ignore_errors=True)
+    return artifacts
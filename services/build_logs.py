@@ -0,0 +1,128 @@
+"""
+Build log files with a sparse line-offset index.
+
+The runner writes each log through LogWriter, which also appends to
+<log>.idx the byte offset at which every LOG_INDEX_STRIDE-th line starts
+(8-byte little-endian integers, so entry i is the start of line
+(i + 1) * stride, 0-based). Readers use it to:
+
+- read_lines(offset, limit): seek to the nearest checkpoint at or before
+  the line, skip at most stride - 1 lines, and return just the page;
+- count_lines(): entries * stride plus the newlines after the last
+  checkpoint, so a total is cheap even for multi-GB logs;
+- tail_lines(n): scan backwards from EOF in blocks, so no index is needed.
+
+A missing or short .idx (logs written before this existed, or a build
+still running) only makes reads scan further; it never makes them wrong.
+"""
+import os
+import struct
+
+DEFAULT_STRIDE = 1000
+_ENTRY = struct.Struct('<Q')
+_BLOCK = 64 * 1024
+
+
+def index_path(log_file):
+    return f"{log_file}.idx"
+
+
+class LogWriter:
+    """Binary log writer that maintains the sparse line index as it goes."""
+
+    def __init__(self, log_file, stride=DEFAULT_STRIDE):
+        self.stride = stride
+        self.lines = 0
+        self.pos = 0
+        self._f = open(log_file, 'wb')
+        self._idx = open(index_path(log_file), 'wb')
+
+    def write(self, text):
+        data = text.encode('utf-8', errors='replace')
+        nl = data.find(b'\n')
+        while nl != -1:
+            self.lines += 1
+            if self.lines % self.stride == 0:
+                self._idx.write(_ENTRY.pack(self.pos + nl + 1))
+            nl = data.find(b'\n', nl + 1)
+        self._f.write(data)
+        self.pos += len(data)
+
+    def flush(self):
+        self._f.flush()
+        self._idx.flush()
+
+    def close(self):
+        self._f.close()
+        self._idx.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _checkpoint(log_file, line, stride):
+    """(line number, byte offset) of the last checkpoint at or before `line`."""
+    k = line // stride
+    if k == 0:
+        return 0, 0
+    try:
+        with open(index_path(log_file), 'rb') as idx:
+            size = os.fstat(idx.fileno()).st_size
+            k = min(k, size // _ENTRY.size)
+            if k == 0:
+                return 0, 0
+            idx.seek((k - 1) * _ENTRY.size)
+            return k * stride, _ENTRY.unpack(idx.read(_ENTRY.size))[0]
+    except OSError:
+        return 0, 0
+
+
+def read_lines(log_file, offset, limit, stride=DEFAULT_STRIDE):
+    """Return up to `limit` lines starting at 0-based line `offset`, as bytes."""
+    line_no, pos = _checkpoint(log_file, offset, stride)
+    out = []
+    with open(log_file, 'rb') as f:
+        f.seek(pos)
+        for line in f:
+            if line_no >= offset:
+                out.append(line)
+                if len(out) >= limit:
+                    break
+            line_no += 1
+    return b''.join(out)
+
+
+def count_lines(log_file, stride=DEFAULT_STRIDE):
+    """Total lines (a trailing partial line counts as one)."""
+    line_no, pos = _checkpoint(log_file, 1 << 62, stride)
+    last = b'\n'
+    with open(log_file, 'rb') as f:
+        f.seek(pos)
+        while True:
+            block = f.read(_BLOCK)
+            if not block:
+                break
+            line_no += block.count(b'\n')
+            last = block[-1:]
+    return line_no + (0 if last == b'\n' else 1)
+
+
+def tail_lines(log_file, n):
+    """Return the last `n` lines as bytes, reading backwards from EOF."""
+    if n <= 0:
+        return b''
+    with open(log_file, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        data = b''
+        # One extra newline is needed when the file ends with one
+        while pos > 0 and data.count(b'\n') <= n:
+            step = min(_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.splitlines(keepends=True)
+    return b''.join(lines[-n:])
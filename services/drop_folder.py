@@ -0,0 +1,268 @@
+"""
+Watched drop folder ingestion.
+
+Scanners and SFTP jobs write PDFs into DROP_FOLDER. A poller thread picks
+them up and extracts them through the results store (extract_document, i.e.
+extract_text_from_pdf + apply_rules), so they end up in the same stored
+results as HTTP uploads:
+
+    DROP_FOLDER/invoice_17.pdf                   new, waiting
+    DROP_FOLDER/processing/<claim>__invoice_17.pdf   claimed, being extracted
+    DROP_FOLDER/done/invoice_17.pdf              extracted
+    DROP_FOLDER/failed/invoice_17.pdf            extraction failed, plus
+    DROP_FOLDER/failed/invoice_17.pdf.error.txt  the error
+
+Files are claimed by renaming them into processing/, which is atomic, so
+when several processes poll the same folder each file goes to exactly one
+of them. The claimer locks the file (flock) before renaming it and holds the
+lock while it works. On every poll, claims whose lock can be taken (the
+owner died) are moved back and picked up again. A file that was already
+extracted before the crash hits the stored result (same hash and rule set)
+rather than being stored twice. A file that can't be moved to done/ is
+parked in failed/ instead, so it isn't recovered and extracted over and over.
+
+All pollers of one DROP_FOLDER must run on the same host (any number of
+processes there). flock isn't reliably shared between hosts over NFS or
+CIFS, so a poller on a second host could take a live claim for abandoned
+and extract the file twice.
+
+Only *.pdf files that haven't changed for DROP_FOLDER_SETTLE_SECONDS are
+claimed, so half-written uploads are left alone. Hidden files are ignored.
+At most DROP_FOLDER_WORKERS files are claimed at a time; the rest stay in
+the folder for the next poll (or another process).
+
+Each file goes to the first template whose filename_pattern (a glob,
+case-insensitive) matches, with longer patterns tried first. Files no
+pattern matches are extracted like /extract without a template: the
+template classifier picks one, or all rules run.
+
+Polling is used rather than inotify: it needs no extra dependency and also
+sees files that scanners on other machines write into a network mount,
+where inotify gets no events.
+"""
+import fcntl
+import fnmatch
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from extensions import db
+
+SUBFOLDERS = ('processing', 'done', 'failed')
+
+_lock = threading.Lock()
+_worker = None
+_status = {
+    'folder': None,
+    'running': False,
+    'in_progress': 0,
+    'processed': 0,
+    'cached': 0,
+    'failed': 0,
+    'recovered': 0,
+    'last_poll': None,
+    'last_file': None,
+    'last_error': None,
+}
+
+
+def init_drop_folder(app):
+    """Start the poller when DROP_FOLDER is set. Called from create_app()."""
+    global _worker
+    folder = app.config.get('DROP_FOLDER')
+    if not folder:
+        return
+    folder = os.path.abspath(folder)
+    for name in SUBFOLDERS:
+        os.makedirs(os.path.join(folder, name), exist_ok=True)
+
+    with _lock:
+        if _worker is not None:
+            return
+        _status['folder'] = folder
+        _status['running'] = True
+        _worker = threading.Thread(target=_poll_loop, args=(app, folder), name='drop-folder', daemon=True)
+        _worker.start()
+
+
+def get_status():
+    with _lock:
+        return dict(_status)
+
+
+def match_template(filename, templates):
+    """First template (longest pattern first) whose filename_pattern matches, else None."""
+    name = filename.lower()
+    for template in sorted(templates, key=lambda t: (-len(t.filename_pattern), t.name)):
+        if fnmatch.fnmatch(name, template.filename_pattern.lower()):
+            return template
+    return None
+
+
+def _poll_loop(app, folder):
+    interval = app.config.get('DROP_FOLDER_POLL_INTERVAL', 2)
+    workers = max(1, app.config.get('DROP_FOLDER_WORKERS', 2))
+    slots = threading.BoundedSemaphore(workers)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='drop-folder')
+    while True:
+        try:
+            recover_abandoned(folder)
+            for path in ready_files(folder, app.config.get('DROP_FOLDER_SETTLE_SECONDS', 2)):
+                if not slots.acquire(blocking=False):
+                    break  # All workers busy; leave the rest for the next poll
+                claimed = claim(folder, path)
+                if claimed is None:
+                    slots.release()  # Another process took it
+                    continue
+                pool.submit(_process, app, folder, claimed, slots)
+            with _lock:
+                _status['last_poll'] = datetime.utcnow().isoformat()
+        except Exception as e:
+            print(f"Warning: drop folder poll failed: {e}")
+            with _lock:
+                _status['last_error'] = str(e)[:500]
+        time.sleep(interval)
+
+
+def ready_files(folder, settle_seconds):
+    """PDFs at the top of the folder that have stopped changing, oldest first."""
+    now = time.time()
+    files = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.name.lower().endswith('.pdf'):
+                continue
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if now - mtime >= settle_seconds:
+                files.append((mtime, entry.path))
+    return [path for _, path in sorted(files)]
+
+
+def claim(folder, path):
+    """
+    Lock a file and move it into processing/. Returns (claimed path, open
+    lock file), or None when another process got it first. The lock is taken
+    before the rename, so a claim is never seen unlocked by recovery.
+    """
+    name = os.path.basename(path)
+    claimed = os.path.join(folder, 'processing', f"{uuid.uuid4().hex[:12]}__{name}")
+    try:
+        handle = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(path, claimed)
+    except (BlockingIOError, FileNotFoundError):
+        handle.close()
+        return None
+    return claimed, handle
+
+
+def original_name(claimed_path):
+    return os.path.basename(claimed_path).split('__', 1)[-1]
+
+
+def recover_abandoned(folder):
+    """Move claims whose owner is gone back into the folder. Returns how many."""
+    processing = os.path.join(folder, 'processing')
+    recovered = 0
+    for name in os.listdir(processing):
+        path = os.path.join(processing, name)
+        try:
+            with open(path, 'rb') as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Still being processed
+                os.rename(path, _unique_path(folder, original_name(path)))
+                recovered += 1
+        except FileNotFoundError:
+            continue  # Finished or recovered by someone else meanwhile
+    if recovered:
+        with _lock:
+            _status['recovered'] += recovered
+    return recovered
+
+
+def _unique_path(directory, name):
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        return path
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f"{stem}.{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}{ext}")
+
+
+def process_claimed(app, folder, claimed_path):
+    """Extract one claimed file and move it to done/ or failed/. Returns (outcome, detail)."""
+    from models.template import ExtractionTemplate
+    from services.results_store import extract_document
+
+    name = original_name(claimed_path)
+    with app.app_context():
+        try:
+            templates = ExtractionTemplate.query.filter(ExtractionTemplate.filename_pattern.isnot(None)).all()
+            template = match_template(name, [t for t in templates if t.filename_pattern])
+            result, _, cached = extract_document(
+                claimed_path, template.id if template else None, filename=name,
+            )
+            detail = {'result_id': result.id, 'template_id': result.template_id, 'cached': cached}
+        except Exception as e:
+            db.session.rollback()
+            _move_to_failed(folder, claimed_path, name, f"{type(e).__name__}: {e}")
+            return 'failed', str(e)
+        finally:
+            db.session.remove()
+
+    try:
+        os.rename(claimed_path, _unique_path(os.path.join(folder, 'done'), name))
+    except OSError as e:
+        # Left in processing/ it would be recovered and extracted again on every poll
+        error = f"Extracted (result {detail['result_id']}) but could not be moved to done/: {e}"
+        _move_to_failed(folder, claimed_path, name, error)
+        return 'failed', error
+    return ('cached' if detail['cached'] else 'processed'), detail
+
+
+def _move_to_failed(folder, claimed_path, name, error):
+    """Park a claimed file in failed/ next to an .error.txt. Returns False if even that fails."""
+    try:
+        failed_path = _unique_path(os.path.join(folder, 'failed'), name)
+        os.rename(claimed_path, failed_path)
+        with open(failed_path + '.error.txt', 'w') as f:
+            f.write(f"{datetime.utcnow().isoformat()} {error}\n")
+    except OSError as e:
+        print(f"Warning: drop folder could not move {claimed_path} to failed/: {e}")
+        return False
+    return True
+
+
+def _process(app, folder, claimed, slots):
+    claimed_path, handle = claimed
+    with _lock:
+        _status['in_progress'] += 1
+    try:
+        outcome, detail = process_claimed(app, folder, claimed_path)
+        with _lock:
+            _status[outcome] += 1
+            _status['last_file'] = {'name': original_name(claimed_path), 'outcome': outcome,
+                                    'at': datetime.utcnow().isoformat()}
+            if outcome == 'failed':
+                _status['last_error'] = detail[:500]
+    except Exception as e:
+        print(f"Warning: drop folder could not process {claimed_path}: {e}")
+        with _lock:
+            _status['last_error'] = str(e)[:500]
+    finally:
+        handle.close()  # Releases the claim lock
+        with _lock:
+            _status['in_progress'] -= 1
+        slots.release()
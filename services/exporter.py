@@ -0,0 +1,205 @@
+"""
+Streaming export of extraction results.
+
+Input is any iterable of records {'document': str, 'data': {field: value},
+'error': optional str}, typically a generator that extracts one PDF at a
+time, so neither the results nor the output file are held in memory.
+
+Records are flattened into rows before writing. A field that matched
+several times (apply_rules returns a list) becomes one row per match, and
+the row's match_index says which. Several list fields in one record are
+zipped by index, scalar fields repeat on every row, and regex group tuples
+are joined with spaces.
+
+Writers yield bytes in chunks of EXPORT_CHUNK_ROWS rows:
+
+    csv      csv module, one chunk per block of rows
+    jsonl    one JSON object per row
+    xlsx     openpyxl write-only workbook (constant memory), spooled to a
+             temp file and streamed back once complete
+    parquet  pyarrow ParquetWriter, one row group per chunk, spooled the
+             same way
+
+openpyxl and pyarrow are in requirements.txt but imported only when those
+formats are requested, so a trimmed install still serves CSV and JSONL;
+ExportError then says which package is missing.
+"""
+import csv
+import io
+import itertools
+import json
+import os
+import tempfile
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+BASE_COLUMNS = ['document', 'match_index']
+
+
+class ExportError(Exception):
+    """Unsupported format or a missing optional dependency."""
+
+
+def _cell(value):
+    if isinstance(value, tuple):
+        return ' '.join(str(v) for v in value if v)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value)
+
+
+def flatten_record(record, fields):
+    """Yield one row dict per match index for a single record."""
+    data = record.get('data') or {}
+    lists = {f: data[f] for f in fields if isinstance(data.get(f), list)}
+    count = max((len(v) for v in lists.values()), default=1) or 1
+    for i in range(count):
+        row = {'document': record.get('document'), 'match_index': i}
+        for field in fields:
+            if field in lists:
+                value = lists[field][i] if i < len(lists[field]) else None
+            else:
+                value = data.get(field)
+            row[field] = _cell(value)
+        if 'error' in record:
+            row['error'] = record['error']
+        yield row
+
+
+def plan_columns(records, fields=None, include_error=False, sample_size=1000):
+    """
+    Decide the column list up front (CSV headers and Parquet schemas can't
+    change mid-stream). Without explicit fields, the union of keys in the
+    first sample_size records is used; keys first seen later are not exported.
+    Returns (columns, fields, records) with the sample re-chained in front.
+    """
+    records = iter(records)
+    if fields is None:
+        sample = list(itertools.islice(records, sample_size))
+        fields = []
+        for record in sample:
+            for key in (record.get('data') or {}):
+                if key not in fields:
+                    fields.append(key)
+            include_error = include_error or 'error' in record
+        records = itertools.chain(sample, records)
+    columns = BASE_COLUMNS + list(fields) + (['error'] if include_error else [])
+    return columns, list(fields), records
+
+
+def _rows(records, fields, columns):
+    for record in records:
+        for row in flatten_record(record, fields):
+            yield [row.get(c) for c in columns]
+
+
+def _chunks(rows, size):
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_export(fmt, records, fields=None, include_error=False, chunk_rows=1000):
+    """Return a generator of bytes for the whole export."""
+    if fmt not in FORMATS:
+        raise ExportError(f"Unsupported format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+    if fmt == 'xlsx':
+        _require('openpyxl', 'xlsx')
+    elif fmt == 'parquet':
+        _require('pyarrow', 'parquet')
+
+    columns, fields, records = plan_columns(records, fields, include_error)
+    chunks = _chunks(_rows(records, fields, columns), chunk_rows)
+    writer = {'csv': _write_csv, 'jsonl': _write_jsonl, 'xlsx': _write_xlsx, 'parquet': _write_parquet}[fmt]
+    return writer(columns, chunks)
+
+
+def _require(module, fmt):
+    import importlib.util
+    if importlib.util.find_spec(module) is None:
+        raise ExportError(f"{fmt} export requires the '{module}' package")
+
+
+def _write_csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _write_jsonl(columns, chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in chunk).encode('utf-8')
+
+
+def _stream_file(path, block=256 * 1024):
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(block)
+                if not data:
+                    break
+                yield data
+    finally:
+        os.remove(path)
+
+
+def _temp_path(suffix):
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix='export_')
+    os.close(fd)
+    return path
+
+
+def _write_xlsx(columns, chunks):
+    from openpyxl import Workbook
+
+    path = _temp_path('.xlsx')
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Results')
+        sheet.append(columns)
+        for chunk in chunks:
+            for row in chunk:
+                sheet.append(row)
+        workbook.save(path)
+    except BaseException:
+        os.remove(path)
+        raise
+    yield from _stream_file(path)
+
+
+def _write_parquet(columns, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        pa.field(c, pa.int64() if c == 'match_index' else pa.string()) for c in columns
+    ])
+    path = _temp_path('.parquet')
+    try:
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in chunks:
+                arrays = []
+                for i, column in enumerate(columns):
+                    values = [row[i] for row in chunk]
+                    if column != 'match_index':
+                        values = [None if v is None else str(v) for v in values]
+                    arrays.append(pa.array(values, type=schema.field(column).type))
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    except BaseException:
+        os.remove(path)
+        raise
+    yield from _stream_file(path)
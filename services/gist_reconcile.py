@@ -0,0 +1,268 @@
+"""
+Bulk Gist reconciliation.
+
+reconcile() checks every script with sync_to_gist against its gist and
+pushes only the ones that drifted. The script store is the source of truth.
+
+1. Snapshot the synced scripts (current content from the script store, sha256).
+2. A thread pool (GIST_RECONCILE_CONCURRENCY) checks each gist with a
+   conditional GET (If-None-Match: Script.gist_etag):
+     304 and local hash == gist_content_hash   -> in_sync, no body transferred
+     200 and the remote file hashes the same   -> in_sync, new ETag remembered
+     anything else                             -> push (PATCH)
+     404                                       -> gist was deleted, recreate
+   Scripts never synced before are created.
+3. Results are written back in one transaction.
+
+Requests go through the pooled Gist session and a token bucket
+(GIST_RECONCILE_RATE requests/s). When GitHub reports fewer than
+GIST_RECONCILE_MIN_REMAINING calls left in the rate-limit window, the
+remaining scripts are reported as rate_limited instead of being attempted.
+
+One reconciliation runs at a time per process. run_async() starts it in the
+background (POST /api/gists/reconcile); get_status() returns progress and
+the last summary. GIST_RECONCILE_INTERVAL > 0 also runs it periodically on
+the scheduler, so only the leader process does it.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from extensions import db
+from services.script_store import get_content
+from services.gist_sync import (
+    GistSyncError, build_sync_request, content_hash, github_token, request,
+)
+
+_lock = threading.Lock()
+_status = {'running': False, 'progress': None, 'last_summary': None}
+
+
+class _RateLimiter:
+    """Token bucket shared by the reconcile workers."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def reconcile(app, dry_run=False):
+    """Run a full reconciliation and return the summary. dry_run reports drift without pushing."""
+    started = datetime.utcnow()
+    with app.app_context():
+        token = github_token()
+        items = _snapshot(app)
+
+    limiter = _RateLimiter(app.config.get('GIST_RECONCILE_RATE', 10))
+    stop = threading.Event()
+    progress = {'total': len(items), 'done': 0}
+    _status['progress'] = progress
+
+    def work(item):
+        try:
+            if stop.is_set():
+                item['result'] = 'rate_limited'
+            else:
+                _reconcile_one(app, token, item, limiter, stop, dry_run)
+        except Exception as e:
+            item['result'] = 'error'
+            item['error'] = str(e)[:500]
+        with _lock:
+            progress['done'] += 1
+        return item
+
+    with ThreadPoolExecutor(max_workers=app.config.get('GIST_RECONCILE_CONCURRENCY', 8),
+                            thread_name_prefix='gist-reconcile') as pool:
+        results = list(pool.map(work, items))
+
+    with app.app_context():
+        _apply(results)
+
+    counts = {}
+    for item in results:
+        counts[item['result']] = counts.get(item['result'], 0) + 1
+    return {
+        'started_at': started.isoformat(),
+        'finished_at': datetime.utcnow().isoformat(),
+        'dry_run': dry_run,
+        'total': len(results),
+        'counts': counts,
+        'requests': sum(item.get('requests', 0) for item in results),
+        'changed': [
+            {'script_id': i['script_id'], 'name': i['name'], 'result': i['result']}
+            for i in results if i['result'] in ('pushed', 'created', 'recreated', 'drifted')
+        ],
+        'errors': [
+            {'script_id': i['script_id'], 'name': i['name'], 'error': i.get('error')}
+            for i in results if i['result'] == 'error'
+        ],
+    }
+
+
+def _snapshot(app):
+    from models.script import Script
+
+    items = []
+    for script in Script.query.filter_by(sync_to_gist=True).order_by(Script.name).all():
+        item = {
+            'script_id': script.id,
+            'name': script.name,
+            'gist_id': script.gist_id,
+            'etag': script.gist_etag,
+            'synced_hash': script.gist_content_hash,
+            'requests': 0,
+        }
+        content = get_content(app, script)
+        if content is None:
+            item['result'] = 'missing_local'
+            items.append(item)
+            continue
+        item['hash'] = content_hash(content)
+        item['update'] = build_sync_request(script, content)
+        item['create'] = build_sync_request(script, content, create=True)
+        items.append(item)
+    return items
+
+
+def _call(app, token, item, limiter, stop, method, path, **kwargs):
+    limiter.acquire()
+    resp = request(app, method, path, token, **kwargs)
+    item['requests'] += 1
+    remaining = resp.headers.get('X-RateLimit-Remaining')
+    if remaining is not None and remaining.isdigit() and \
+            int(remaining) < app.config.get('GIST_RECONCILE_MIN_REMAINING', 50):
+        stop.set()
+    if resp.status_code in (403, 429) and remaining == '0':
+        stop.set()
+        raise GistSyncError('GitHub rate limit exhausted')
+    return resp
+
+
+def _reconcile_one(app, token, item, limiter, stop, dry_run):
+    if item.get('result') == 'missing_local':
+        return
+
+    action = 'created'
+    if item['gist_id']:
+        headers = {'If-None-Match': item['etag']} if item['etag'] else {}
+        resp = _call(app, token, item, limiter, stop, 'GET', f"/gists/{item['gist_id']}", headers=headers)
+        if resp.status_code == 304 and item['hash'] == item['synced_hash']:
+            item['result'] = 'in_sync'
+            return
+        if resp.status_code == 200:
+            filename = item['update'][3]
+            remote = (resp.json().get('files') or {}).get(filename) or {}
+            if not remote.get('truncated') and remote.get('content') is not None \
+                    and content_hash(remote['content']) == item['hash']:
+                item['result'] = 'in_sync'
+                item['new_etag'] = resp.headers.get('ETag')
+                item['new_hash'] = item['hash']
+                return
+            action = 'pushed'
+        elif resp.status_code == 304:
+            action = 'pushed'
+        elif resp.status_code == 404:
+            action = 'recreated'
+        else:
+            raise GistSyncError(f"Gist API Error {resp.status_code}: {resp.text[:200]}")
+
+    if dry_run:
+        item['result'] = 'drifted'
+        return
+    if stop.is_set():
+        item['result'] = 'rate_limited'
+        return
+
+    method, path, payload, filename = item['update'] if action == 'pushed' else item['create']
+    resp = _call(app, token, item, limiter, stop, method, path, json=payload)
+    if resp.status_code not in (200, 201):
+        raise GistSyncError(f"Gist API Error {resp.status_code}: {resp.text[:200]}")
+    data = resp.json()
+    item.update({
+        'result': action,
+        'new_gist_id': data['id'],
+        'new_gist_url': data['html_url'],
+        'new_filename': filename,
+        'new_etag': resp.headers.get('ETag'),
+        'new_hash': item['hash'],
+    })
+
+
+def _apply(results):
+    from models.script import Script
+
+    for item in results:
+        if 'new_hash' not in item:
+            continue
+        script = db.session.get(Script, item['script_id'])
+        if script is None:
+            continue
+        script.gist_etag = item.get('new_etag')
+        script.gist_content_hash = item['new_hash']
+        if 'new_gist_id' in item:
+            script.gist_id = item['new_gist_id']
+            script.gist_url = item['new_gist_url']
+            script.gist_filename = item['new_filename']
+    db.session.commit()
+
+
+def run_async(app, dry_run=False):
+    """Start a reconciliation in the background. Returns False if one is already running."""
+    with _lock:
+        if _status['running']:
+            return False
+        _status['running'] = True
+    threading.Thread(target=_run, args=(app, dry_run), name='gist-reconcile', daemon=True).start()
+    return True
+
+
+def _run(app, dry_run=False):
+    try:
+        _status['last_summary'] = reconcile(app, dry_run=dry_run)
+    except Exception as e:
+        _status['last_summary'] = {'error': str(e), 'finished_at': datetime.utcnow().isoformat()}
+        print(f"Warning: gist reconciliation failed: {e}")
+    finally:
+        with _lock:
+            _status['running'] = False
+
+
+def run_scheduled(app):
+    """Scheduler job body; skips if a run is already in progress."""
+    with _lock:
+        if _status['running']:
+            return
+        _status['running'] = True
+    _run(app)
+
+
+def get_status():
+    return {
+        'running': _status['running'],
+        'progress': dict(_status['progress']) if _status['running'] and _status['progress'] else None,
+        'last_summary': _status['last_summary'],
+    }
+
+
+def schedule_reconcile(app):
+    """Register the periodic job when GIST_RECONCILE_INTERVAL is set. Called from create_app()."""
+    interval = app.config.get('GIST_RECONCILE_INTERVAL', 0)
+    if not interval:
+        return
+    from services.scheduler_service import scheduler
+    scheduler.add_job(
+        run_scheduled, 'interval', seconds=interval, args=[app],
+        id='gist-reconcile', replace_existing=True,
+    )
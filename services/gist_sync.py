@@ -0,0 +1,306 @@
+"""
+GitHub Gist sync.
+
+Saving a script never talks to GitHub. The save handler calls
+enqueue_sync(), which upserts one gist_sync_outbox row per script in the
+same transaction as the save. A background worker in every process polls
+for due rows, claims one with a conditional UPDATE (so only one process
+uploads it), reads the script's current content from the script store and PATCHes or
+creates the gist.
+
+- Coalescing: a save pushes next_attempt_at out by GIST_SYNC_DEBOUNCE
+  seconds, so a burst of saves becomes one upload of the latest content. A
+  save that lands while an upload is in flight keeps the row for another pass.
+- Retries: failures back off exponentially (GIST_SYNC_BACKOFF doubling, capped
+  at GIST_SYNC_MAX_BACKOFF); after GIST_SYNC_MAX_ATTEMPTS the row is marked
+  'failed' with last_error until the next save or a forced sync.
+- HTTP: one pooled requests.Session with GIST_HTTP_TIMEOUT on every call.
+  Idempotent methods (GET/PATCH/DELETE) also get transport-level retries on
+  connection errors and 429/5xx; gist creation (POST) is retried only by the
+  outbox, to avoid creating duplicate gists.
+
+GIST_API_URL points at the GitHub API, or at a local fake server in tests.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from extensions import db
+
+_session = None
+_session_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+class GistSyncError(Exception):
+    """A Gist API call failed or sync isn't configured."""
+
+
+def _get_session(app):
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests  # Imported lazily to keep app startup fast
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({'GET', 'PATCH', 'DELETE'}),
+                respect_retry_after_header=True,
+            )
+            pool_size = max(4, app.config.get('GIST_RECONCILE_CONCURRENCY', 8))
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['Accept'] = 'application/vnd.github.v3+json'
+            _session = session
+        return _session
+
+
+def request(app, method, path, token, headers=None, **kwargs):
+    """Call the Gist API through the pooled session with the configured timeout."""
+    url = app.config['GIST_API_URL'].rstrip('/') + path
+    return _get_session(app).request(
+        method, url,
+        headers={'Authorization': f'token {token}', **(headers or {})},
+        timeout=app.config.get('GIST_HTTP_TIMEOUT', (5, 15)),
+        **kwargs,
+    )
+
+
+def github_token():
+    from models.setting import Setting
+    token_setting = db.session.get(Setting, 'github_token')
+    if not token_setting or not token_setting.value:
+        raise GistSyncError("No GitHub token configured. Please set your GitHub token in Settings.")
+    return token_setting.value
+
+
+def calculate_gist_filename(script):
+    """Calculate the gist filename based on script name and collection."""
+    gist_filename = script.name
+    if script.collection:
+        col_name = "".join(c for c in script.collection.name if c.isalnum() or c in (' ', '_', '-')).strip().replace(' ', '_')
+        gist_filename = f"{col_name}_{script.name}"
+    if not gist_filename.endswith('.py'):
+        gist_filename += '.py'
+    return gist_filename
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def gist_description(script):
+    collection_label = f" [{script.collection.name}]" if script.collection else ""
+    return f"Script: {script.name}{collection_label} (Document Extraction Portal)"
+
+
+def build_sync_request(script, content, create=False):
+    """
+    (method, path, payload, filename) that creates or updates the script's
+    gist with `content`. create=True forces a new gist (e.g. remote was deleted).
+    """
+    new_filename = calculate_gist_filename(script)
+    old_filename = script.gist_filename  # Previously tracked filename
+    description = gist_description(script)
+
+    if script.gist_id and not create:
+        files = {new_filename: {"content": content}}
+        # If the filename changed, delete the old file from the gist
+        if old_filename and old_filename != new_filename:
+            files[old_filename] = None  # null = delete file from gist
+        return 'PATCH', f"/gists/{script.gist_id}", {"description": description, "files": files}, new_filename
+    return 'POST', "/gists", {
+        "description": description,
+        "public": False,
+        "files": {new_filename: {"content": content}},
+    }, new_filename
+
+
+def sync_script_to_gist(app, script, content):
+    """Create or update the script's gist. Updates gist fields on the script; caller commits."""
+    token = github_token()
+    method, path, payload, filename = build_sync_request(script, content)
+    resp = request(app, method, path, token, json=payload)
+    if resp.status_code not in (200, 201):
+        raise GistSyncError(f"Gist API Error {resp.status_code}: {resp.text}")
+    data = resp.json()
+    script.gist_id = data['id']
+    script.gist_url = data['html_url']
+    script.gist_filename = filename
+    script.gist_etag = resp.headers.get('ETag')
+    script.gist_content_hash = content_hash(content)
+
+
+def delete_script_gist(app, script):
+    """Delete the gist from GitHub and clear gist fields on the script; caller commits."""
+    token = github_token()
+    if not script.gist_id:
+        return  # Nothing to delete
+
+    resp = request(app, 'DELETE', f"/gists/{script.gist_id}", token)
+    if resp.status_code not in (204, 404):
+        raise GistSyncError(f"Gist Delete Error {resp.status_code}: {resp.text}")
+
+    script.gist_id = None
+    script.gist_url = None
+    script.gist_filename = None
+    script.gist_etag = None
+    script.gist_content_hash = None
+    cancel_sync(script.id)
+
+
+# --- Outbox ---
+
+def enqueue_sync(app, script_id):
+    """Request a sync of the script's current content. Needs app context; caller commits."""
+    from models.gist_outbox import GistSyncTask
+
+    now = datetime.utcnow()
+    task = db.session.get(GistSyncTask, script_id)
+    if task is None:
+        task = GistSyncTask(script_id=script_id)
+        db.session.add(task)
+    task.status = 'pending'
+    task.requested_at = now
+    task.next_attempt_at = now + timedelta(seconds=app.config.get('GIST_SYNC_DEBOUNCE', 1))
+    task.attempts = 0
+    task.last_error = None
+    _wakeup.set()
+
+
+def cancel_sync(script_id):
+    """Drop any queued sync for the script (caller commits)."""
+    from models.gist_outbox import GistSyncTask
+    task = db.session.get(GistSyncTask, script_id)
+    if task:
+        db.session.delete(task)
+
+
+def get_sync_status(script_id):
+    from models.gist_outbox import GistSyncTask
+    task = db.session.get(GistSyncTask, script_id)
+    return task.to_dict() if task else {'script_id': script_id, 'status': 'synced'}
+
+
+def init_gist_sync(app):
+    """Start the outbox worker. Called from create_app()."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_worker_loop, args=(app,), name='gist-sync', daemon=True)
+            _worker.start()
+
+
+def _worker_loop(app):
+    interval = app.config.get('GIST_SYNC_POLL_INTERVAL', 2)
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            while process_due(app):
+                pass
+        except Exception as e:
+            print(f"Warning: gist sync worker failed: {e}")
+            time.sleep(interval)
+
+
+def process_due(app) -> int:
+    """Claim and run every due outbox row once. Returns the number processed."""
+    from models.gist_outbox import GistSyncTask
+
+    with app.app_context():
+        now = datetime.utcnow()
+        due = [row[0] for row in db.session.query(GistSyncTask.script_id).filter(
+            GistSyncTask.status == 'pending',
+            GistSyncTask.next_attempt_at <= now,
+            (GistSyncTask.locked_until.is_(None)) | (GistSyncTask.locked_until < now),
+        ).all()]
+
+        processed = 0
+        for script_id in due:
+            if _claim(script_id, now):
+                _process(app, script_id)
+                processed += 1
+        return processed
+
+
+def _claim(script_id, now):
+    from models.gist_outbox import GistSyncTask
+
+    result = db.session.execute(
+        update(GistSyncTask)
+        .where(GistSyncTask.script_id == script_id,
+               GistSyncTask.status == 'pending',
+               (GistSyncTask.locked_until.is_(None)) | (GistSyncTask.locked_until < now))
+        .values(locked_until=now + timedelta(minutes=5), attempts=GistSyncTask.attempts + 1)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _process(app, script_id):
+    from models.gist_outbox import GistSyncTask
+    from models.script import Script
+    from services.script_store import get_content
+
+    task = db.session.get(GistSyncTask, script_id)
+    requested_at = task.requested_at
+    script = db.session.get(Script, script_id)
+    try:
+        if script is None or not script.sync_to_gist:
+            db.session.delete(task)
+            db.session.commit()
+            return
+        content = get_content(app, script)
+        if content is None:
+            raise GistSyncError("Script has no content")
+        sync_script_to_gist(app, script, content)
+    except Exception as e:
+        db.session.rollback()
+        _record_failure(app, script_id, str(e))
+        return
+
+    # Commit the gist fields first: the row may have been cancelled meanwhile,
+    # and losing them would make the next sync create a second gist
+    db.session.commit()
+
+    # Keep the row if another save came in while we were uploading
+    task = db.session.get(GistSyncTask, script_id)
+    if task is None:
+        return  # Cancelled during the upload
+    if task.requested_at == requested_at:
+        db.session.delete(task)
+    else:
+        task.locked_until = None
+        task.attempts = 0
+    db.session.commit()
+
+
+def _record_failure(app, script_id, error):
+    from models.gist_outbox import GistSyncTask
+
+    task = db.session.get(GistSyncTask, script_id)
+    if task is None:
+        return
+    max_attempts = app.config.get('GIST_SYNC_MAX_ATTEMPTS', 8)
+    delay = min(app.config.get('GIST_SYNC_BACKOFF', 5) * 2 ** (task.attempts - 1),
+                app.config.get('GIST_SYNC_MAX_BACKOFF', 600))
+    task.last_error = error[:2000]
+    task.locked_until = None
+    if task.attempts >= max_attempts:
+        task.status = 'failed'
+    else:
+        task.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+    db.session.commit()
+    print(f"Failed to sync to Gist (attempt {task.attempts}): {error}")
@@ -0,0 +1,121 @@
+"""
+Leader election over a DB row lease — no external coordination service.
+
+Every process runs a LeaderLease heartbeat thread. A process becomes leader
+by claiming the row in `leases` with a single conditional UPDATE that only
+succeeds if it already holds the lease or the current lease has expired
+(INSERT when the row doesn't exist yet). The leader renews every ttl/3
+seconds; if it dies, a standby takes over once expires_at passes, i.e.
+within `ttl` seconds. A graceful shutdown releases the lease immediately.
+
+Leadership is also dropped the moment a renewal fails (DB unreachable),
+since the process can no longer prove it still holds the lease.
+
+Note: expiry is compared against each node's UTC clock, so hosts should be
+NTP-synced to well within the TTL.
+"""
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+
+class LeaderLease:
+    def __init__(self, app, name, ttl_seconds=15, on_elected=None, on_demoted=None):
+        self.app = app
+        self.name = name
+        self.ttl = ttl_seconds
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Try to acquire immediately, then keep renewing in a daemon thread."""
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._loop, name=f"lease-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.release()
+
+    def heartbeat(self):
+        """Acquire or renew the lease once and fire callbacks on transitions."""
+        try:
+            acquired = self._try_acquire()
+        except Exception as e:
+            print(f"Warning: lease '{self.name}' renewal failed: {e}")
+            acquired = False
+
+        if acquired and not self.is_leader:
+            self.is_leader = True
+            if self.on_elected:
+                self.on_elected()
+        elif not acquired and self.is_leader:
+            self.is_leader = False
+            if self.on_demoted:
+                self.on_demoted()
+
+    def release(self):
+        """Give up the lease so a standby can take over without waiting for expiry."""
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        if self.on_demoted:
+            self.on_demoted()
+        try:
+            with self.app.app_context():
+                from extensions import db
+                from models.lease import Lease
+
+                db.session.execute(
+                    Lease.__table__.update()
+                    .where(Lease.name == self.name, Lease.holder == self.holder_id)
+                    .values(expires_at=datetime.utcnow())
+                )
+                db.session.commit()
+        except Exception as e:
+            print(f"Warning: could not release lease '{self.name}': {e}")
+
+    def _loop(self):
+        interval = max(self.ttl / 3, 1)
+        while not self._stop.wait(interval):
+            self.heartbeat()
+
+    def _try_acquire(self) -> bool:
+        with self.app.app_context():
+            from extensions import db
+            from models.lease import Lease
+
+            now = datetime.utcnow()
+            expires_at = now + timedelta(seconds=self.ttl)
+            try:
+                result = db.session.execute(
+                    Lease.__table__.update()
+                    .where(Lease.name == self.name)
+                    .where((Lease.holder == self.holder_id) | (Lease.expires_at < now))
+                    .values(holder=self.holder_id, expires_at=expires_at)
+                )
+                if result.rowcount == 1:
+                    db.session.commit()
+                    return True
+
+                db.session.add(Lease(name=self.name, holder=self.holder_id, expires_at=expires_at))
+                db.session.commit()
+                return True
+            except IntegrityError:
+                # Row exists and is held by someone else
+                db.session.rollback()
+                return False
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def to_dict(self):
+        return {'name': self.name, 'holder_id': self.holder_id, 'is_leader': self.is_leader}
@@ -0,0 +1,282 @@
+"""
+Full-text index over build output.
+
+Lines are indexed as the runner writes them, into a separate SQLite database
+(LOG_INDEX_PATH) so index writes never contend with the app database:
+
+    log_builds(build_id PK, script_id, status, started_at, finished_at)
+    log_lines(id PK, build_id, line_no, ts, text)
+    log_fts  — FTS5 over log_lines.text (external content, rowid = log_lines.id)
+
+The runner only appends to an in-memory queue (index_line / index_build).
+A writer thread drains it in batches, one transaction per batch, so indexing
+costs a build nothing beyond a queue put. If the writer falls far behind,
+lines are dropped rather than slowing builds down; stats() counts them, so a
+search that may be missing lines can be told apart from one that isn't.
+
+search() runs the MATCH in FTS5, joins log_builds for the script/status
+filters and the line timestamp for the time range, and returns the newest
+hits first with a few lines of context around each. Logs written before the
+index existed (or while it was disabled) are added by start_backfill(), which
+queues every finished build's .log that the index doesn't know yet, waiting
+for queue space instead of dropping lines.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_builds (
+    build_id TEXT PRIMARY KEY,
+    script_id TEXT,
+    status TEXT,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_log_builds_script ON log_builds (script_id);
+CREATE TABLE IF NOT EXISTS log_lines (
+    id INTEGER PRIMARY KEY,
+    build_id TEXT NOT NULL,
+    line_no INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_log_lines_build ON log_lines (build_id, line_no);
+CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(
+    text, content='log_lines', content_rowid='id', tokenize='unicode61'
+);
+"""
+
+_MAX_LINE_CHARS = 4000
+
+_queue = queue.Queue(maxsize=100000)
+_path = None
+_writer = None
+_init_lock = threading.Lock()
+_dropped = 0
+_backfill = {'running': False, 'builds': 0, 'lines': 0, 'errors': 0, 'finished_at': None}
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_log_index(app):
+    """Create the index database and start the writer thread. Called from init_runner()."""
+    global _path, _writer
+    if not app.config.get('LOG_INDEX_ENABLED', True):
+        return
+    with _init_lock:
+        if _writer is not None:
+            return
+        path = os.path.abspath(app.config['LOG_INDEX_PATH'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            conn = _connect(path)
+            conn.executescript(_SCHEMA)
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Warning: build log index disabled: {e}")
+            return
+        _path = path
+        _writer = threading.Thread(
+            target=_write_loop, args=(app.config.get('LOG_INDEX_FLUSH_BATCH', 1000),),
+            name='log-index-writer', daemon=True,
+        )
+        _writer.start()
+
+
+def _put(item, block=False):
+    global _dropped
+    if _path is None:
+        return
+    try:
+        _queue.put(item, block=block)
+    except queue.Full:
+        _dropped += 1
+
+
+def index_build(build_id, script_id=None, status=None, started_at=None, finished_at=None):
+    """Record (or update) a build's filterable attributes."""
+    _put(('build', build_id, script_id, status, started_at, finished_at))
+
+
+def index_line(build_id, line_no, text):
+    _put(('line', build_id, line_no, time.time(), text.rstrip('\n')[:_MAX_LINE_CHARS]))
+
+
+def _write_loop(batch_size):
+    conn = _connect(_path)
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < batch_size:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write_batch(conn, batch)
+        except sqlite3.Error as e:
+            print(f"Warning: could not write {len(batch)} build log index entries: {e}")
+        time.sleep(0.05)  # Let lines accumulate so busy builds share a transaction
+
+
+def _write_batch(conn, batch):
+    with conn:
+        for item in batch:
+            if item[0] == 'build':
+                _, build_id, script_id, status, started_at, finished_at = item
+                conn.execute(
+                    "INSERT INTO log_builds (build_id, script_id, status, started_at, finished_at) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(build_id) DO UPDATE SET "
+                    "script_id = COALESCE(excluded.script_id, script_id), "
+                    "status = COALESCE(excluded.status, status), "
+                    "started_at = COALESCE(excluded.started_at, started_at), "
+                    "finished_at = COALESCE(excluded.finished_at, finished_at)",
+                    (build_id, script_id, status, started_at, finished_at),
+                )
+            else:
+                _, build_id, line_no, ts, text = item
+                cur = conn.execute(
+                    "INSERT INTO log_lines (build_id, line_no, ts, text) VALUES (?, ?, ?, ?)",
+                    (build_id, line_no, ts, text),
+                )
+                conn.execute("INSERT INTO log_fts (rowid, text) VALUES (?, ?)", (cur.lastrowid, text))
+
+
+def index_log_file(build_id, script_id, status, log_file, started_at=None, finished_at=None):
+    """
+    Queue an existing .log file for indexing, blocking while the queue is
+    full. Lines get the build's start time. Returns the line count.
+    """
+    _put(('build', build_id, script_id, status, started_at, finished_at), block=True)
+    ts = started_at or finished_at or time.time()
+    line_no = 0
+    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+        for line_no, line in enumerate(f, 1):
+            _put(('line', build_id, line_no, ts, line.rstrip('\n')[:_MAX_LINE_CHARS]), block=True)
+    return line_no
+
+
+def start_backfill(app):
+    """Index finished builds missing from the index, in the background. False if one is running."""
+    if _path is None:
+        raise RuntimeError('Build log index is not enabled')
+    with _init_lock:
+        if _backfill['running']:
+            return False
+        _backfill.update(running=True, builds=0, lines=0, errors=0, finished_at=None)
+    threading.Thread(target=_run_backfill, args=(app,), name='log-index-backfill', daemon=True).start()
+    return True
+
+
+def _run_backfill(app):
+    from models.script import Build
+
+    try:
+        conn = sqlite3.connect(_path, timeout=10)
+        try:
+            known = {row[0] for row in conn.execute("SELECT build_id FROM log_builds")}
+        finally:
+            conn.close()
+
+        with app.app_context():
+            builds = Build.query.with_entities(
+                Build.id, Build.script_id, Build.status, Build.log_file, Build.started_at, Build.finished_at,
+            ).filter(Build.log_file.isnot(None), Build.finished_at.isnot(None)).all()
+
+        for build_id, script_id, status, log_file, started_at, finished_at in builds:
+            if build_id in known or not os.path.exists(log_file):
+                continue
+            try:
+                lines = index_log_file(build_id, script_id, status, log_file,
+                                       started_at.timestamp() if started_at else None,
+                                       finished_at.timestamp())
+            except OSError as e:
+                print(f"Warning: could not index build log {log_file}: {e}")
+                _backfill['errors'] += 1
+                continue
+            _backfill['builds'] += 1
+            _backfill['lines'] += lines
+    except Exception as e:
+        print(f"Warning: build log index backfill failed: {e}")
+        _backfill['errors'] += 1
+    finally:
+        _backfill['finished_at'] = time.time()
+        _backfill['running'] = False
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def search(query, script_id=None, status=None, since=None, until=None,
+           context=2, limit=50, raw=False):
+    """
+    Newest-first matching lines. `query` is a literal phrase unless raw=True,
+    in which case it is passed through as FTS5 query syntax. since/until are
+    epoch seconds on the line's write time.
+    """
+    if _path is None:
+        raise RuntimeError('Build log index is not enabled')
+
+    where = ["log_fts MATCH ?"]
+    params = [query if raw else _fts_phrase(query)]
+    if script_id:
+        where.append("b.script_id = ?")
+        params.append(script_id)
+    if status:
+        where.append("b.status = ?")
+        params.append(status)
+    if since is not None:
+        where.append("l.ts >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("l.ts <= ?")
+        params.append(until)
+    params.append(limit)
+
+    conn = sqlite3.connect(_path, timeout=10)
+    try:
+        rows = conn.execute(
+            "SELECT l.build_id, l.line_no, l.ts, l.text, b.script_id, b.status "
+            "FROM log_fts JOIN log_lines l ON l.id = log_fts.rowid "
+            "LEFT JOIN log_builds b ON b.build_id = l.build_id "
+            f"WHERE {' AND '.join(where)} ORDER BY log_fts.rowid DESC LIMIT ?",
+            params,
+        ).fetchall()
+
+        hits = []
+        for build_id, line_no, ts, text, hit_script_id, hit_status in rows:
+            hit = {
+                'build_id': build_id,
+                'script_id': hit_script_id,
+                'status': hit_status,
+                'line_no': line_no,
+                'timestamp': ts,
+                'line': text,
+            }
+            if context:
+                hit['context'] = [
+                    {'line_no': n, 'line': t}
+                    for n, t in conn.execute(
+                        "SELECT line_no, text FROM log_lines WHERE build_id = ? "
+                        "AND line_no BETWEEN ? AND ? ORDER BY line_no",
+                        (build_id, line_no - context, line_no + context),
+                    )
+                ]
+            hits.append(hit)
+        return hits
+    finally:
+        conn.close()
+
+
+def stats() -> dict:
+    """Queue depth, lines dropped because the queue was full (since start), and backfill progress."""
+    return {'enabled': _path is not None, 'queued': _queue.qsize(), 'dropped': _dropped,
+            'backfill': dict(_backfill)}
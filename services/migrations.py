@@ -0,0 +1,216 @@
+"""
+Startup migrations tracked by persisted markers.
+
+run_migrations() replaces the old "create_all + re-import everything on every
+boot" sequence. Each step records a row in schema_migrations once applied, so
+a warm boot costs a single SELECT. Workers booting together may run the
+same step at once; every step is idempotent, and a marker or DDL another
+worker got in first is ignored:
+
+    schema:<fingerprint>   — create_all plus ALTER TABLE ADD COLUMN for
+                             columns and CREATE INDEX for indexes added to
+                             existing models, and INTEGER columns widened to
+                             BIGINT on PostgreSQL (SQLite's are 64-bit). The fingerprint hashes every
+                             table/column/index in the model metadata, so the
+                             step re-runs only when the models change.
+    rules_json:<sha256>    — import config/rules.json; re-runs only if the file
+                             content changes.
+    number_parser:<n>      — recompute extraction_field_values.value_num with
+                             the current parse_number() (NUMBER_PARSER_VERSION
+                             in services.results_store).
+
+Scripts dropped into SCRIPTS_FOLDER are still discovered on every boot, but
+with one set-based query instead of a query per file, and any script without
+a stored version is imported into the content store.
+"""
+import os
+import json
+import hashlib
+import importlib
+import pkgutil
+
+from sqlalchemy import BigInteger, inspect, text
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+
+from extensions import db
+
+
+def run_migrations(app):
+    """Apply pending migration steps. Call inside an app context."""
+    _import_all_models()
+    applied = _applied_markers()
+
+    schema_marker = f"schema:{_schema_fingerprint()}"
+    if schema_marker not in applied:
+        _create_tables()
+        _add_missing_columns()
+        _add_missing_indexes()
+        _record(schema_marker)
+
+    rules_marker = _rules_json_marker(app.config['RULES_FILE'])
+    if rules_marker and rules_marker not in applied:
+        if _import_rules_json(app.config['RULES_FILE']):
+            _record(rules_marker)
+
+    from services.results_store import NUMBER_PARSER_VERSION, recompute_numbers
+    numbers_marker = f"number_parser:{NUMBER_PARSER_VERSION}"
+    if numbers_marker not in applied:
+        recompute_numbers()
+        _record(numbers_marker)
+
+    _discover_scripts(app.config['SCRIPTS_FOLDER'])
+
+    from services.script_store import import_legacy_files
+    try:
+        import_legacy_files(app)
+    except IntegrityError:
+        db.session.rollback()  # Another worker imported them first
+
+
+def _record(name):
+    """Store a step's marker; another worker booting at the same time may have stored it first."""
+    from models.migration import SchemaMigration
+
+    db.session.add(SchemaMigration(name=name))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+
+
+def _create_tables():
+    """db.create_all(), a table at a time, so one another worker creates meanwhile is skipped."""
+    for table in db.metadata.sorted_tables:
+        try:
+            table.create(db.engine, checkfirst=True)
+        except (OperationalError, ProgrammingError):
+            if not inspect(db.engine).has_table(table.name):
+                raise
+
+
+def _import_all_models():
+    """Import every module under models/ so db.metadata is complete."""
+    import models
+    for info in pkgutil.iter_modules(models.__path__):
+        importlib.import_module(f"models.{info.name}")
+
+
+def _applied_markers() -> set:
+    try:
+        rows = db.session.execute(text("SELECT name FROM schema_migrations")).all()
+    except (OperationalError, ProgrammingError):
+        db.session.rollback()  # Table doesn't exist yet — fresh database
+        return set()
+    return {row[0] for row in rows}
+
+
+def _schema_fingerprint() -> str:
+    shape = [
+        [table.name, sorted(f"{c.name}:{c.type}" for c in table.columns)]
+        + sorted(f"index:{i.name}:{i.unique}" for i in table.indexes)
+        for table in sorted(db.metadata.tables.values(), key=lambda t: t.name)
+    ]
+    return hashlib.sha256(json.dumps(shape).encode()).hexdigest()[:16]
+
+
+def _add_missing_columns():
+    """create_all() never alters existing tables; add new nullable columns by hand."""
+    inspector = inspect(db.engine)
+    dialect = db.engine.dialect
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c['name']: c['type'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                _widen_column(table, column, existing[column.name])
+                continue
+            col_type = column.type.compile(dialect=dialect)
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+            except (OperationalError, ProgrammingError):
+                # Fine if another worker added it meanwhile
+                if column.name not in {c['name'] for c in inspect(db.engine).get_columns(table.name)}:
+                    raise
+
+
+def _widen_column(table, column, current_type):
+    """Integer -> BigInteger model changes; other type changes still need a manual migration."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    if isinstance(column.type, BigInteger) and type(current_type).__name__ == 'INTEGER':
+        with db.engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE BIGINT'))
+
+
+def _add_missing_indexes():
+    """
+    create_all() only indexes new tables; create indexes added to existing
+    ones. A unique index that existing rows violate is skipped with a
+    warning (and retried on the next schema change) rather than failing boot.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                with db.engine.begin() as conn:
+                    index.create(conn)
+            except (IntegrityError, OperationalError, ProgrammingError) as e:
+                if index.name not in {i['name'] for i in inspect(db.engine).get_indexes(table.name)}:
+                    print(f"Warning: could not create index {index.name}: {e}")
+
+
+def _rules_json_marker(rules_file):
+    if not os.path.exists(rules_file):
+        return None
+    with open(rules_file, 'rb') as f:
+        return f"rules_json:{hashlib.sha256(f.read()).hexdigest()[:16]}"
+
+
+def _import_rules_json(rules_file) -> bool:
+    """Import legacy rules.json entries that aren't already in the DB."""
+    from models.rule import ExtractionRule
+
+    try:
+        with open(rules_file, 'r') as f:
+            rules = json.load(f)
+        existing = set(db.session.query(ExtractionRule.field_name, ExtractionRule.regex).all())
+        for rule in rules:
+            key = (rule.get('field_name'), rule.get('regex'))
+            if key[0] and key[1] and key not in existing:
+                db.session.add(ExtractionRule(
+                    id=rule.get('id'),
+                    field_name=rule['field_name'],
+                    regex=rule['regex'],
+                ))
+                existing.add(key)
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        print(f"Warning: could not migrate rules: {e}")
+        return False
+
+
+def _discover_scripts(scripts_folder):
+    """Register any scripts/*.py files that have no Script row yet."""
+    from models.script import Script
+
+    if not os.path.exists(scripts_folder):
+        return
+    on_disk = {name for name in os.listdir(scripts_folder) if name.endswith('.py')}
+    if not on_disk:
+        return
+    known = {row[0] for row in db.session.query(Script.filename).all()}
+    for filename in sorted(on_disk - known):
+        db.session.add(Script(name=filename, filename=filename))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # Registered by another worker booting at the same time
@@ -0,0 +1,162 @@
+"""
+OCR fallback for scanned pages.
+
+pdfplumber finds no text on a scanned page. With OCR_ENABLED, such pages (no
+text layer, at least one image) are rendered at OCR_DPI and read by a local
+Tesseract via pytesseract, on the CPU. Pages that have text are never
+OCR'd.
+
+OCR runs in a pool of OCR_WORKERS processes (spawn context, started on
+first use) so a long scan neither holds the GIL nor blocks other requests'
+threads. The pages of one PDF are read in parallel.
+
+Results are cached per page on disk, keyed by the page's content hash
+(extraction_engine.page_content_hash), language and DPI:
+
+    OCR_CACHE_FOLDER/<hash[:2]>/<hash>-<lang>-<dpi>.txt
+
+so the same scan is OCR'd once however often it is extracted, even inside a
+different PDF. Failed pages are not cached; they come back empty, marked
+'ocr_failed', and are only retried when an extraction is forced (force=true
+on POST /api/results/extract), so a page Tesseract chokes on isn't re-run
+on every extraction of the document.
+
+pytesseract and the tesseract binary (OCR_TESSERACT_CMD) are optional. When
+either is missing OCR is skipped with a warning, and pages without text
+stay empty as before. extract_pdf_pages() records per page whether its text
+came from the text layer or OCR.
+"""
+import atexit
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_lock = threading.Lock()
+_pool = None
+_available = None
+_stats = {'pages': 0, 'cache_hits': 0, 'ocr_runs': 0, 'failures': 0}
+
+
+def ocr_available(app) -> bool:
+    global _available
+    if _available is None:
+        cmd = app.config.get('OCR_TESSERACT_CMD', 'tesseract')
+        _available = importlib.util.find_spec('pytesseract') is not None and shutil.which(cmd) is not None
+        if not _available:
+            print(f"Warning: OCR disabled: requires the pytesseract package and the '{cmd}' binary")
+    return _available
+
+
+def page_ocr(app):
+    """The ocr callable for extract_pdf_pages(), or None when OCR is off or unavailable."""
+    if not app.config.get('OCR_ENABLED', True) or not ocr_available(app):
+        return None
+    settings = {
+        'cache_folder': os.path.abspath(app.config.get('OCR_CACHE_FOLDER', 'ocr_cache')),
+        'lang': app.config.get('OCR_LANG', 'eng'),
+        'dpi': app.config.get('OCR_DPI', 300),
+        'cmd': app.config.get('OCR_TESSERACT_CMD', 'tesseract'),
+        'timeout': app.config.get('OCR_PAGE_TIMEOUT', 120),
+        'workers': app.config.get('OCR_WORKERS', 0) or multiprocessing.cpu_count(),
+    }
+    return lambda pdf_path, pages: ocr_pages(pdf_path, pages, **settings)
+
+
+def _cache_path(cache_folder, page_hash, lang, dpi):
+    return os.path.join(cache_folder, page_hash[:2], f"{page_hash}-{lang.replace('+', '_')}-{dpi}.txt")
+
+
+def _get_pool(workers):
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn, not fork: the server process runs scheduler and runner threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reset_pool(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def _shutdown():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def ocr_pages(pdf_path, pages, cache_folder, lang, dpi, cmd, timeout, workers):
+    """{page_index: text} for [(page_index, page_hash)], from the cache or the OCR pool."""
+    texts = {}
+    misses = []
+    for index, page_hash in pages:
+        path = _cache_path(cache_folder, page_hash, lang, dpi)
+        try:
+            with open(path, encoding='utf-8') as f:
+                texts[index] = f.read()
+        except FileNotFoundError:
+            misses.append((index, page_hash, path))
+
+    failures = 0
+    if misses:
+        pool = _get_pool(workers)
+        futures = [
+            (index, path, pool.submit(_ocr_page, pdf_path, index, dpi, lang, cmd, timeout))
+            for index, _, path in misses
+        ]
+        for index, path, future in futures:
+            try:
+                text = future.result(timeout=timeout + 30)
+            except BrokenProcessPool as e:
+                _reset_pool(pool)
+                print(f"Warning: OCR worker died on page {index + 1} of {pdf_path}: {e}")
+                failures += 1
+                continue
+            except Exception as e:
+                print(f"Warning: OCR failed on page {index + 1} of {pdf_path}: {e}")
+                failures += 1
+                continue
+            texts[index] = text
+            _write_cache(path, text)
+
+    with _lock:
+        _stats['pages'] += len(pages)
+        _stats['cache_hits'] += len(pages) - len(misses)
+        _stats['ocr_runs'] += len(misses) - failures
+        _stats['failures'] += failures
+    return texts
+
+
+def _write_cache(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _ocr_page(pdf_path, index, dpi, lang, cmd, timeout):
+    """Runs in a pool process: render one page and OCR it."""
+    import pdfplumber
+    import pytesseract
+
+    pytesseract.pytesseract.tesseract_cmd = cmd
+    with pdfplumber.open(pdf_path) as pdf:
+        image = pdf.pages[index].to_image(resolution=dpi).original
+    return pytesseract.image_to_string(image, lang=lang, timeout=timeout)
+
+
+def get_stats(app) -> dict:
+    with _lock:
+        stats = dict(_stats)
+    stats['enabled'] = bool(app.config.get('OCR_ENABLED', True))
+    stats['available'] = _available
+    return stats
@@ -0,0 +1,273 @@
+"""
+Pipeline orchestration.
+
+A pipeline is a DAG of steps (PipelineStep.depends_on lists step names). A
+run never blocks a worker waiting for upstream steps. Instead, every step
+build is queued on the runner pool with an on_complete callback, and each
+completion calls advance(), which:
+
+- starts every step whose dependencies all succeeded (independent steps run
+  concurrently, up to RUNNER_MAX_WORKERS);
+- marks as 'skipped' every step downstream of a step that ended in any
+  other status; only the dependents are skipped, and sibling branches keep going;
+- closes the PipelineRun once no step is pending or running.
+
+Each step's result is an ordinary Build tagged with pipeline_run_id and
+pipeline_step_id, so logs, artifacts and limits work as for any build. Steps
+see PIPELINE_RUN_ID and UPSTREAM_BUILDS (JSON step name -> build id, for
+fetching upstream artifacts) in their environment.
+
+The callbacks live in the process that started the run (PipelineRun.owner),
+so a restart strands its runs. recover_runs() runs at boot and fails runs
+whose owner on this host is gone, along with their unfinished step builds.
+Runs owned by another host are left to that host's next boot.
+"""
+import json
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime
+
+from extensions import db
+
+# Serialises advance() so two steps finishing together can't both start a dependent
+_lock = threading.Lock()
+
+_ACTIVE_STATUSES = ('pending', 'running')
+
+# (pid, owner string) for this process, see _owner()
+_identity = None
+
+
+class PipelineError(Exception):
+    """Raised when a pipeline definition is invalid."""
+
+
+def validate_steps(steps):
+    """
+    Check a list of {'name', 'script_id', 'depends_on'} dicts: unique names,
+    known dependencies, no cycles. Returns normalised copies (names and
+    dependencies stripped) in a topological order.
+    """
+    from models.script import Script
+
+    if not isinstance(steps, list) or not steps:
+        raise PipelineError('A pipeline needs at least one step')
+    normalised = []
+    for step in steps:
+        if not isinstance(step, dict):
+            raise PipelineError('Every step must be an object')
+        name = step.get('name')
+        depends_on = step.get('depends_on') or []
+        if not isinstance(name, str) or not name.strip():
+            raise PipelineError('Every step needs a name')
+        if not isinstance(depends_on, list) or not all(isinstance(d, str) for d in depends_on):
+            raise PipelineError(f"Step '{name.strip()}': depends_on must be a list of step names")
+        normalised.append({
+            'name': name.strip(),
+            'script_id': step.get('script_id') if isinstance(step.get('script_id'), str) else None,
+            'depends_on': [d.strip() for d in depends_on],
+        })
+
+    names = [s['name'] for s in normalised]
+    if len(set(names)) != len(names):
+        raise PipelineError('Step names must be unique')
+
+    script_ids = {s['script_id'] for s in normalised}
+    known = {row[0] for row in db.session.query(Script.id).filter(Script.id.in_(script_ids)).all()}
+    for step in normalised:
+        if step['script_id'] not in known:
+            raise PipelineError(f"Step '{step['name']}': script not found")
+        for dep in step['depends_on']:
+            if dep not in names:
+                raise PipelineError(f"Step '{step['name']}' depends on unknown step '{dep}'")
+            if dep == step['name']:
+                raise PipelineError(f"Step '{dep}' depends on itself")
+
+    # Kahn's algorithm — anything left over is on a cycle
+    remaining = {s['name']: set(s['depends_on']) for s in normalised}
+    ordered = []
+    while remaining:
+        ready = sorted(n for n, deps in remaining.items() if not deps)
+        if not ready:
+            raise PipelineError(f"Dependency cycle between steps: {', '.join(sorted(remaining))}")
+        for name in ready:
+            ordered.append(name)
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    by_name = {s['name']: s for s in normalised}
+    return [by_name[n] for n in ordered]
+
+
+def start_run(app, pipeline, triggered_by='manual'):
+    """Create a PipelineRun and start its root steps. Call inside an app context."""
+    from models.pipeline import PipelineRun
+
+    run = PipelineRun(pipeline_id=pipeline.id, status='running', triggered_by=triggered_by, owner=_owner())
+    db.session.add(run)
+    db.session.commit()
+    advance(app, run.id)
+    return run
+
+
+def _owner():
+    """host:pid:boot for this process; boot tells a restarted process from one reusing its pid."""
+    global _identity
+    if _identity is None or _identity[0] != os.getpid():  # Computed after any fork
+        _identity = (os.getpid(), f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}")
+    return _identity[1]
+
+
+def _owner_gone(owner):
+    if not owner:
+        return True  # Started before runs recorded an owner, so before this boot
+    host, pid, _ = owner.rsplit(':', 2)
+    if host != socket.gethostname():
+        return False
+    if int(pid) == os.getpid():
+        return owner != _owner()
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass  # Alive, under another user
+    return False
+
+
+def recover_runs(app):
+    """Fail runs left 'running' by a process that is gone. Called from create_app(). Returns how many."""
+    from models.pipeline import PipelineRun
+    from models.script import Build
+
+    with app.app_context():
+        stale = [run for run in PipelineRun.query.filter_by(status='running').all() if _owner_gone(run.owner)]
+        now = datetime.utcnow()
+        for run in stale:
+            Build.query.filter(
+                Build.pipeline_run_id == run.id, Build.status.in_(_ACTIVE_STATUSES),
+            ).update({'status': 'failure', 'finished_at': now}, synchronize_session=False)
+            run.status = 'failure'
+            run.finished_at = now
+        db.session.commit()
+    if stale:
+        print(f"Warning: failed {len(stale)} pipeline run(s) interrupted by a restart")
+    return len(stale)
+
+
+def advance(app, run_id):
+    """Start, skip or finish whatever the current step results allow."""
+    with _lock, app.app_context():
+        to_start = _advance_locked(app, run_id)
+
+    for build_id, script_path, build_dir, env_vars in to_start:
+        _execute(app, build_id, script_path, build_dir, env_vars, run_id)
+
+
+def _advance_locked(app, run_id):
+    from models.pipeline import PipelineRun
+    from models.script import Build
+
+    run = db.session.get(PipelineRun, run_id)
+    if not run or run.finished_at:
+        return []
+
+    steps = run_steps(run)
+    builds = {
+        b.pipeline_step_id: b
+        for b in Build.query.filter_by(pipeline_run_id=run_id).all()
+    }
+    by_name = {s.name: s for s in steps}
+
+    to_start = []
+    changed = True
+    while changed:  # Skips can cascade down several levels in one pass
+        changed = False
+        for step in steps:
+            if step.id in builds:
+                continue
+            deps = [builds.get(by_name[name].id) for name in step.get_depends_on()]
+            if any(d is not None and d.status not in _ACTIVE_STATUSES and d.status != 'success' for d in deps):
+                builds[step.id] = _add_build(run, step, status='skipped')
+                changed = True
+            elif all(d is not None and d.status == 'success' for d in deps):
+                build = builds[step.id] = _add_build(run, step, status='pending')
+                upstream = {name: builds[by_name[name].id].id for name in step.get_depends_on()}
+                to_start.append((build, step, upstream))
+                changed = True
+
+    if not any(b.status in _ACTIVE_STATUSES for b in builds.values()) and len(builds) == len(steps):
+        run.status = 'success' if all(b.status == 'success' for b in builds.values()) else 'failure'
+        run.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    result = []
+    for build, step, upstream in to_start:
+        filename = step.script.filename if step.script else ''
+        build_dir = os.path.join(app.config['BUILDS_FOLDER'], filename)
+        os.makedirs(build_dir, exist_ok=True)
+        env_vars = {
+            'BUILD_ID': build.id,
+            'SCRIPT_ID': step.script_id,
+            'PIPELINE_RUN_ID': run_id,
+            'UPSTREAM_BUILDS': json.dumps(upstream),
+        }
+        result.append((build.id, os.path.join(app.config['SCRIPTS_FOLDER'], filename), build_dir, env_vars))
+    return result
+
+
+def _add_build(run, step, status):
+    from models.script import Build
+
+    build = Build(
+        script_id=step.script_id,
+        status=status,
+        triggered_by='pipeline',
+        pipeline_run_id=run.id,
+        pipeline_step_id=step.id,
+    )
+    if status == 'skipped':
+        build.finished_at = datetime.utcnow()
+    db.session.add(build)
+    db.session.flush()
+    return build
+
+
+def _execute(app, build_id, script_path, build_dir, env_vars, run_id):
+    from services.script_runner import execute_script_async
+
+    # A missing script fails in the runner like any build, which skips its dependents
+    execute_script_async(app, build_id, script_path, build_dir, env_vars=env_vars,
+                         on_complete=lambda _build_id, _status: advance(app, run_id))
+
+
+def run_steps(run):
+    from models.pipeline import PipelineStep
+    return PipelineStep.query.filter_by(pipeline_id=run.pipeline_id).order_by(PipelineStep.position).all()
+
+
+def run_summary(run):
+    """PipelineRun.to_dict() plus the per-step status roll-up."""
+    from models.script import Build
+
+    builds = {b.pipeline_step_id: b for b in Build.query.filter_by(pipeline_run_id=run.id).all()}
+    steps = []
+    counts = {}
+    for step in run_steps(run):
+        build = builds.get(step.id)
+        status = build.status if build else 'waiting'
+        counts[status] = counts.get(status, 0) + 1
+        steps.append({
+            'step_id': step.id,
+            'name': step.name,
+            'script_id': step.script_id,
+            'depends_on': step.get_depends_on(),
+            'status': status,
+            'build': build.to_dict() if build else None,
+        })
+    data = run.to_dict()
+    data['steps'] = steps
+    data['counts'] = counts
+    return data
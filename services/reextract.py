@@ -0,0 +1,271 @@
+"""
+Incremental re-extraction after rule changes.
+
+Every stored result (services.results_store) records a fingerprint of the
+rules behind each of its fields (ExtractionResult.rule_hashes). When a
+template's rules change, a re-extraction job brings its current results up
+to date without touching the PDFs:
+
+1. The template's rules are resolved and fingerprinted per field.
+2. Current results whose rule-set hash differs are read in batches of
+   REEXTRACT_BATCH_SIZE (keyset pagination), together with the stored
+   document text.
+3. Per result, only fields whose fingerprint changed (or that are new) are
+   re-run; fields whose rules were deleted are dropped and every other value
+   is kept as it is.
+4. Batches run in a pool of REEXTRACT_WORKERS processes (regex matching is
+   CPU-bound), with a few batches in flight while the next ones are read.
+   Small jobs, or REEXTRACT_WORKERS <= 1, run inline.
+5. Each finished batch is written back in one transaction: the result's data
+   and hashes are updated in place and only the changed fields' rows in
+   extraction_field_values are replaced.
+
+A result that has already been re-extracted has the new rule-set hash and is
+skipped, so a job that is cancelled or dies can simply be started again.
+
+Jobs run in background threads of the process that started them, and their
+state is only kept in that process's memory: with several workers a job is
+visible (and cancellable) only through the worker that runs it, which each
+job names, and a restart forgets running jobs. Nothing is lost by that, as
+starting a new job skips what the old one finished. Starting a job for a
+template cancels the one already running for it (its rules are out of
+date); the new job waits for it to stop and picks up where it left off.
+REEXTRACT_ON_RULE_CHANGE starts a job from the rule edit endpoints, for the
+edited template and for results extracted without a template (which ran
+every rule).
+"""
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from extensions import db
+from extraction_engine import reapply_rules
+
+_lock = threading.Lock()
+_jobs = {}    # job id -> job dict (keys starting with '_' are internal)
+_latest = {}  # template id -> id of its most recent job
+_MAX_FINISHED_JOBS = 50
+
+
+def start_job(app, template_id=None):
+    """Start re-extracting the template's stored results. Returns the job dict."""
+    job = {
+        'id': str(uuid.uuid4()),
+        'template_id': template_id,
+        'worker': f"{socket.gethostname()}:{os.getpid()}",
+        'status': 'queued',
+        'ruleset_hash': None,
+        'total': None,
+        'done': 0,
+        'changed': 0,
+        'fields_changed': [],
+        'error': None,
+        'created_at': datetime.utcnow().isoformat(),
+        'started_at': None,
+        'finished_at': None,
+        '_cancel': threading.Event(),
+    }
+    with _lock:
+        previous = _jobs.get(_latest.get(template_id))
+        if previous and previous['status'] in ('queued', 'running'):
+            previous['_cancel'].set()
+        else:
+            previous = None
+        _jobs[job['id']] = job
+        _latest[template_id] = job['id']
+        _prune()
+        job['_thread'] = threading.Thread(target=_run, args=(app, job, previous),
+                                          name=f"reextract-{job['id'][:8]}", daemon=True)
+    job['_thread'].start()
+    return public(job)
+
+
+def cancel_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        job['_cancel'].set()
+        return public(job)
+
+
+def get_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        return public(job) if job else None
+
+
+def list_jobs(template_id=None):
+    with _lock:
+        jobs = [public(j) for j in _jobs.values()
+                if template_id is None or j['template_id'] == template_id]
+    return sorted(jobs, key=lambda j: j['created_at'], reverse=True)
+
+
+def public(job):
+    data = {k: v for k, v in job.items() if not k.startswith('_')}
+    if data['total']:
+        data['percent'] = round(100.0 * data['done'] / data['total'], 1)
+    return data
+
+
+def _prune():
+    finished = [j for j in _jobs.values() if j['status'] not in ('queued', 'running')]
+    finished.sort(key=lambda j: j['created_at'])
+    for job in finished[:max(0, len(finished) - _MAX_FINISHED_JOBS)]:
+        _jobs.pop(job['id'], None)
+
+
+def _run(app, job, previous):
+    if previous is not None:
+        previous['_thread'].join()
+    if job['_cancel'].is_set():
+        job['status'] = 'cancelled'
+        job['finished_at'] = datetime.utcnow().isoformat()
+        return
+
+    job['status'] = 'running'
+    job['started_at'] = datetime.utcnow().isoformat()
+    with app.app_context():
+        try:
+            _reextract(app, job)
+            job['status'] = 'cancelled' if job['_cancel'].is_set() else 'completed'
+        except Exception as e:
+            db.session.rollback()
+            job['status'] = 'failed'
+            job['error'] = str(e)[:500]
+            print(f"Warning: re-extraction for template {job['template_id']} failed: {e}")
+        finally:
+            job['finished_at'] = datetime.utcnow().isoformat()
+            db.session.remove()
+
+
+def _pending_query(template_id, ruleset_hash):
+    from models.extraction_result import ExtractionResult, ExtractionDocument
+
+    query = db.session.query(
+        ExtractionResult.id, ExtractionResult.data, ExtractionResult.rule_hashes, ExtractionDocument.text,
+    ).join(ExtractionDocument, ExtractionDocument.sha256 == ExtractionResult.document_hash).filter(
+        ExtractionResult.is_current.is_(True),
+        ExtractionResult.ruleset_hash != ruleset_hash,
+    )
+    if template_id:
+        return query.filter(ExtractionResult.template_id == template_id)
+    return query.filter(ExtractionResult.template_id.is_(None))
+
+
+def _batches(query, batch_size, cancel):
+    """Keyset-paginated batches of rows; stops early when cancelled."""
+    from models.extraction_result import ExtractionResult
+
+    last_id = ''
+    while not cancel.is_set():
+        rows = query.filter(ExtractionResult.id > last_id).order_by(ExtractionResult.id).limit(batch_size).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+
+
+def _plan(rows, fingerprints):
+    """Per row: which fields to re-run and which to drop."""
+    plan = []
+    for row in rows:
+        stored = json.loads(row.rule_hashes or '{}')
+        changed = sorted(f for f, h in fingerprints.items() if stored.get(f) != h)
+        removed = sorted(f for f in json.loads(row.data or '{}') if f not in fingerprints)
+        plan.append((row, changed, removed))
+    return plan
+
+
+def _reextract(app, job):
+    from services.ruleset import resolve_rules
+    from services.results_store import field_fingerprints
+
+    rules, ruleset_hash = resolve_rules(job['template_id'])
+    rules = [{'field_name': r.get('field_name'), 'regex': r.get('regex')} for r in rules]
+    fingerprints = field_fingerprints(rules)
+    query = _pending_query(job['template_id'], ruleset_hash)
+    job['ruleset_hash'] = ruleset_hash
+    job['total'] = query.count()
+    if not job['total']:
+        return
+
+    batch_size = max(1, app.config.get('REEXTRACT_BATCH_SIZE', 500))
+    workers = app.config.get('REEXTRACT_WORKERS', 0) or multiprocessing.cpu_count()
+    pool = None
+    if workers > 1 and job['total'] > batch_size:
+        # spawn, not fork: this process has scheduler and runner threads
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    fields_changed = set()
+    in_flight = deque()
+    try:
+        for rows in _batches(query, batch_size, job['_cancel']):
+            plan = _plan(rows, fingerprints)
+            items = [(row.id, row.text, changed) for row, changed, _ in plan if changed]
+            fields_changed.update(f for _, changed, removed in plan for f in changed + removed)
+            if pool is not None and items:
+                outcome = pool.submit(reapply_rules, items, rules)
+            else:
+                outcome = reapply_rules(items, rules)
+            in_flight.append((plan, outcome))
+            while len(in_flight) > (workers if pool else 0):
+                _write_batch(job, ruleset_hash, fingerprints, *in_flight.popleft())
+        while in_flight:
+            _write_batch(job, ruleset_hash, fingerprints, *in_flight.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        job['fields_changed'] = sorted(fields_changed)
+
+
+def _write_batch(job, ruleset_hash, fingerprints, plan, outcome):
+    from models.extraction_result import ExtractionResult, ExtractionFieldValue
+    from services.results_store import field_rows
+
+    new_values = dict(outcome if isinstance(outcome, list) else outcome.result())
+    updates = []
+    replaced = {}  # frozenset of field names -> result ids
+    inserts = []
+    changed_count = 0
+    for row, changed, removed in plan:
+        data = json.loads(row.data or '{}')
+        before = dict(data)
+        for field in removed:
+            data.pop(field, None)
+        partial = new_values.get(row.id, {})
+        data.update(partial)
+        if data != before:
+            changed_count += 1
+        updates.append({
+            'id': row.id,
+            'data': json.dumps(data),
+            'ruleset_hash': ruleset_hash,
+            'rule_hashes': json.dumps(fingerprints),
+        })
+        if changed or removed:
+            replaced.setdefault(frozenset(changed + removed), []).append(row.id)
+        inserts.extend(
+            {'result_id': row.id, 'field_name': name, 'match_index': i, 'value_text': text, 'value_num': number}
+            for name, i, text, number in field_rows(partial)
+        )
+
+    db.session.bulk_update_mappings(ExtractionResult, updates)
+    for fields, ids in replaced.items():
+        ExtractionFieldValue.query.filter(
+            ExtractionFieldValue.result_id.in_(ids),
+            ExtractionFieldValue.field_name.in_(fields),
+        ).delete(synchronize_session=False)
+    if inserts:
+        db.session.bulk_insert_mappings(ExtractionFieldValue, inserts)
+    db.session.commit()
+
+    job['done'] += len(plan)
+    job['changed'] += changed_count
@@ -0,0 +1,399 @@
+"""
+Persisted extraction results.
+
+extract_document() is the one place a PDF gets extracted and recorded:
+
+1. The file is hashed (sha256, streamed).
+2. If a result already exists for (document hash, template, rule-set hash)
+   it is returned as-is. The same PDF with the same rules is never
+   re-extracted, however many times it is uploaded.
+3. Otherwise the text comes from extraction_documents when this PDF was
+   seen before (rules changed, or another template), and from pdfplumber only
+   the first time. Without a template, services.template_classifier picks
+   one from the document's first-page fingerprint.
+4. The rules are applied, and the result is stored with its timings. Every
+   matched value is also written to extraction_field_values (with a parsed
+   number when it looks like one), which is what the query and aggregate
+   functions use. The previous result for the same document and template
+   stays stored but is no longer current.
+
+The rule-set hash is services.ruleset.resolve_rules()'s content hash, so
+editing a template's rules or loading a new artifact changes it.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from extraction_engine import extract_pdf_pages, join_pages, apply_rules
+
+# ISO 4217 codes accepted next to an amount; any other three letters mean it isn't one ('INV 001')
+CURRENCY_CODES = frozenset(
+    'AED AUD BRL CAD CHF CNY CZK DKK EUR GBP HKD HUF IDR ILS INR JPY KRW MXN MYR NOK NZD PHP PLN '
+    'RUB SAR SEK SGD THB TRY USD ZAR'.split()
+)
+_CODE = '|'.join(sorted(CURRENCY_CODES))
+
+# An amount with an optional sign, currency symbol/code and accounting parentheses
+_NUMBER = re.compile(
+    rf'(\()?\s*([-+])?\s*(?:(?:{_CODE})\s*)?[$€£¥₹]?\s*([-+])?\s*(\d[\d,. ]*)\s*(?:{_CODE}|[$€£¥₹])?\s*(\))?'
+)
+
+# Bump when parse_number() changes; run_migrations() then recomputes stored value_num
+NUMBER_PARSER_VERSION = 2
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _grouped(integer, separator):
+    """'1,234,567' (or lakh-style '12,34,567') with the given thousands separator."""
+    parts = integer.split(separator)
+    if not all(p.isdigit() for p in parts) or not 1 <= len(parts[0]) <= 3 or len(parts[-1]) != 3:
+        return False
+    middle = parts[1:-1]
+    return all(len(p) == 3 for p in middle) or (len(parts[0]) <= 2 and all(len(p) == 2 for p in middle))
+
+
+def parse_number(value):
+    """'1,234.50', '$ 99', 'EUR 12,5', '(12.00)' -> float; None when it isn't an amount ('1,2,3')."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.fullmatch(str(value).strip())
+    if not match or bool(match.group(1)) != bool(match.group(5)):
+        return None
+    negative = bool(match.group(1)) or '-' in (match.group(2) or '') + (match.group(3) or '')
+    text = match.group(4).rstrip('., ')
+
+    # The last mark is the decimal point if it occurs once and either both marks are used
+    # ('1.234,50'), it is a dot, or it isn't followed by exactly three digits ('12,5', not '1,234')
+    marks = [c for c in text if c in ',.']
+    decimal = None
+    if marks and marks.count(marks[-1]) == 1:
+        last = marks[-1]
+        if len(set(marks)) == 2 or last == '.' or len(text) - text.rfind(last) - 1 != 3:
+            decimal = last
+    integer, fraction = text.rsplit(decimal, 1) if decimal else (text, '')
+
+    separators = {c for c in integer if not c.isdigit()}
+    if len(separators) > 1 or (separators and not _grouped(integer, separators.pop())):
+        return None
+    if fraction and not fraction.isdigit():
+        return None
+    number = float(''.join(c for c in integer if c.isdigit()) + ('.' + fraction if fraction else ''))
+    return -number if negative else number
+
+
+def recompute_numbers(batch_size=5000):
+    """Re-parse value_num for every stored field value, e.g. after parse_number() changed. Returns rows changed."""
+    from models.extraction_result import ExtractionFieldValue
+
+    changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(ExtractionFieldValue.id, ExtractionFieldValue.value_text, ExtractionFieldValue.value_num)\
+            .filter(ExtractionFieldValue.id > last_id)\
+            .order_by(ExtractionFieldValue.id).limit(batch_size).all()
+        if not rows:
+            return changed
+        updates = []
+        for row_id, text, old in rows:
+            number = parse_number(text)
+            if number != old:
+                updates.append({'id': row_id, 'value_num': number})
+        if updates:
+            db.session.bulk_update_mappings(ExtractionFieldValue, updates)
+            db.session.commit()
+            changed += len(updates)
+        last_id = rows[-1][0]
+
+
+def field_fingerprints(rules):
+    """{field_name: hash of that field's regexes in order}, so a change to one rule is visible per field."""
+    regexes = {}
+    for rule in rules:
+        if rule.get('field_name') and rule.get('regex'):
+            regexes.setdefault(rule['field_name'], []).append(rule['regex'])
+    return {
+        field: hashlib.sha256('\n'.join(patterns).encode()).hexdigest()[:16]
+        for field, patterns in regexes.items()
+    }
+
+
+def field_rows(data):
+    for field_name, value in data.items():
+        values = value if isinstance(value, list) else [value]
+        for i, item in enumerate(values):
+            if isinstance(item, tuple):
+                item = ' '.join(str(v) for v in item if v)
+            text = None if item is None else str(item)
+            yield field_name, i, text, parse_number(item)
+
+
+def get_document(path, sha256=None, retry_ocr=False):
+    """
+    (ExtractionDocument, extract_ms): the stored document when this PDF was
+    seen before (extract_ms 0), else one read with pdfplumber (OCR for
+    scanned pages, see services.ocr), with the first-page fingerprint the
+    template classifier uses. A stored document whose scanned pages were
+    never OCR'd is read again once OCR is available; pages whose OCR failed
+    only with retry_ocr. A re-read that gives the same text keeps
+    extract_ms 0. Caller commits.
+
+    Call it before adding anything else to the session: when a concurrent
+    extraction inserts the same document first, the session is rolled back
+    and that row is returned instead.
+    """
+    from flask import current_app
+    from models.extraction_result import ExtractionDocument
+    from services.ocr import page_ocr
+    from services.template_classifier import fingerprint
+
+    sha256 = sha256 or file_hash(path)
+    ocr = page_ocr(current_app)
+    document = db.session.get(ExtractionDocument, sha256)
+    if document is not None:
+        sources = document.get_page_sources()
+        if ocr is None or not ('none' in sources or (retry_ocr and 'ocr_failed' in sources)):
+            return document, 0.0
+
+    # New, or stored with scanned pages that weren't OCR'd (or failed to) and now can be
+    started = time.perf_counter()
+    pages, layout, sources = extract_pdf_pages(path, ocr=ocr)
+    extract_ms = round((time.perf_counter() - started) * 1000, 2)
+    fields = {
+        'text': join_pages(pages),
+        'page_sources': json.dumps(sources),
+        'fingerprint': json.dumps(fingerprint(pages[0] if pages else '', layout)),
+        'extract_ms': extract_ms,
+    }
+    if document is not None:
+        unchanged = document.text == fields['text']
+        for name, value in fields.items():
+            setattr(document, name, value)
+        return document, 0.0 if unchanged else extract_ms
+
+    document = ExtractionDocument(sha256=sha256, size=os.path.getsize(path), **fields)
+    db.session.add(document)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # A concurrent extraction stored the same PDF first (its row has the same text)
+        db.session.rollback()
+        return db.session.get(ExtractionDocument, sha256), 0.0
+    return document, extract_ms
+
+
+def store_result(document_hash, filename, template_id, ruleset_hash, data, extract_ms, rules_ms, rule_hashes=None,
+                 classifier_score=None):
+    """Add an ExtractionResult plus its field values to the session. Caller commits."""
+    from models.extraction_result import ExtractionResult, ExtractionFieldValue
+
+    ExtractionResult.query.filter_by(
+        document_hash=document_hash, template_id=template_id, is_current=True,
+    ).update({'is_current': False}, synchronize_session=False)
+    result = ExtractionResult(
+        document_hash=document_hash,
+        filename=filename,
+        template_id=template_id,
+        ruleset_hash=ruleset_hash,
+        rule_hashes=json.dumps(rule_hashes or {}),
+        data=json.dumps(data),
+        extract_ms=extract_ms,
+        rules_ms=rules_ms,
+        classifier_score=classifier_score,
+    )
+    result.fields = [
+        ExtractionFieldValue(field_name=name, match_index=i, value_text=text, value_num=number)
+        for name, i, text, number in field_rows(data)
+    ]
+    db.session.add(result)
+    return result
+
+
+def mark_current(result):
+    """Make an older stored result the current one for its document and template again."""
+    from models.extraction_result import ExtractionResult
+
+    ExtractionResult.query.filter(
+        ExtractionResult.document_hash == result.document_hash,
+        ExtractionResult.template_id == result.template_id,
+        ExtractionResult.id != result.id,
+    ).update({'is_current': False}, synchronize_session=False)
+    result.is_current = True
+
+
+def find_result(document_hash, template_id, ruleset_hash):
+    from models.extraction_result import ExtractionResult
+    return ExtractionResult.query.filter_by(
+        document_hash=document_hash, template_id=template_id, ruleset_hash=ruleset_hash,
+    ).order_by(ExtractionResult.created_at.desc()).first()
+
+
+def extract_document(path, template_id=None, filename=None, force=False, classify=None):
+    """
+    Extract a PDF with the template's current rules and persist the result.
+    Without a template_id the template classifier picks one (unless classify
+    is False or CLASSIFIER_ENABLED is off); the result's classifier_score
+    says so. When nothing matches, every rule runs as before. force also
+    retries OCR on pages where it failed.
+    Returns (result, text, cached) where cached means nothing was re-extracted.
+    Needs app context.
+    """
+    from flask import current_app
+    from services.ruleset import resolve_rules
+    from services.template_classifier import classify as classify_document, document_features
+
+    sha256 = file_hash(path)
+    document, extract_ms = get_document(path, sha256, retry_ocr=force)
+
+    classifier_score = None
+    if classify is None:
+        classify = current_app.config.get('CLASSIFIER_ENABLED', True)
+    if template_id is None and classify:
+        match = classify_document(current_app, document_features(document))
+        if match['template_id']:
+            template_id, classifier_score = match['template_id'], match['score']
+
+    rules, ruleset_hash = resolve_rules(template_id)
+
+    # Stored results only stand for stored text; a document whose text changed gets a new result
+    fresh = extract_ms > 0
+    if not force and not fresh:
+        existing = find_result(sha256, template_id, ruleset_hash)
+        if existing is not None:
+            if not existing.is_current:  # Rules were reverted to this version
+                mark_current(existing)
+            db.session.commit()
+            return existing, document.text, True
+
+    started = time.perf_counter()
+    data = apply_rules(document.text, rules)
+    rules_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    result = store_result(sha256, filename, template_id, ruleset_hash, data, extract_ms, rules_ms,
+                          field_fingerprints(rules), classifier_score)
+    db.session.commit()
+    return result, document.text, False
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def filtered_results(template_id=None, field=None, value=None, value_min=None, value_max=None,
+                     contains=None, since=None, until=None, document_hash=None, all_versions=False):
+    """
+    Query of ExtractionResult matching the filters. Field filters (value,
+    contains, value_min/value_max) match any of the field's values. Only the
+    current result per document and template is included unless
+    all_versions, so re-extractions are not counted twice.
+    """
+    from models.extraction_result import ExtractionResult, ExtractionFieldValue
+
+    query = ExtractionResult.query
+    if not all_versions:
+        query = query.filter(ExtractionResult.is_current.is_(True))
+    if template_id:
+        query = query.filter(ExtractionResult.template_id == template_id)
+    if document_hash:
+        query = query.filter(ExtractionResult.document_hash == document_hash)
+    if since:
+        query = query.filter(ExtractionResult.created_at >= _parse_date(since))
+    if until:
+        query = query.filter(ExtractionResult.created_at <= _parse_date(until))
+
+    if field and any(v is not None for v in (value, contains, value_min, value_max)):
+        matching = db.session.query(ExtractionFieldValue.result_id).filter(
+            ExtractionFieldValue.field_name == field)
+        if value is not None:
+            matching = matching.filter(ExtractionFieldValue.value_text == value)
+        if contains is not None:
+            matching = matching.filter(ExtractionFieldValue.value_text.contains(contains, autoescape=True))
+        if value_min is not None:
+            matching = matching.filter(ExtractionFieldValue.value_num >= value_min)
+        if value_max is not None:
+            matching = matching.filter(ExtractionFieldValue.value_num <= value_max)
+        query = query.filter(ExtractionResult.id.in_(matching))
+    return query
+
+
+def aggregate(fields, group_by=None, **filters):
+    """
+    Per field: how many results have it, how many values, and count/sum/min/
+    max/avg over the values that parse as numbers. group_by='day' or
+    'template' splits every figure by that key.
+    """
+    from models.extraction_result import ExtractionResult, ExtractionFieldValue
+
+    results = filtered_results(**filters)
+    result_ids = results.with_entities(ExtractionResult.id)
+
+    group_cols = []
+    if group_by == 'day':
+        group_cols = [func.date(ExtractionResult.created_at).label('group')]
+    elif group_by == 'template':
+        group_cols = [ExtractionResult.template_id.label('group')]
+
+    query = db.session.query(
+        *group_cols,
+        ExtractionFieldValue.field_name,
+        func.count(func.distinct(ExtractionFieldValue.result_id)),
+        func.count(ExtractionFieldValue.value_text),
+        func.count(ExtractionFieldValue.value_num),
+        func.sum(ExtractionFieldValue.value_num),
+        func.min(ExtractionFieldValue.value_num),
+        func.max(ExtractionFieldValue.value_num),
+        func.avg(ExtractionFieldValue.value_num),
+    ).filter(ExtractionFieldValue.result_id.in_(result_ids))
+    if group_cols:
+        query = query.join(ExtractionResult, ExtractionResult.id == ExtractionFieldValue.result_id)
+    if fields:
+        query = query.filter(ExtractionFieldValue.field_name.in_(fields))
+    query = query.group_by(*group_cols, ExtractionFieldValue.field_name)
+
+    if group_cols:
+        doc_counts = dict(
+            results.with_entities(group_cols[0], func.count(ExtractionResult.id)).group_by(group_cols[0]).all()
+        )
+    else:
+        doc_counts = {None: results.count()}
+
+    groups = {}
+    for row in query.all():
+        key = str(row[0]) if group_cols else None
+        name, docs, values, numeric, total, low, high, mean = row[len(group_cols):]
+        group = groups.setdefault(key, {'results': doc_counts.get(row[0] if group_cols else None, 0), 'fields': {}})
+        group['fields'][name] = {
+            'results': docs,
+            'values': values,
+            'numeric_values': numeric,
+            'sum': total,
+            'min': low,
+            'max': high,
+            'avg': round(mean, 6) if mean is not None else None,
+        }
+
+    if not group_cols:
+        return groups.get(None, {'results': doc_counts[None], 'fields': {}})
+    for key, count in doc_counts.items():
+        groups.setdefault(str(key), {'results': count, 'fields': {}})
+    return {'group_by': group_by, 'groups': groups}
@@ -0,0 +1,312 @@
+"""
+Precompiled rule-set artifacts for fleet deployment.
+
+An artifact packages one template's validated rules as a self-describing
+JSON document:
+
+    {
+      "format": "docextract.ruleset",
+      "version": 1,
+      "template": {"id": "...", "name": "Invoices", "description": "..."},
+      "rules": [{"id": "...", "field_name": "Total", "regex": "Total:\\s*(\\S+)"}],
+      "content_hash": "sha256:..."
+    }
+
+content_hash covers only the template name and the (field_name, regex) pairs
+in canonical order, so the same rule set exported from two environments
+hashes identically even though row ids differ — compare hashes to diff
+environments, or call diff_rulesets() for the per-field breakdown.
+
+Loaded artifacts live in a process-level registry keyed by template id and
+hold precompiled patterns, so extraction workers can run without touching
+the DB. Artifacts listed in RULESET_ARTIFACTS (a file or a directory of
+*.json files) are loaded at boot by load_artifacts() and can be hot-reloaded
+with reload_artifacts(), which also unloads the rule sets of files that were
+deleted. A loaded artifact takes precedence over DB rows for its template
+until it is unloaded or replaced.
+"""
+import os
+import json
+import hashlib
+import re
+import threading
+
+from extraction_engine import compile_rule
+
+ARTIFACT_FORMAT = 'docextract.ruleset'
+ARTIFACT_VERSION = 1
+
+
+class RuleSetError(Exception):
+    """Raised when an artifact or rule list fails validation."""
+
+
+class CompiledRuleSet:
+    """A validated rule set with its regexes compiled once up front."""
+
+    def __init__(self, template, rules, content_hash, source=None):
+        self.template = template
+        self.rules = rules
+        self.content_hash = content_hash
+        self.source = source
+        self._compiled = [
+            {'field_name': r['field_name'], 'regex': r['regex'], 'compiled': compile_rule(r['regex'])}
+            for r in rules
+        ]
+
+    @property
+    def template_id(self):
+        return self.template.get('id')
+
+    def rule_dicts(self):
+        """Rules in the shape apply_rules() expects, with precompiled patterns."""
+        return self._compiled
+
+    def to_artifact(self):
+        return {
+            'format': ARTIFACT_FORMAT,
+            'version': ARTIFACT_VERSION,
+            'template': self.template,
+            'rules': self.rules,
+            'content_hash': self.content_hash,
+        }
+
+    def to_dict(self):
+        return {
+            'template_id': self.template_id,
+            'template_name': self.template.get('name'),
+            'content_hash': self.content_hash,
+            'rule_count': len(self.rules),
+            'source': self.source,
+        }
+
+
+# Process-level registry: template_id -> CompiledRuleSet
+_loaded: dict = {}
+# Artifact path -> mtime at last load, used by reload_artifacts()
+_file_mtimes: dict = {}
+_lock = threading.Lock()
+
+
+def compute_content_hash(template_name, rules) -> str:
+    canonical = json.dumps({
+        'template': template_name,
+        'rules': sorted([r['field_name'], r['regex']] for r in rules),
+    }, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return 'sha256:' + hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def validate_rules(rules):
+    """Return a canonically ordered copy of rules, raising RuleSetError on bad entries."""
+    if not isinstance(rules, list):
+        raise RuleSetError('"rules" must be a list')
+
+    cleaned = []
+    for i, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            raise RuleSetError(f'Rule #{i} is not an object')
+        field_name = (rule.get('field_name') or '').strip()
+        regex = rule.get('regex') or ''
+        if not field_name or not regex:
+            raise RuleSetError(f'Rule #{i} is missing field_name or regex')
+        try:
+            compile_rule(regex)
+        except re.error as e:
+            raise RuleSetError(f'Rule "{field_name}" has an invalid regex: {e}')
+        cleaned.append({'id': rule.get('id'), 'field_name': field_name, 'regex': regex})
+
+    cleaned.sort(key=lambda r: (r['field_name'], r['regex']))
+    return cleaned
+
+
+def build_ruleset(template, rules, source=None) -> CompiledRuleSet:
+    """Validate and compile rules for a template dict ({id, name, description})."""
+    cleaned = validate_rules(rules)
+    content_hash = compute_content_hash(template.get('name'), cleaned)
+    return CompiledRuleSet(template, cleaned, content_hash, source=source)
+
+
+def export_ruleset(template) -> dict:
+    """Build an artifact from an ExtractionTemplate row and its rules. Needs app context."""
+    ruleset = build_ruleset(
+        {'id': template.id, 'name': template.name, 'description': template.description},
+        [r.to_dict() for r in template.rules],
+        source='db',
+    )
+    return ruleset.to_artifact()
+
+
+def parse_artifact(artifact, source=None) -> CompiledRuleSet:
+    """Validate an artifact dict and verify its content_hash."""
+    if not isinstance(artifact, dict) or artifact.get('format') != ARTIFACT_FORMAT:
+        raise RuleSetError(f'Not a {ARTIFACT_FORMAT} artifact')
+    if artifact.get('version') != ARTIFACT_VERSION:
+        raise RuleSetError(f'Unsupported artifact version: {artifact.get("version")}')
+
+    template = artifact.get('template') or {}
+    if not template.get('name'):
+        raise RuleSetError('Artifact template has no name')
+
+    ruleset = build_ruleset(template, artifact.get('rules'), source=source)
+    expected = artifact.get('content_hash')
+    if expected and expected != ruleset.content_hash:
+        raise RuleSetError(f'content_hash mismatch: artifact says {expected}, rules hash to {ruleset.content_hash}')
+    return ruleset
+
+
+def register_ruleset(ruleset: CompiledRuleSet):
+    if not ruleset.template_id:
+        raise RuleSetError('Artifact template has no id')
+    with _lock:
+        _loaded[ruleset.template_id] = ruleset
+
+
+def unregister_ruleset(template_id: str):
+    with _lock:
+        return _loaded.pop(template_id, None)
+
+
+def get_ruleset(template_id: str):
+    """Return the loaded CompiledRuleSet for a template, or None."""
+    with _lock:
+        return _loaded.get(template_id)
+
+
+def resolve_rules(template_id=None):
+    """
+    (rule dicts, content hash) to extract with: the loaded artifact for the
+    template if any, else its DB rules, else every rule when no template is
+    given. The hash identifies the rule-set version. Needs app context.
+    """
+    ruleset = get_ruleset(template_id) if template_id else None
+    if ruleset:
+        return ruleset.rule_dicts(), ruleset.content_hash
+
+    from extensions import db
+    from models.rule import ExtractionRule
+    from models.template import ExtractionTemplate
+
+    if template_id:
+        template = db.session.get(ExtractionTemplate, template_id)
+        rules = ExtractionRule.query.filter_by(template_id=template_id).all()
+        name = template.name if template else None
+    else:
+        rules = ExtractionRule.query.all()
+        name = None
+    rule_dicts = [r.to_dict() for r in rules]
+    usable = [r for r in rule_dicts if r.get('field_name') and r.get('regex')]
+    return rule_dicts, compute_content_hash(name, usable)
+
+
+def list_rulesets():
+    with _lock:
+        return [r.to_dict() for r in _loaded.values()]
+
+
+def persist_ruleset(ruleset: CompiledRuleSet):
+    """
+    Write an artifact's rules into the DB, replacing the template's existing
+    rules. The template is matched by id, then by name, and created if absent.
+    Needs app context; caller commits.
+    """
+    from extensions import db
+    from models.rule import ExtractionRule
+    from models.template import ExtractionTemplate
+
+    info = ruleset.template
+    template = None
+    if info.get('id'):
+        template = db.session.get(ExtractionTemplate, info['id'])
+    if not template:
+        template = ExtractionTemplate.query.filter_by(name=info['name']).first()
+    if not template:
+        template = ExtractionTemplate(id=info.get('id'), name=info['name'])
+        db.session.add(template)
+    template.description = info.get('description', template.description)
+
+    ExtractionRule.query.filter_by(template_id=template.id).delete()
+    for rule in ruleset.rules:
+        db.session.add(ExtractionRule(
+            field_name=rule['field_name'],
+            regex=rule['regex'],
+            template_id=template.id,
+        ))
+    return template
+
+
+def diff_rulesets(old_rules, new_rules) -> dict:
+    """Compare two rule lists by field_name."""
+    old = {}
+    for r in old_rules:
+        old.setdefault(r['field_name'], set()).add(r['regex'])
+    new = {}
+    for r in new_rules:
+        new.setdefault(r['field_name'], set()).add(r['regex'])
+
+    return {
+        'added': sorted(f for f in new if f not in old),
+        'removed': sorted(f for f in old if f not in new),
+        'changed': sorted(f for f in new if f in old and new[f] != old[f]),
+    }
+
+
+def _artifact_paths(location):
+    if os.path.isdir(location):
+        return sorted(
+            os.path.join(location, name)
+            for name in os.listdir(location)
+            if name.endswith('.json')
+        )
+    if os.path.isfile(location):
+        return [location]
+    return []
+
+
+def _unload_source(path, keep=None):
+    """Unregister the rule sets loaded from a file (except template `keep`). Returns their template ids."""
+    with _lock:
+        gone = [t for t, r in _loaded.items() if r.source == path and t != keep]
+        for template_id in gone:
+            del _loaded[template_id]
+    return gone
+
+
+def load_artifacts(app, force=False) -> dict:
+    """
+    Load every artifact under app.config['RULESET_ARTIFACTS'] into the
+    registry. Files whose mtime has not changed since the last load are
+    skipped unless force=True; rule sets of files that are gone are
+    unloaded, so their templates fall back to DB rules.
+    Returns {"loaded": [...], "unloaded": [template ids], "errors": [...]}.
+    """
+    location = app.config.get('RULESET_ARTIFACTS')
+    summary = {'loaded': [], 'unloaded': [], 'errors': []}
+    if not location:
+        return summary
+
+    paths = _artifact_paths(location)
+    for path in [p for p in _file_mtimes if p not in paths]:
+        del _file_mtimes[path]
+        summary['unloaded'].extend(_unload_source(path))
+
+    for path in paths:
+        try:
+            mtime = os.path.getmtime(path)
+            if not force and _file_mtimes.get(path) == mtime:
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                ruleset = parse_artifact(json.load(f), source=path)
+            register_ruleset(ruleset)
+            # The file may now hold another template's rules
+            summary['unloaded'].extend(_unload_source(path, keep=ruleset.template_id))
+            _file_mtimes[path] = mtime
+            summary['loaded'].append(ruleset.to_dict())
+        except (OSError, ValueError, RuleSetError) as e:
+            print(f"Warning: could not load rule-set artifact {path}: {e}")
+            summary['errors'].append({'path': path, 'error': str(e)})
+    return summary
+
+
+def reload_artifacts(app) -> dict:
+    """Hot-reload artifacts whose files changed since they were last loaded, unloading deleted ones."""
+    return load_artifacts(app, force=False)
@@ -7,39 +7,137 @@ init_scheduler() reloads all enabled schedules from the DB into memory.
 
 The scheduler is a module-level singleton started once in create_app().
 register_schedule() / remove_schedule() manage per-script jobs.
-Each job calls _run_scheduled_script() which triggers the async runner.
+Each job calls _run_scheduled_script() which only enqueues onto the runner
+pool (services.script_runner) — build creation and execution happen there.
+
+Multi-worker deployments: every process registers the jobs, but the scheduler
+starts paused and only the process holding the 'scheduler' lease (see
+services.leader_election) resumes it, so each cron fires exactly once across
+all workers. A standby resumes within SCHEDULER_LEASE_TTL seconds of the
+leader dying. Set SCHEDULER_LEADER_ELECTION=0 to run unconditionally.
+
+Schedule edits propagate through the schedule_changes table: the handling
+process calls record_schedule_change() in the same transaction as the edit,
+and every process polls for new change ids every SCHEDULER_SYNC_INTERVAL
+seconds, re-syncing only the affected scripts' jobs. Ids are assigned at
+insert, not commit, so a lower id can become visible after a higher one:
+each poll also re-reads rows from the last SCHEDULER_CHANGE_OVERLAP seconds
+and skips the ones already applied.
 """
-import os
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.triggers.cron import CronTrigger
 
-# Module-level scheduler singleton — MemoryJobStore avoids pickling issues
+# Module-level scheduler singleton — MemoryJobStore avoids pickling issues.
+# Jobs only enqueue onto the runner pool, so 4 threads are plenty; runs that
+# still miss their grace window are recorded as 'misfired' builds rather than
+# coalesced away.
 scheduler = BackgroundScheduler(
     executors={'default': ThreadPoolExecutor(4)},
     job_defaults={
-        'coalesce': True,       # Only one run if triggers fired while server was down
+        'coalesce': False,      # Every missed run time is either run or recorded
         'max_instances': 1,     # Prevent a script from overlapping with itself
         'misfire_grace_time': 60,
     }
 )
 
+# Leader lease for this process; None when election is disabled
+_election = None
+
+# Highest schedule_changes.id this process has applied, plus the ids applied
+# within the overlap window (id -> created_at) so re-read rows are skipped
+_last_change_id = 0
+_applied_changes: dict = {}
+_change_feed_started = False
+
+# How long applied change rows are kept before the leader prunes them
+_CHANGE_RETENTION = timedelta(days=1)
+
 
 def init_scheduler(app):
     """
     Start the scheduler and re-register all enabled schedules from the DB.
     Call once from create_app() after db.create_all().
     """
+    global _election, _last_change_id, _change_feed_started
+
+    use_election = app.config.get('SCHEDULER_LEADER_ELECTION', True)
     if not scheduler.running:
-        scheduler.start()
+        # Standbys keep their jobs registered but paused until they win the lease
+        scheduler.start(paused=use_election)
+        scheduler.add_listener(
+            lambda event: _on_job_missed(app, event),
+            EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES,
+        )
 
-    # Reload enabled schedules from DB into memory
+    # Reload enabled schedules from DB into memory. Note the change-feed
+    # position first so edits made during the load are replayed, not lost.
     with app.app_context():
+        from extensions import db
         from models.script import Script
+        from models.schedule_change import ScheduleChange
+
+        _last_change_id = db.session.query(db.func.max(ScheduleChange.id)).scalar() or 0
         for script in Script.query.filter_by(schedule_enabled=True).all():
             if script.schedule_cron:
                 _add_job(app, script)
 
+    if use_election and _election is None:
+        from services.leader_election import LeaderLease
+        _election = LeaderLease(
+            app, 'scheduler',
+            ttl_seconds=app.config.get('SCHEDULER_LEASE_TTL', 15),
+            on_elected=_on_elected,
+            on_demoted=_on_demoted,
+        )
+        _election.start()
+        atexit.register(_election.stop)
+
+    if not _change_feed_started:
+        _change_feed_started = True
+        threading.Thread(
+            target=_change_feed_loop,
+            args=(app, app.config.get('SCHEDULER_SYNC_INTERVAL', 2)),
+            name='schedule-change-feed',
+            daemon=True,
+        ).start()
+
+
+def is_leader() -> bool:
+    """True if this process is the one actually firing scheduled jobs."""
+    return _election.is_leader if _election else scheduler.running
+
+
+def get_leader_status() -> dict:
+    if _election is None:
+        return {'election': False, 'is_leader': is_leader()}
+    status = _election.to_dict()
+    status['election'] = True
+    return status
+
+
+def _on_elected():
+    print("Scheduler: acquired leader lease, resuming jobs")
+    # Fire times that passed while this process was a paused standby belonged
+    # to the previous leader; start from now instead of replaying them.
+    now = datetime.now(scheduler.timezone)
+    for job in scheduler.get_jobs():
+        next_run = job.trigger.get_next_fire_time(None, now)
+        if next_run:
+            job.modify(next_run_time=next_run)
+    scheduler.resume()
+
+
+def _on_demoted():
+    print("Scheduler: lost leader lease, pausing jobs")
+    if scheduler.running:
+        scheduler.pause()
+
 
 def register_schedule(app, script):
     """Add or replace the cron job for a script."""
@@ -53,6 +151,79 @@ def remove_schedule(script_id: str):
     _remove_job(script_id)
 
 
+def record_schedule_change(script_id: str):
+    """
+    Append a change-feed entry so other processes re-sync this script.
+    Needs app context; the caller commits along with the schedule edit.
+    """
+    from extensions import db
+    from models.schedule_change import ScheduleChange
+    db.session.add(ScheduleChange(script_id=script_id))
+
+
+def apply_schedule_changes(app) -> int:
+    """
+    Apply change-feed entries not applied yet: those above the last id seen,
+    and any in the overlap window that committed after a higher id was read.
+    Only the scripts named in those entries are re-read and their jobs added,
+    replaced or removed. Returns the number of scripts re-synced.
+    """
+    global _last_change_id
+
+    with app.app_context():
+        from extensions import db
+        from models.script import Script
+        from models.schedule_change import ScheduleChange
+
+        since = datetime.utcnow() - timedelta(seconds=app.config.get('SCHEDULER_CHANGE_OVERLAP', 300))
+        rows = db.session.query(ScheduleChange.id, ScheduleChange.script_id, ScheduleChange.created_at)\
+            .filter(db.or_(ScheduleChange.id > _last_change_id, ScheduleChange.created_at >= since))\
+            .order_by(ScheduleChange.id)\
+            .all()
+        rows = [row for row in rows if row[0] not in _applied_changes]
+        for change_id in [i for i, created_at in _applied_changes.items() if created_at < since]:
+            del _applied_changes[change_id]
+        if not rows:
+            return 0
+
+        script_ids = {script_id for _, script_id, _ in rows}
+        scripts = {s.id: s for s in Script.query.filter(Script.id.in_(script_ids)).all()}
+        for script_id in script_ids:
+            script = scripts.get(script_id)
+            if script:
+                register_schedule(app, script)
+            else:
+                _remove_job(script_id)  # Script was deleted
+
+        for change_id, _, created_at in rows:
+            _applied_changes[change_id] = created_at or datetime.utcnow()
+        _last_change_id = max(_last_change_id, rows[-1][0])
+        return len(script_ids)
+
+
+def _prune_schedule_changes(app):
+    with app.app_context():
+        from extensions import db
+        from models.schedule_change import ScheduleChange
+
+        cutoff = datetime.utcnow() - _CHANGE_RETENTION
+        ScheduleChange.query.filter(ScheduleChange.created_at < cutoff).delete()
+        db.session.commit()
+
+
+def _change_feed_loop(app, interval):
+    last_prune = datetime.utcnow()
+    while True:
+        time.sleep(interval)
+        try:
+            apply_schedule_changes(app)
+            if is_leader() and datetime.utcnow() - last_prune > timedelta(hours=1):
+                _prune_schedule_changes(app)
+                last_prune = datetime.utcnow()
+        except Exception as e:
+            print(f"Warning: schedule change feed failed: {e}")
+
+
 def _job_id(script_id: str) -> str:
     return f"script_{script_id}"
 
@@ -60,12 +231,15 @@ def _job_id(script_id: str) -> str:
 def _add_job(app, script):
     try:
         trigger = CronTrigger.from_crontab(script.schedule_cron)
+        # Spread top-of-minute bursts across a random window
+        trigger.jitter = app.config.get('SCHEDULER_JITTER_SECONDS') or None
         scheduler.add_job(
             func=_run_scheduled_script,
             trigger=trigger,
             id=_job_id(script.id),
             args=[app, script.id],
             replace_existing=True,
+            misfire_grace_time=app.config.get('SCHEDULER_MISFIRE_GRACE', 60),
         )
     except Exception as e:
         print(f"Warning: could not schedule {script.name}: {e}")
@@ -78,28 +252,42 @@ def _remove_job(script_id: str):
 
 
 def _run_scheduled_script(app, script_id: str):
-    """APScheduler calls this in a thread pool thread when the cron fires."""
-    with app.app_context():
-        from extensions import db
-        from models.script import Script, Build
-        from services.script_runner import execute_script_async
-
-        script = db.session.get(Script, script_id)
-        if not script:
-            return
+    """
+    APScheduler calls this in a thread pool thread when the cron fires.
+    It only enqueues onto the runner pool, so the 4 scheduler threads are
+    never tied up by DB work or a busy runner.
+    """
+    from services.script_runner import submit_scheduled_run
+    submit_scheduled_run(app, script_id)
 
-        script_path = os.path.join(app.config['SCRIPTS_FOLDER'], script.filename)
-        if not os.path.exists(script_path):
-            return
 
-        build = Build(script_id=script.id, status='pending', triggered_by='scheduler')
-        db.session.add(build)
-        db.session.commit()
+def _on_job_missed(app, event):
+    """Record a run APScheduler dropped as a 'misfired' Build instead of losing it silently."""
+    if not event.job_id.startswith('script_'):
+        return
+    script_id = event.job_id[len('script_'):]
+    run_times = getattr(event, 'scheduled_run_times', None) or [event.scheduled_run_time]
 
-        build_dir = os.path.join(app.config['BUILDS_FOLDER'], script.filename)
-        os.makedirs(build_dir, exist_ok=True)
+    try:
+        with app.app_context():
+            from extensions import db
+            from models.script import Script, Build
 
-        execute_script_async(app, build.id, script_path, build_dir)
+            if not db.session.get(Script, script_id):
+                return
+            now = datetime.utcnow()
+            for run_time in run_times:
+                scheduled = run_time.astimezone(timezone.utc).replace(tzinfo=None) if run_time else now
+                db.session.add(Build(
+                    script_id=script_id,
+                    status='misfired',
+                    triggered_by='scheduler',
+                    started_at=scheduled,
+                    finished_at=now,
+                ))
+            db.session.commit()
+    except Exception as e:
+        print(f"Warning: could not record misfire for {event.job_id}: {e}")
 
 
 def get_next_run_time(script_id: str):
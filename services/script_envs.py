@@ -0,0 +1,165 @@
+"""
+Per-script dependency environments.
+
+A script that declares requirements (Script.requirements, pip requirement
+lines) runs under its own virtualenv instead of the server's interpreter.
+Environments are keyed by a hash of the normalised requirement set plus the
+Python version, so every script with the same requirements shares one env:
+
+    ENVS_FOLDER/<key>/            the virtualenv
+    ENVS_FOLDER/<key>/.ready      written once pip install succeeded
+    ENVS_FOLDER/<key>.lock        flock held while creating
+
+Only the first build of a new requirement set pays for creation. Packages
+are installed offline from WHEELHOUSE_FOLDER (pip --no-index --find-links),
+so builds never reach out to PyPI. Envs are built in a temp dir and renamed
+into place, so a half-built env is never used. Each use touches .ready; once
+there are more than ENVS_MAX_COUNT envs, the least recently used ones that
+aren't in use by this process are deleted.
+"""
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+# key -> number of builds in this process currently using the env
+_in_use: dict = {}
+_lock = threading.Lock()
+
+# Envs used more recently than this are never evicted (other processes may hold them)
+_EVICT_GRACE_SECONDS = 600
+
+
+def normalize_requirements(requirements) -> list:
+    lines = []
+    for line in (requirements or '').splitlines():
+        line = line.split('#', 1)[0].strip()
+        if line:
+            lines.append(line.lower())
+    return sorted(set(lines))
+
+
+def env_key(requirements) -> str:
+    python = f"{sys.version_info.major}.{sys.version_info.minor}"
+    material = '\n'.join([python] + normalize_requirements(requirements))
+    return hashlib.sha256(material.encode()).hexdigest()[:16]
+
+
+def _python_in(env_dir):
+    return os.path.join(env_dir, 'bin', 'python')
+
+
+def acquire_env(app, requirements, log=print):
+    """
+    Return (key, interpreter path) for the requirement set, creating the env
+    if needed. `log` receives progress lines. Pair with release_env(key).
+    """
+    envs_folder = os.path.abspath(app.config['ENVS_FOLDER'])
+    os.makedirs(envs_folder, exist_ok=True)
+    key = env_key(requirements)
+    env_dir = os.path.join(envs_folder, key)
+    ready = os.path.join(env_dir, '.ready')
+
+    with _lock:
+        _in_use[key] = _in_use.get(key, 0) + 1
+
+    try:
+        if not os.path.exists(ready):
+            with open(os.path.join(envs_folder, f"{key}.lock"), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # Another build may be creating it
+                if not os.path.exists(ready):
+                    _create_env(app, env_dir, normalize_requirements(requirements), log)
+        os.utime(ready)
+    except Exception:
+        release_env(key)
+        raise
+
+    _evict(app, envs_folder)
+    return key, _python_in(env_dir)
+
+
+def release_env(key):
+    with _lock:
+        count = _in_use.get(key, 0) - 1
+        if count > 0:
+            _in_use[key] = count
+        else:
+            _in_use.pop(key, None)
+
+
+def _create_env(app, env_dir, requirements, log):
+    wheelhouse = os.path.abspath(app.config['WHEELHOUSE_FOLDER'])
+    if not os.path.isdir(wheelhouse):
+        raise RuntimeError(f"Wheelhouse folder not found: {wheelhouse}")
+
+    log(f"[env] Creating environment {os.path.basename(env_dir)} for: {', '.join(requirements)}\n")
+    tmp_dir = f"{env_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        subprocess.run([sys.executable, '-m', 'venv', tmp_dir], check=True, capture_output=True, text=True)
+        req_file = os.path.join(tmp_dir, 'requirements.txt')
+        with open(req_file, 'w') as f:
+            f.write('\n'.join(requirements) + '\n')
+        result = subprocess.run(
+            [_python_in(tmp_dir), '-m', 'pip', 'install', '--no-index',
+             '--find-links', wheelhouse, '--disable-pip-version-check', '-r', req_file],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            log(result.stdout)
+            log(result.stderr)
+            raise RuntimeError(f"pip install failed with exit code {result.returncode}")
+
+        # Console scripts in bin/ keep the temp path in their shebangs, but only
+        # bin/python (a symlink) is ever used, so renaming the env is safe.
+        with open(os.path.join(tmp_dir, '.ready'), 'w') as f:
+            f.write(time.strftime('%Y-%m-%dT%H:%M:%S'))
+        shutil.rmtree(env_dir, ignore_errors=True)
+        os.rename(tmp_dir, env_dir)
+    except subprocess.CalledProcessError as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise RuntimeError(f"Could not create virtualenv: {e.stderr or e}")
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    log("[env] Environment ready\n")
+
+
+def _evict(app, envs_folder):
+    max_count = app.config.get('ENVS_MAX_COUNT', 20)
+    envs = []
+    for name in os.listdir(envs_folder):
+        ready = os.path.join(envs_folder, name, '.ready')
+        if os.path.exists(ready):
+            envs.append((os.path.getmtime(ready), name))
+    if len(envs) <= max_count:
+        return
+
+    envs.sort()  # Least recently used first
+    now = time.time()
+    with _lock:
+        in_use = set(_in_use)
+    for last_used, name in envs[:len(envs) - max_count]:
+        if name in in_use or now - last_used < _EVICT_GRACE_SECONDS:
+            continue
+        shutil.rmtree(os.path.join(envs_folder, name), ignore_errors=True)
+
+
+def list_envs(app) -> list:
+    envs_folder = app.config['ENVS_FOLDER']
+    if not os.path.isdir(envs_folder):
+        return []
+    result = []
+    for name in sorted(os.listdir(envs_folder)):
+        ready = os.path.join(envs_folder, name, '.ready')
+        if os.path.exists(ready):
+            result.append({
+                'key': name,
+                'last_used': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(os.path.getmtime(ready))),
+                'in_use': _in_use.get(name, 0),
+            })
+    return result
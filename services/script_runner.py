@@ -1,92 +1,486 @@
 """
 Async script execution engine.
 
-execute_script_async() launches a background thread that:
+execute_script_async() queues a build on the runner pool, whose worker thread:
 1. Runs the script via subprocess
 2. Writes each output line to a .log file AND a per-build queue.Queue
 3. Updates Build.status / timestamps in the DB via the app context
 
+The pool has its own capacity (RUNNER_MAX_WORKERS); builds beyond it wait in
+'pending' until a worker frees up. Enqueueing never blocks, so callers such
+as the scheduler can hand off work and return immediately.
+
+Each build runs in its own process group under per-script limits (wall-clock
+timeout, RLIMIT_CPU, RLIMIT_AS, nice), set inside the child before the script
+starts — see Script.timeout_seconds etc. and the RUNNER_DEFAULT_* settings. A limit hit is recorded as a distinct Build
+status (LIMIT_STATUSES); peak RSS and CPU time are recorded for every build.
+Started builds are tracked in a registry so cancel_build() can stop them.
+
+Logs are written with a sparse line-offset index (services.build_logs) so
+they can be paged and tailed without reading the whole file. Output lines
+are also fed to the full-text build log index (services.log_index).
+
+The script_path callers pass is only a fallback: when a build starts, the
+script's current version is materialized from the content store
+(services.script_store) and recorded on Build.script_hash. Since that file
+lives in the content cache, SCRIPTS_FOLDER is put on PYTHONPATH so helper
+modules kept there can still be imported.
+
+Each build gets an ARTIFACTS_DIR; files left there are moved into the
+content-addressed artifact store (services.artifact_store) on completion.
+
+Scripts that declare requirements run under a cached per-requirement-set
+virtualenv (services.script_envs) instead of the server's interpreter.
+
+With RUNNER_BACKEND = 'warm' scripts are forked from pre-warmed interpreters
+(services.warm_pool) instead of a fresh `python script.py`; the default
+'subprocess' backend is unchanged.
+
 The SSE endpoint reads from the queue in real time while the script runs.
 If the script has already finished, it falls back to reading the log file.
 """
+import json
 import os
+import resource
+import signal
 import subprocess
+import sys
 import threading
+import time
 import queue
 from datetime import datetime
 
+from services.artifact_store import artifacts_dir_for, collect_artifacts
+from services.log_index import init_log_index, index_build, index_line
+from services.build_logs import LogWriter
+from services.script_store import has_content, materialize
+from services.script_envs import acquire_env, release_env
+from services.warm_zygote import MEMORY_LIMIT_EXIT_CODE
+
 
 # Process-level dict: build_id -> Queue
-# Populated when a build starts, cleaned up when it finishes.
+# Populated when a build is queued, cleaned up when it finishes.
 _output_queues: dict = {}
 _lock = threading.Lock()
 
 # Sentinel value that signals end-of-stream to SSE clients
 _DONE = None
 
+# Build statuses recorded when a resource limit stopped the script
+LIMIT_STATUSES = ('timeout', 'cpu_limit', 'memory_limit')
+
+# Runs the script as __main__ exactly like `python script.py`, except that the
+# build's limits (JSON in argv[1]) are applied in the child before any script
+# code runs, with os.nice like the warm backend, and that an uncaught
+# MemoryError exits with MEMORY_LIMIT_EXIT_CODE. RLIMIT_AS only makes
+# allocations fail, so that exit status is how a memory limit hit is told
+# apart. If a limit can't be set the bootstrap fails and the script never runs.
+_BOOTSTRAP = (
+    "import json, os, resource, runpy, sys, traceback\n"
+    "limits = json.loads(sys.argv[1])\n"
+    "sys.argv = sys.argv[2:]\n"
+    "sys.path[0] = os.path.dirname(os.path.abspath(sys.argv[0]))\n"
+    "if limits.get('cpu_seconds'):\n"
+    "    cpu = int(limits['cpu_seconds'])\n"
+    "    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 5))\n"
+    "if limits.get('memory_mb'):\n"
+    "    address_space = int(limits['memory_mb']) * 1024 * 1024\n"
+    "    resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))\n"
+    "if limits.get('nice'):\n"
+    "    os.nice(int(limits['nice']))\n"
+    "try:\n"
+    "    runpy.run_path(sys.argv[0], run_name='__main__')\n"
+    "except MemoryError:\n"
+    "    traceback.print_exc()\n"
+    f"    sys.exit({MEMORY_LIMIT_EXIT_CODE})\n"
+)
+
+# Runner pool: work items are (fn, args, kwargs) tuples run by _worker_loop threads
+_work_queue = queue.Queue()
+_workers: list = []
+_running_count = 0
+
+# Registry of started builds: build_id -> {'pid', 'exited', 'cancelled'}
+_running: dict = {}
+# Queued builds cancelled before a worker picked them up
+_cancelled_pending: set = set()
+
+
+def init_runner(app):
+    """Start runner workers and, for the warm backend, the zygote pool. Called from create_app()."""
+    _ensure_workers(app)
+    init_log_index(app)
+    if app.config.get('RUNNER_BACKEND') == 'warm':
+        from services.warm_pool import start_pool
+        start_pool(app)
+
 
 def execute_script_async(app, build_id: str, script_path: str,
-                         build_dir: str, env_vars: dict = None):
+                         build_dir: str, env_vars: dict = None, stdin_path: str = None,
+                         on_complete=None):
     """
-    Launch script execution in a background thread.
+    Queue script execution on the runner pool.
     Returns immediately. Caller should open the SSE stream endpoint
     to get real-time output.
+
+    stdin_path, if given, is opened and connected to the script's stdin
+    (used for spooled webhook payloads). on_complete(build_id, status), if
+    given, is called on the worker thread once the final status is committed.
+    """
+    q = reserve_output_queue(build_id)
+    log_file = os.path.join(build_dir, f"{build_id}.log")
+    _submit(app, _run_in_thread, (app, build_id, script_path, log_file, env_vars, q),
+            {'stdin_path': stdin_path, 'on_complete': on_complete})
+    return log_file
+
+
+def reserve_output_queue(build_id: str):
+    """
+    Create (or return) the output queue for a build before it is queued, so
+    SSE clients can attach to a build whose row hasn't been written yet.
+    """
+    with _lock:
+        q = _output_queues.get(build_id)
+        if q is None:
+            q = _output_queues[build_id] = queue.Queue()
+        return q
+
+
+def discard_output_queue(build_id: str, message: str = None):
+    """End the stream of a reserved build that will never run, optionally with a last line."""
+    with _lock:
+        q = _output_queues.pop(build_id, None)
+    if q is not None:
+        if message:
+            q.put(message)
+        q.put(_DONE)
+
+
+def submit_scheduled_run(app, script_id: str):
+    """
+    Non-blocking hand-off for the scheduler: the Build row, path checks and
+    the run itself all happen later on a runner worker.
     """
-    q = queue.Queue()
+    _submit(app, _run_scheduled, (app, script_id))
+
+
+def _submit(app, fn, args, kwargs=None):
+    _ensure_workers(app)
+    _work_queue.put_nowait((fn, args, kwargs or {}))
+
+
+def _ensure_workers(app):
     with _lock:
-        _output_queues[build_id] = q
+        wanted = app.config.get('RUNNER_MAX_WORKERS', 4)
+        while len(_workers) < wanted:
+            thread = threading.Thread(target=_worker_loop, name=f"runner-{len(_workers)}", daemon=True)
+            _workers.append(thread)
+            thread.start()
+
+
+def _worker_loop():
+    global _running_count
+    while True:
+        fn, args, kwargs = _work_queue.get()
+        with _lock:
+            _running_count += 1
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Runner error in {getattr(fn, '__name__', fn)}: {e}")
+        finally:
+            with _lock:
+                _running_count -= 1
+            _work_queue.task_done()
+
 
+def _run_scheduled(app, script_id):
+    """Create the Build for a cron trigger and run it on this worker."""
+    with app.app_context():
+        from extensions import db
+        from models.script import Script, Build
+
+        script = db.session.get(Script, script_id)
+        if not script:
+            return
+
+        if not has_content(app, script):
+            return
+        script_path = os.path.join(app.config['SCRIPTS_FOLDER'], script.filename)
+
+        build = Build(script_id=script.id, status='pending', triggered_by='scheduler')
+        db.session.add(build)
+        db.session.commit()
+        build_id = build.id
+
+        build_dir = os.path.join(app.config['BUILDS_FOLDER'], script.filename)
+        os.makedirs(build_dir, exist_ok=True)
+
+    q = reserve_output_queue(build_id)
     log_file = os.path.join(build_dir, f"{build_id}.log")
+    _run_in_thread(app, build_id, script_path, log_file, None, q)
 
-    thread = threading.Thread(
-        target=_run_in_thread,
-        args=(app, build_id, script_path, log_file, env_vars, q),
-        daemon=True
+
+def _spawn(app, script_path, env, stdin, limits, interpreter=None):
+    """
+    Start the script on the configured backend; returns a Popen-like handle.
+    Scripts with their own dependency env (interpreter) always use subprocess.
+    """
+    if interpreter is None and app.config.get('RUNNER_BACKEND') == 'warm':
+        from services.warm_pool import spawn
+        try:
+            return spawn(app, script_path, env, stdin=stdin, limits=limits)
+        except Exception as e:
+            print(f"Warning: warm runner unavailable, falling back to subprocess: {e}")
+
+    process = subprocess.Popen(
+        [interpreter or sys.executable, '-c', _BOOTSTRAP, json.dumps(limits), script_path],
+        stdin=stdin,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        env=env,
+        start_new_session=True,  # Own process group, so kills reach grandchildren too
     )
-    thread.start()
-    return log_file
+    # The bootstrap sets the limits itself before the script starts; prlimit
+    # from here is only a fallback (preexec_fn would be unsafe with threads)
+    try:
+        _apply_limits(process.pid, limits)
+    except ProcessLookupError:
+        pass  # Already exited
+    except Exception:
+        # Never leave a script running without the limits it was given
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        process.wait()
+        process.stdout.close()
+        raise
+    return process
+
+
+def _apply_limits(pid, limits):
+    """Set the same rlimits as the bootstrap on a running child. nice is left to the bootstrap (it's relative)."""
+    if limits.get('cpu_seconds'):
+        cpu = int(limits['cpu_seconds'])
+        # SIGXCPU at the soft limit, SIGKILL a little later if it's ignored
+        resource.prlimit(pid, resource.RLIMIT_CPU, (cpu, cpu + 5))
+    if limits.get('memory_mb'):
+        address_space = int(limits['memory_mb']) * 1024 * 1024
+        resource.prlimit(pid, resource.RLIMIT_AS, (address_space, address_space))
+
+
+def _limits_for(app, script) -> dict:
+    """Per-script limits, falling back to the RUNNER_DEFAULT_* settings."""
+    config = app.config
+
+    def pick(value, default_key):
+        return value if value is not None else config.get(default_key)
+
+    return {
+        'timeout': pick(script.timeout_seconds if script else None, 'RUNNER_DEFAULT_TIMEOUT'),
+        'cpu_seconds': pick(script.cpu_limit_seconds if script else None, 'RUNNER_DEFAULT_CPU_SECONDS'),
+        'memory_mb': pick(script.memory_limit_mb if script else None, 'RUNNER_DEFAULT_MEMORY_MB'),
+        'nice': pick(script.nice if script else None, 'RUNNER_DEFAULT_NICE'),
+    }
+
+
+def terminate_process_group(pid, exited, grace_seconds=5):
+    """
+    SIGTERM the build's process group, then SIGKILL whatever is left after the
+    grace period. `exited` is the Event the runner sets once it has reaped the
+    script — waiting on it (not on the process) leaves reaping to the runner.
+    """
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return
+    exited.wait(grace_seconds)
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _wait_with_usage(process):
+    """Wait for exit and return (returncode, peak_rss_kb, cpu_seconds)."""
+    if hasattr(process, 'maxrss_kb'):  # WarmProcess: the zygote reports rusage
+        process.wait()
+        return process.returncode, process.maxrss_kb, process.cpu_seconds
+
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        return process.wait(), None, None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage.ru_maxrss, round(usage.ru_utime + usage.ru_stime, 3)
+
+
+def _classify(exit_code, limits, cpu_seconds, timed_out):
+    if timed_out:
+        return 'timeout'
+    if exit_code == 0:
+        return 'success'
+    cpu_limit = limits.get('cpu_seconds')
+    if cpu_limit and exit_code in (-signal.SIGXCPU, -signal.SIGKILL) and (cpu_seconds or 0) >= cpu_limit - 1:
+        return 'cpu_limit'
+    if limits.get('memory_mb') and exit_code == MEMORY_LIMIT_EXIT_CODE:
+        return 'memory_limit'
+    return 'failure'
+
+
+def cancel_build(app, build_id: str):
+    """
+    Cancel a build owned by this process. Returns 'cancelled' for a build that
+    hadn't started, 'cancelling' while a running one is being terminated
+    (SIGTERM to its process group, SIGKILL after RUNNER_KILL_GRACE), or None
+    if this process isn't running or queueing it.
+    """
+    with _lock:
+        entry = _running.get(build_id)
+        if entry is None:
+            if build_id not in _output_queues:
+                return None
+            _cancelled_pending.add(build_id)
+            return 'cancelled'
+        entry['cancelled'].set()
+        pid = entry['pid']
 
+    if pid is not None:
+        threading.Thread(
+            target=terminate_process_group,
+            args=(pid, entry['exited'], app.config.get('RUNNER_KILL_GRACE', 5)),
+            daemon=True,
+        ).start()
+    return 'cancelling'
 
-def _run_in_thread(app, build_id, script_path, log_file, env_vars, q):
+
+def _notify_complete(on_complete, build_id, status):
+    if on_complete is None:
+        return
+    try:
+        on_complete(build_id, status)
+    except Exception as e:
+        print(f"Warning: completion callback for build {build_id} failed: {e}")
+
+
+def _finish_cancelled_before_start(app, build_id, q, on_complete=None):
+    notice = "[build cancelled before it started]\n"
+    q.put(notice)
+    q.put(_DONE)
+    with app.app_context():
+        from extensions import db
+        from models.script import Build
+
+        build = db.session.get(Build, build_id)
+        if build:
+            build.status = 'cancelled'
+            build.finished_at = datetime.utcnow()
+            db.session.commit()
+    with _lock:
+        _output_queues.pop(build_id, None)
+    _notify_complete(on_complete, build_id, 'cancelled')
+
+
+def _run_in_thread(app, build_id, script_path, log_file, env_vars, q, stdin_path=None, on_complete=None):
     """Background thread body: run script, stream output, update DB."""
-    import sys
+    entry = {'pid': None, 'exited': threading.Event(), 'cancelled': threading.Event()}
+    with _lock:
+        if build_id in _cancelled_pending:
+            _cancelled_pending.discard(build_id)
+            entry = None
+        else:
+            _running[build_id] = entry
+    if entry is None:
+        _finish_cancelled_before_start(app, build_id, q, on_complete)
+        return
 
+    limits = {}
+    requirements = None
     with app.app_context():
         from extensions import db
         from models.script import Build
 
         build = db.session.get(Build, build_id)
         if build:
+            if build.script:
+                try:
+                    script_path, build.script_hash = materialize(app, build.script)
+                except Exception as e:
+                    print(f"Warning: could not materialize script for build {build_id}: {e}")
+            limits = _limits_for(app, build.script)
+            requirements = build.script.requirements if build.script else None
             build.status = 'running'
             build.started_at = datetime.utcnow()
             build.log_file = log_file
             db.session.commit()
+            index_build(build_id, build.script_id, 'running', started_at=time.time())
 
+    timed_out = threading.Event()
+    exited = entry['exited']
+    artifacts_dir = artifacts_dir_for(log_file, build_id)
+    peak_rss_kb = cpu_seconds = None
     try:
         env = os.environ.copy()
         if env_vars:
             env.update({k: str(v) for k, v in env_vars.items()})
 
         os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        os.makedirs(artifacts_dir, exist_ok=True)
+        env['ARTIFACTS_DIR'] = os.path.abspath(artifacts_dir)
+        # The script itself runs from the content cache; keep helper modules in SCRIPTS_FOLDER importable
+        scripts_folder = os.path.abspath(app.config['SCRIPTS_FOLDER'])
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (scripts_folder, env.get('PYTHONPATH')) if p)
+
+        stdin = open(stdin_path, 'rb') if stdin_path else None
+        timer = None
+        env_key = None
+        try:
+            with LogWriter(log_file) as f:
+                interpreter = None
+                if requirements and requirements.strip():
+                    def log(line):
+                        f.write(line)
+                        f.flush()
+                        q.put(line)
+                    env_key, interpreter = acquire_env(app, requirements, log=log)
+
+                process = _spawn(app, script_path, env, stdin, limits, interpreter)
+                with _lock:
+                    entry['pid'] = process.pid
+                if entry['cancelled'].is_set():  # Cancelled while starting
+                    threading.Thread(
+                        target=terminate_process_group,
+                        args=(process.pid, exited, app.config.get('RUNNER_KILL_GRACE', 5)),
+                        daemon=True,
+                    ).start()
 
-        with open(log_file, 'w', encoding='utf-8', errors='replace') as f:
-            process = subprocess.Popen(
-                [sys.executable, script_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                encoding='utf-8',
-                errors='replace',
-                env=env,
-            )
-
-            for line in process.stdout:
-                f.write(line)
-                f.flush()
-                q.put(line)
-
-            process.wait()
-            exit_code = process.returncode
+                if limits.get('timeout'):
+                    def on_timeout():
+                        timed_out.set()
+                        terminate_process_group(process.pid, exited, app.config.get('RUNNER_KILL_GRACE', 5))
+                    timer = threading.Timer(limits['timeout'], on_timeout)
+                    timer.daemon = True
+                    timer.start()
+
+                for line_no, line in enumerate(process.stdout, 1):
+                    f.write(line)
+                    f.flush()
+                    q.put(line)
+                    index_line(build_id, line_no, line)
+
+                exit_code, peak_rss_kb, cpu_seconds = _wait_with_usage(process)
+        finally:
+            exited.set()
+            if env_key:
+                release_env(env_key)
+            if timer:
+                timer.cancel()
+            if stdin:
+                stdin.close()
 
     except Exception as e:
         error_line = f"ERROR: {e}\n"
@@ -99,8 +493,22 @@ def _run_in_thread(app, build_id, script_path, log_file, env_vars, q):
         exit_code = -1
 
     finally:
+        if entry['cancelled'].is_set():
+            status = 'cancelled'
+        else:
+            status = _classify(exit_code, limits, cpu_seconds, timed_out.is_set())
+        if status in LIMIT_STATUSES or status == 'cancelled':
+            notice = f"\n[build stopped: {status.replace('_', ' ')}]\n"
+            try:
+                with open(log_file, 'a', encoding='utf-8') as f:
+                    f.write(notice)
+            except Exception:
+                pass
+            q.put(notice)
+
         # Signal end-of-stream
         q.put(_DONE)
+        index_build(build_id, status=status, finished_at=time.time())
 
         with app.app_context():
             from extensions import db
@@ -108,16 +516,38 @@ def _run_in_thread(app, build_id, script_path, log_file, env_vars, q):
 
             build = db.session.get(Build, build_id)
             if build:
-                build.status = 'success' if exit_code == 0 else 'failure'
+                build.status = status
                 build.exit_code = exit_code
+                build.peak_rss_kb = peak_rss_kb
+                build.cpu_seconds = cpu_seconds
                 build.finished_at = datetime.utcnow()
+                try:
+                    collect_artifacts(app, build_id, artifacts_dir)
+                except Exception as e:
+                    print(f"Warning: could not collect artifacts for build {build_id}: {e}")
                 db.session.commit()
 
         with _lock:
             _output_queues.pop(build_id, None)
+            _running.pop(build_id, None)
+        _notify_complete(on_complete, build_id, status)
 
 
 def get_output_queue(build_id: str):
     """Return the live queue for a running build, or None if already finished."""
     with _lock:
         return _output_queues.get(build_id)
+
+
+def get_runner_stats(app=None) -> dict:
+    """Snapshot of runner load, used by the readiness probe. With the warm backend, also its zygotes."""
+    with _lock:
+        stats = {
+            'max_workers': len(_workers),
+            'running': _running_count,
+            'queued': _work_queue.qsize(),
+        }
+    if app is not None and app.config.get('RUNNER_BACKEND') == 'warm':
+        from services.warm_pool import pool_stats
+        stats['warm_pool'] = pool_stats()
+    return stats
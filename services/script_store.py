@@ -0,0 +1,181 @@
+"""
+Content-addressed script store.
+
+Script bodies live in the database as immutable blobs keyed by sha256
+(script_blobs). Every save that changes the content appends a
+ScriptVersion and moves Script.content_hash to it, so nodes never share or
+overwrite files, and concurrent saves can't tear a file mid-write. Saves may
+pass the hash they edited (base_hash); a stale one is rejected as a conflict.
+
+Reads go through a per-node read-through cache keyed by hash. Because a hash
+always names the same bytes, nothing is ever invalidated:
+
+    memory   LRU of decoded content, bounded by SCRIPT_CACHE_MAX_BYTES
+    disk     SCRIPT_CACHE_FOLDER/<ab>/<sha256>/<filename>, written once and
+             handed to the runner as the script path
+    database script_blobs
+
+The runner materializes the script's current version when a build starts
+and records it on Build.script_hash. Scripts that predate the store are
+imported from SCRIPTS_FOLDER at boot (import_legacy_files); until then the
+loose file is still used.
+
+Saves go to the store only; nothing is written back to SCRIPTS_FOLDER. A
+materialized script has no siblings in the cache, so modules other scripts
+import belong in SCRIPTS_FOLDER, which the runner puts on PYTHONPATH.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from extensions import db
+
+_cache = OrderedDict()  # sha256 -> content
+_cache_bytes = 0
+_lock = threading.Lock()
+
+
+class ScriptConflict(Exception):
+    """The script changed since the version the caller edited."""
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def save_content(app, script, content, base_hash=None):
+    """
+    Store content as the script's current version (caller commits).
+    Returns the hash. Saving unchanged content adds no version.
+    """
+    from models.script_version import ScriptBlob, ScriptVersion
+
+    if base_hash and script.content_hash and base_hash != script.content_hash:
+        raise ScriptConflict(f"Script was modified (current version {script.content_hash[:12]})")
+
+    sha256 = content_hash(content)
+    if sha256 == script.content_hash:
+        return sha256
+
+    if db.session.get(ScriptBlob, sha256) is None:
+        db.session.add(ScriptBlob(sha256=sha256, content=content, size=len(content.encode('utf-8'))))
+    if script.id is None:
+        db.session.flush()  # Assign the id of a new script
+    latest = db.session.query(db.func.max(ScriptVersion.version)).filter_by(script_id=script.id).scalar()
+    db.session.add(ScriptVersion(script_id=script.id, version=(latest or 0) + 1, content_hash=sha256))
+    script.content_hash = sha256
+    _remember(app, sha256, content)
+    return sha256
+
+
+def _remember(app, sha256, content):
+    global _cache_bytes
+    size = len(content)
+    limit = app.config.get('SCRIPT_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+    if size > limit:
+        return
+    with _lock:
+        if sha256 in _cache:
+            _cache.move_to_end(sha256)
+            return
+        _cache[sha256] = content
+        _cache_bytes += size
+        while _cache_bytes > limit:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+
+
+def load_blob(app, sha256):
+    """Content for a hash: memory, then the disk cache, then the database."""
+    from models.script_version import ScriptBlob
+
+    with _lock:
+        content = _cache.get(sha256)
+        if content is not None:
+            _cache.move_to_end(sha256)
+            return content
+
+    blob_dir = _blob_dir(app, sha256)
+    if os.path.isdir(blob_dir):
+        for name in os.listdir(blob_dir):
+            if not name.startswith('.'):
+                with open(os.path.join(blob_dir, name), 'r', encoding='utf-8') as f:
+                    content = f.read()
+                _remember(app, sha256, content)
+                return content
+
+    blob = db.session.get(ScriptBlob, sha256)
+    if blob is None:
+        return None
+    _remember(app, sha256, blob.content)
+    return blob.content
+
+
+def _legacy_path(app, script):
+    return os.path.join(app.config['SCRIPTS_FOLDER'], script.filename)
+
+
+def get_content(app, script):
+    """Current content of a script, or None if it has none."""
+    if script.content_hash:
+        return load_blob(app, script.content_hash)
+    path = _legacy_path(app, script)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def has_content(app, script):
+    return bool(script.content_hash) or os.path.exists(_legacy_path(app, script))
+
+
+def _blob_dir(app, sha256):
+    return os.path.join(os.path.abspath(app.config['SCRIPT_CACHE_FOLDER']), sha256[:2], sha256)
+
+
+def materialize(app, script):
+    """
+    Return (path, content_hash) of a file holding the script's current
+    version, writing it to the disk cache on first use. Legacy scripts return
+    their loose file with a None hash. Needs app context.
+    """
+    if not script.content_hash:
+        return _legacy_path(app, script), None
+
+    sha256 = script.content_hash
+    path = os.path.join(_blob_dir(app, sha256), script.filename)
+    if not os.path.exists(path):
+        content = load_blob(app, sha256)
+        if content is None:
+            raise FileNotFoundError(f"Script content {sha256[:12]} missing from the store")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = os.path.join(os.path.dirname(path), f".{script.filename}.tmp-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp, path)
+    return path, sha256
+
+
+def list_versions(script_id):
+    from models.script_version import ScriptVersion
+    versions = ScriptVersion.query.filter_by(script_id=script_id).order_by(ScriptVersion.version.desc()).all()
+    return [v.to_dict() for v in versions]
+
+
+def import_legacy_files(app):
+    """Move scripts that only exist as loose files into the store. Needs app context."""
+    from models.script import Script
+
+    imported = 0
+    for script in Script.query.filter(Script.content_hash.is_(None)).all():
+        path = _legacy_path(app, script)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as f:
+            save_content(app, script, f.read())
+        imported += 1
+    if imported:
+        db.session.commit()
+    return imported
@@ -0,0 +1,245 @@
+"""
+Automatic template selection.
+
+Extracting without a template used to run every rule of every template.
+classify() instead picks the template a document most likely belongs to,
+and only that template's rules run.
+
+A document is reduced to a fingerprint of its first page: a list of
+feature strings.
+
+    k:invoice              words (3+ letters)
+    b:invoice_number       consecutive word pairs
+    l:total@3,7            where a word sits, on a 4 x 8 grid of the page
+                           (only when pdfplumber layout is available)
+
+Each template gets a profile of weighted features from two sources:
+
+- Literal words in its rules' regexes (r"Invoice No:\\s*(\\S+)" gives k:invoice),
+  weighted CLASSIFIER_RULE_WEIGHT. A new template works from its rules alone.
+- Fingerprints of up to CLASSIFIER_EXAMPLES documents that were extracted
+  with the template chosen explicitly (not by this classifier, so
+  mistakes don't train themselves in), weighted by the fraction of them
+  that contain the feature.
+
+Features are also weighted by inverse template frequency, so words every
+template shares (e.g. "total") count for little. The score is the cosine of
+the document against each profile. The best template wins if it scores at
+least CLASSIFIER_MIN_SCORE; otherwise there's no match and callers fall
+back to running all rules.
+
+The index is built in memory on first use. Every CLASSIFIER_CHECK_SECONDS
+a signature of templates, rules and loaded rule-set artifacts is compared
+against the one it was built from, and the index is rebuilt when anything
+changed (in this process or another). New example documents don't change
+the signature; they are picked up by a full rebuild every
+CLASSIFIER_REBUILD_SECONDS, so a steady stream of explicit extractions
+doesn't cause a rebuild each. invalidate() forces an immediate check after
+edits made here.
+
+Checks and rebuilds query the DB outside the module lock, one thread at a
+time; meanwhile other threads keep classifying with the current index.
+"""
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from extensions import db
+
+_WORD = re.compile(r'[a-z]{3,}')
+_REGEX_ESCAPE = re.compile(r'\\[a-zA-Z]')
+_STOPWORDS = frozenset('the and for with from this that are was were you your our not all any per'.split())
+
+GRID_COLUMNS = 4
+GRID_ROWS = 8
+MAX_KEYWORDS = 200
+MAX_BIGRAMS = 200
+
+_lock = threading.Lock()  # Guards _index/_checked_at; never held during DB work
+_build_lock = threading.Lock()  # One check/rebuild at a time
+_index = None  # built by _build_index()
+_checked_at = 0.0
+_invalidations = 0  # So an invalidate() during a rebuild isn't lost
+
+
+def _words(text):
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def fingerprint(first_page_text, layout=None):
+    """Feature list for a document's first page (see the module docstring)."""
+    words = _words(first_page_text or '')
+    keywords = [w for w, _ in Counter(words).most_common(MAX_KEYWORDS)]
+    bigrams = [b for b, _ in Counter(f"{a}_{b}" for a, b in zip(words, words[1:])).most_common(MAX_BIGRAMS)]
+    features = [f"k:{w}" for w in keywords] + [f"b:{b}" for b in bigrams]
+
+    if layout and layout.get('width') and layout.get('height'):
+        seen = set()
+        for text, x0, top in layout.get('words') or []:
+            for word in _words(text):
+                col = min(GRID_COLUMNS - 1, int(x0 / layout['width'] * GRID_COLUMNS))
+                row = min(GRID_ROWS - 1, int(top / layout['height'] * GRID_ROWS))
+                feature = f"l:{word}@{col},{row}"
+                if feature not in seen:
+                    seen.add(feature)
+                    features.append(feature)
+    return features
+
+
+def fingerprint_from_text(text, chars=4000):
+    """Keyword-only fingerprint from stored text, for documents saved without one (no layout)."""
+    return fingerprint((text or '')[:chars])
+
+
+def document_features(document):
+    """Fingerprint of a stored ExtractionDocument."""
+    if document.fingerprint:
+        return json.loads(document.fingerprint)
+    return fingerprint_from_text(document.text)
+
+
+def rule_keywords(regex):
+    """Literal words in a rule's regex, as k: features."""
+    literal = _REGEX_ESCAPE.sub(' ', regex or '')
+    literal = re.sub(r'\[[^\]]*\]|\{[^}]*\}|\(\?[^)]*\)', ' ', literal)
+    return {f"k:{w}" for w in _words(literal)}
+
+
+def invalidate():
+    global _checked_at, _invalidations
+    with _lock:
+        _checked_at = 0.0
+        _invalidations += 1
+
+
+def _signature():
+    from models.template import ExtractionTemplate
+    from models.rule import ExtractionRule
+    from services.ruleset import list_rulesets
+
+    digest = hashlib.sha256()
+    for row in db.session.query(ExtractionTemplate.id, ExtractionTemplate.name).order_by(ExtractionTemplate.id):
+        digest.update(repr(tuple(row)).encode())
+    rules = db.session.query(ExtractionRule.template_id, ExtractionRule.field_name, ExtractionRule.regex)
+    for row in sorted(rules.all(), key=repr):
+        digest.update(repr(tuple(row)).encode())
+    for ruleset in sorted(list_rulesets(), key=lambda r: r['template_id'] or ''):
+        digest.update(f"{ruleset['template_id']}:{ruleset['content_hash']}".encode())
+    return digest.hexdigest()
+
+
+def _example_fingerprints(template_id, limit):
+    from models.extraction_result import ExtractionResult, ExtractionDocument
+
+    rows = db.session.query(ExtractionDocument.fingerprint, ExtractionDocument.text).join(
+        ExtractionResult, ExtractionResult.document_hash == ExtractionDocument.sha256,
+    ).filter(
+        ExtractionResult.template_id == template_id,
+        ExtractionResult.classifier_score.is_(None),
+    ).group_by(ExtractionDocument.sha256).order_by(db.func.max(ExtractionResult.created_at).desc()).limit(limit)
+    return [json.loads(fp) if fp else fingerprint_from_text(text) for fp, text in rows]
+
+
+def _build_index(app, signature):
+    from models.template import ExtractionTemplate
+    from services.ruleset import resolve_rules
+
+    rule_weight = app.config.get('CLASSIFIER_RULE_WEIGHT', 2.0)
+    examples_limit = app.config.get('CLASSIFIER_EXAMPLES', 50)
+
+    profiles = {}
+    for template in ExtractionTemplate.query.all():
+        rules, _ = resolve_rules(template.id)
+        if not rules:
+            continue  # Nothing to run, so never worth selecting
+        weights = Counter()
+        for rule in rules:
+            for feature in rule_keywords(rule.get('regex')):
+                weights[feature] = rule_weight
+        examples = _example_fingerprints(template.id, examples_limit)
+        for features in examples:
+            for feature in set(features):
+                weights[feature] += 1.0 / len(examples)
+        if weights:
+            profiles[template.id] = {'name': template.name, 'weights': weights, 'examples': len(examples)}
+
+    template_frequency = Counter(f for p in profiles.values() for f in p['weights'])
+    count = len(profiles)
+    idf = {f: math.log(1 + count / n) for f, n in template_frequency.items()}
+    for profile in profiles.values():
+        profile['weights'] = {f: w * idf[f] for f, w in profile['weights'].items()}
+        profile['norm'] = math.sqrt(sum(w * w for w in profile['weights'].values())) or 1.0
+    return {'signature': signature, 'profiles': profiles, 'idf': idf, 'built_at': time.time()}
+
+
+def get_index(app):
+    """
+    The current index, rebuilt when templates or rules changed, or when it is
+    older than CLASSIFIER_REBUILD_SECONDS. Needs app context.
+    """
+    global _index, _checked_at
+    check_seconds = app.config.get('CLASSIFIER_CHECK_SECONDS', 5)
+    with _lock:
+        index, checked_at = _index, _checked_at
+    if index is not None and time.time() - checked_at < check_seconds:
+        return index
+
+    # Only the first build makes callers wait; later ones serve the current index meanwhile
+    if not _build_lock.acquire(blocking=index is None):
+        return index
+    try:
+        with _lock:
+            index, checked_at, invalidations = _index, _checked_at, _invalidations
+        if index is not None and time.time() - checked_at < check_seconds:
+            return index  # Built by the thread we waited for
+        signature = _signature()
+        if (index is None or index['signature'] != signature
+                or time.time() - index['built_at'] >= app.config.get('CLASSIFIER_REBUILD_SECONDS', 300)):
+            index = _build_index(app, signature)
+        with _lock:
+            _index = index
+            _checked_at = time.time() if _invalidations == invalidations else 0.0
+        return index
+    finally:
+        _build_lock.release()
+
+
+def classify(app, features):
+    """
+    Best template for a fingerprint: {'template_id', 'template_name', 'score',
+    'candidates': [top 3]}, with template_id None when nothing scored
+    CLASSIFIER_MIN_SCORE. Needs app context.
+    """
+    index = get_index(app)
+    idf = index['idf']
+    doc = {f: idf[f] for f in set(features) if f in idf}
+    doc_norm = math.sqrt(sum(w * w for w in doc.values())) or 1.0
+
+    scores = []
+    for template_id, profile in index['profiles'].items():
+        weights = profile['weights']
+        dot = sum(w * weights[f] for f, w in doc.items() if f in weights)
+        if dot:
+            scores.append((dot / (doc_norm * profile['norm']), profile['name'], template_id))
+    scores.sort(reverse=True)
+
+    candidates = [{'template_id': t, 'template_name': n, 'score': round(s, 4)} for s, n, t in scores[:3]]
+    best = candidates[0] if candidates else None
+    if best is None or best['score'] < app.config.get('CLASSIFIER_MIN_SCORE', 0.15):
+        return {'template_id': None, 'template_name': None, 'score': best['score'] if best else 0.0,
+                'candidates': candidates}
+    return {**best, 'candidates': candidates}
+
+
+def index_stats(app):
+    index = get_index(app)
+    return {
+        'templates': len(index['profiles']),
+        'features': len(index['idf']),
+        'examples': {p['name']: p['examples'] for p in index['profiles'].values()},
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(index['built_at'])),
+    }
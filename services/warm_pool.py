@@ -0,0 +1,176 @@
+"""
+Warm interpreter pool — opt-in runner backend (RUNNER_BACKEND = 'warm').
+
+Keeps RUNNER_WARM_POOL_SIZE long-lived zygote processes (services/warm_zygote.py)
+that have already imported RUNNER_PRELOAD_MODULES. spawn() asks a zygote to
+fork a fresh child for the script, so each build still runs in its own
+process (own memory, own session/process group) but skips interpreter
+start-up and re-importing heavy libraries.
+
+spawn() returns a WarmProcess, a small Popen look-alike (pid, stdout,
+wait(), poll(), returncode) so the runner treats both backends the same.
+A zygote that dies is restarted on the next spawn; builds it was tracking
+finish with returncode -1.
+"""
+import io
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+_ZYGOTE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warm_zygote.py')
+
+
+class WarmProcess:
+    """Handle for a script forked by a zygote."""
+
+    def __init__(self, pid, stdout):
+        self.pid = pid
+        self.stdout = stdout
+        self.returncode = None
+        self.maxrss_kb = None
+        self.cpu_seconds = None
+        self._exited = threading.Event()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(str(self.pid), timeout)
+        return self.returncode
+
+    def _set_exit(self, returncode, maxrss_kb=None, cpu_seconds=None):
+        self.returncode = returncode
+        self.maxrss_kb = maxrss_kb
+        self.cpu_seconds = cpu_seconds
+        self._exited.set()
+
+
+class Zygote:
+    def __init__(self, preload_modules):
+        self.preload_modules = preload_modules
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._pending = {}    # request id -> [Event, pid]
+        self._children = {}   # pid -> WarmProcess
+        self._early_exits = {}  # pid -> exit message that beat the spawn reply
+        self._state_lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.process = subprocess.Popen(
+            [sys.executable, _ZYGOTE_SCRIPT, str(child_sock.fileno()), ','.join(self.preload_modules)],
+            pass_fds=[child_sock.fileno()],
+            close_fds=True,
+        )
+        child_sock.close()
+        self.sock = parent_sock
+        self.alive = True
+        threading.Thread(target=self._read_loop, name=f"zygote-{self.process.pid}", daemon=True).start()
+
+    def spawn(self, script_path, env, stdin=None, limits=None):
+        read_fd, write_fd = os.pipe()
+        fds = [write_fd]
+        if stdin is not None:
+            fds.append(stdin.fileno())
+
+        request_id = next(self._ids)
+        waiter = [threading.Event(), None]
+        with self._state_lock:
+            self._pending[request_id] = waiter
+
+        message = json.dumps({
+            'id': request_id,
+            'script': os.path.abspath(script_path),
+            'env': env,
+            'stdin': stdin is not None,
+            'limits': limits or {},
+        }) + '\n'
+        try:
+            with self._send_lock:
+                socket.send_fds(self.sock, [message.encode()], fds)
+                if not waiter[0].wait(60) or waiter[1] is None:
+                    raise RuntimeError('warm zygote did not acknowledge spawn request')
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+            with self._state_lock:
+                self._pending.pop(request_id, None)
+
+        pid = waiter[1]
+        stdout = io.TextIOWrapper(io.FileIO(read_fd, 'r'), encoding='utf-8', errors='replace')
+        proc = WarmProcess(pid, stdout)
+        with self._state_lock:
+            self._children[pid] = proc
+            early = self._early_exits.pop(pid, None)
+        if early:
+            self._finish(early)
+        return proc
+
+    def _read_loop(self):
+        reader = self.sock.makefile('rb')
+        for line in reader:
+            msg = json.loads(line)
+            if 'pid' in msg:
+                with self._state_lock:
+                    waiter = self._pending.get(msg['id'])
+                if waiter:
+                    waiter[1] = msg['pid']
+                    waiter[0].set()
+            elif 'exit' in msg:
+                self._finish(msg)
+
+        # EOF — the zygote died. Fail everything it was tracking.
+        self.alive = False
+        with self._state_lock:
+            children = list(self._children.values())
+            self._children.clear()
+            for waiter in self._pending.values():
+                waiter[0].set()
+        for proc in children:
+            proc._set_exit(-1)
+
+    def _finish(self, msg):
+        with self._state_lock:
+            proc = self._children.pop(msg['exit'], None)
+            if proc is None:
+                self._early_exits[msg['exit']] = msg
+                return
+        proc._set_exit(msg['returncode'], msg.get('maxrss_kb'), msg.get('cpu_seconds'))
+
+
+# Process-level pool, created by start_pool()
+_zygotes: list = []
+_next = itertools.count()
+_pool_lock = threading.Lock()
+
+
+def start_pool(app):
+    """Start (or top up) the zygote pool. Zygotes preload in the background."""
+    modules = [m.strip() for m in app.config.get('RUNNER_PRELOAD_MODULES', '').split(',') if m.strip()]
+    size = max(1, app.config.get('RUNNER_WARM_POOL_SIZE', 1))
+    with _pool_lock:
+        _zygotes[:] = [z for z in _zygotes if z.alive]
+        while len(_zygotes) < size:
+            _zygotes.append(Zygote(modules))
+        return len(_zygotes)
+
+
+def spawn(app, script_path, env, stdin=None, limits=None) -> WarmProcess:
+    """Fork the script from the next warm zygote (round-robin)."""
+    start_pool(app)
+    with _pool_lock:
+        zygote = _zygotes[next(_next) % len(_zygotes)]
+    return zygote.spawn(script_path, env, stdin=stdin, limits=limits)
+
+
+def pool_stats() -> dict:
+    with _pool_lock:
+        return {'zygotes': len(_zygotes), 'alive': sum(1 for z in _zygotes if z.alive)}
@@ -0,0 +1,176 @@
+"""
+Warm interpreter ("zygote") process for the warm runner backend.
+
+Started by services.warm_pool as:
+
+    python warm_zygote.py <control_fd> <comma-separated preload modules>
+
+It imports the preload modules once, then serves spawn requests over the
+control socket. Each request is one JSON line accompanied (via SCM_RIGHTS)
+by the fds for the child's stdout/stderr and, optionally, stdin:
+
+    -> {"id": 7, "script": "/abs/path.py", "env": {...}, "stdin": false,
+        "limits": {"cpu_seconds": 60, "memory_mb": 512, "nice": 10}}
+    <- {"id": 7, "pid": 12345}
+    <- {"exit": 12345, "returncode": 0, "maxrss_kb": 20480, "cpu_seconds": 0.12}
+
+For every request the zygote forks. The child starts a new session (so the
+whole process group can be signalled), wires up the fds, replaces its
+environment, applies the resource limits and runs the script with runpy as __main__ — it inherits the
+already-imported modules instead of paying interpreter start-up again.
+The zygote reaps children itself and reports exit status and rusage. A
+script that dies of MemoryError exits with MEMORY_LIMIT_EXIT_CODE, which is
+how the runner tells a memory limit hit from an ordinary failure; if the
+limits can't be applied the script doesn't run at all.
+
+This file must stay importable with nothing but the standard library.
+"""
+import json
+import os
+import resource
+import runpy
+import select
+import signal
+import socket
+import sys
+import traceback
+
+# Exit status of a script killed by an uncaught MemoryError (see services.script_runner)
+MEMORY_LIMIT_EXIT_CODE = 97
+
+
+def _run_child(request, fds):
+    os.setsid()
+    out_fd = fds[0]
+    os.dup2(out_fd, 1)
+    os.dup2(out_fd, 2)
+    if request.get('stdin') and len(fds) > 1:
+        os.dup2(fds[1], 0)
+    else:
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+    for fd in fds:
+        if fd > 2:
+            os.close(fd)
+
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    os.environ.clear()
+    os.environ.update(request.get('env') or {})
+
+    script = request['script']
+    sys.argv = [script]
+    sys.path[0] = os.path.dirname(os.path.abspath(script))
+    # The interpreter read PYTHONPATH when the zygote started; apply this build's
+    for entry in reversed(os.environ.get('PYTHONPATH', '').split(os.pathsep)):
+        if entry and entry not in sys.path:
+            sys.path.insert(1, entry)
+
+    code = 0
+    try:
+        _apply_limits(request.get('limits') or {})
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except MemoryError:
+        traceback.print_exc()
+        code = MEMORY_LIMIT_EXIT_CODE
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(code)
+
+
+def _apply_limits(limits):
+    if limits.get('cpu_seconds'):
+        cpu = int(limits['cpu_seconds'])
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 5))
+    if limits.get('memory_mb'):
+        address_space = int(limits['memory_mb']) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+    if limits.get('nice'):
+        os.nice(int(limits['nice']))
+
+
+def _send(sock, message):
+    sock.sendall((json.dumps(message) + '\n').encode())
+
+
+def _reap(sock):
+    while True:
+        try:
+            pid, status, usage = os.wait4(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        _send(sock, {
+            'exit': pid,
+            'returncode': os.waitstatus_to_exitcode(status),
+            'maxrss_kb': usage.ru_maxrss,
+            'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 3),
+        })
+
+
+def main():
+    control_fd = int(sys.argv[1])
+    preload = [m for m in (sys.argv[2] if len(sys.argv) > 2 else '').split(',') if m.strip()]
+
+    for module in preload:
+        try:
+            __import__(module.strip())
+        except Exception as e:
+            print(f"warm_zygote: could not preload {module}: {e}", file=sys.stderr)
+
+    # SIGCHLD wakes the select loop through a self-pipe so exits are reported promptly
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    sock = socket.socket(fileno=control_fd)
+    buffer = b''
+    pending_fds = []
+    while True:
+        readable, _, _ = select.select([sock, wakeup_r], [], [], 5)
+        if wakeup_r in readable:
+            os.read(wakeup_r, 512)
+        _reap(sock)
+        if sock not in readable:
+            continue
+
+        data, fds, _, _ = socket.recv_fds(sock, 65536, 4)
+        if not data:
+            return  # Parent went away
+        buffer += data
+        pending_fds.extend(fds)
+        # Only one request is ever in flight, so the fds belong to the next complete line
+        while b'\n' in buffer:
+            line, buffer = buffer.split(b'\n', 1)
+            request = json.loads(line)
+            child_fds, pending_fds = pending_fds, []
+            pid = os.fork()
+            if pid == 0:
+                sock.close()
+                os.close(wakeup_r)
+                os.close(wakeup_w)
+                _run_child(request, child_fds)
+            for fd in child_fds:
+                os.close(fd)
+            _send(sock, {'id': request['id'], 'pid': pid})
+
+
+if __name__ == '__main__':
+    main()
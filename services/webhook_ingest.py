@@ -0,0 +1,351 @@
+"""
+Webhook ingestion fast path.
+
+trigger_webhook() does no DB work on the hot path:
+
+1. Token lookup goes through an in-memory token -> script cache
+   (WEBHOOK_TOKEN_CACHE_TTL seconds; invalidated locally when a token is
+   regenerated or a script is saved — other nodes pick it up at TTL expiry).
+2. Retried deliveries are dropped by delivery id. The id comes from the first
+   header in WEBHOOK_DEDUPE_HEADERS present on the request (Idempotency-Key,
+   X-GitHub-Delivery, ...) and is remembered per script for
+   WEBHOOK_DEDUPE_WINDOW seconds, answering with the original build_id.
+   That cache is per process; on a miss Build.delivery_id is looked up, and
+   a unique index on (script_id, delivery_id) rejects the second of two
+   deliveries that reached different processes at the same time.
+3. Accepted deliveries get a build_id immediately and are appended to an
+   in-memory ingest buffer. A flusher thread inserts buffered Builds in
+   batches with one commit, then hands them to the runner pool. When a batch
+   fails its rows are inserted one by one: a row the DB rejects (duplicate
+   delivery, script deleted meanwhile) is dropped with a warning, and one
+   that still fails after WEBHOOK_FLUSH_MAX_ATTEMPTS tries is dropped too,
+   so a bad row never holds up the rest.
+
+The build's output queue is reserved at accept time, so a client opening the
+SSE stream before the batch is flushed simply waits for the first line.
+
+Payloads larger than WEBHOOK_PAYLOAD_INLINE_LIMIT bytes never go through an
+env var (which is copied into every child and fails with E2BIG on large
+bodies). The request body is streamed once into <build_id>.payload.json in
+the build directory; the script gets its path as WEBHOOK_PAYLOAD_FILE and the
+same file on stdin, and Build.payload_path stores the reference instead of
+the blob. The size is judged by reading the body, not Content-Length, so
+chunked requests are spooled too. The file is kept with the build, like its
+log; with WEBHOOK_PAYLOAD_RETENTION_DAYS set, the leader removes payloads of
+builds that finished longer ago than that and clears their payload_path. A
+delivery dropped before its Build is stored has its file removed at once.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+# token -> {'script_id', 'name', 'filename', 'expires'}
+_token_cache: dict = {}
+# (script_id, delivery_id) -> (build_id, expires)
+_deliveries: dict = {}
+_cache_lock = threading.Lock()
+
+# Append-only buffer of accepted deliveries awaiting a batch insert
+_buffer = deque()
+_wakeup = threading.Event()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def resolve_token(app, token):
+    """Return the cached webhook target for a token, loading it from the DB on a miss."""
+    now = time.monotonic()
+    with _cache_lock:
+        target = _token_cache.get(token)
+        if target and target['expires'] > now:
+            return target
+
+    from models.script import Script
+    script = Script.query.filter_by(webhook_token=token).first()
+    if not script:
+        return None
+
+    target = {
+        'script_id': script.id,
+        'name': script.name,
+        'filename': script.filename,
+        'expires': now + app.config.get('WEBHOOK_TOKEN_CACHE_TTL', 30),
+    }
+    with _cache_lock:
+        _token_cache[token] = target
+    return target
+
+
+def invalidate_token(token):
+    with _cache_lock:
+        _token_cache.pop(token, None)
+
+
+def invalidate_script(script_id):
+    """Drop cached targets for a script, e.g. after it is renamed."""
+    with _cache_lock:
+        for token in [t for t, v in _token_cache.items() if v['script_id'] == script_id]:
+            del _token_cache[token]
+
+
+def get_delivery_id(app, headers):
+    for name in app.config.get('WEBHOOK_DEDUPE_HEADERS', ()):
+        value = headers.get(name, '').strip()
+        if value:
+            return value[:255]
+    return None
+
+
+def claim_delivery(app, script_id, delivery_id, build_id):
+    """
+    Remember delivery_id for this script. Returns the build_id of an earlier
+    delivery with the same id (in this process's window, else stored on a
+    Build), or None when this one is new. Needs app context.
+    """
+    now = time.monotonic()
+    key = (script_id, delivery_id)
+    window = app.config.get('WEBHOOK_DEDUPE_WINDOW', 3600)
+    with _cache_lock:
+        seen = _deliveries.get(key)
+        if seen and seen[1] > now:
+            return seen[0]
+
+    from extensions import db
+    from models.script import Build
+    stored = db.session.query(Build.id).filter_by(script_id=script_id, delivery_id=delivery_id).first()
+
+    with _cache_lock:
+        seen = _deliveries.get(key)
+        if seen and seen[1] > now:
+            return seen[0]  # Claimed by another thread while we queried
+        if len(_deliveries) > 10000:
+            for k in [k for k, v in _deliveries.items() if v[1] <= now]:
+                del _deliveries[k]
+        _deliveries[key] = (stored[0] if stored else build_id, now + window)
+    return stored[0] if stored else None
+
+
+def _forget_delivery(script_id, delivery_id, build_id):
+    with _cache_lock:
+        seen = _deliveries.get((script_id, delivery_id))
+        if seen and seen[0] == build_id:
+            del _deliveries[(script_id, delivery_id)]
+
+
+def read_payload(app, target, build_id, stream, chunk_size=64 * 1024):
+    """
+    Read a request body of unknown length (chunked bodies have no
+    Content-Length). Returns (body bytes, None) when it fits in
+    WEBHOOK_PAYLOAD_INLINE_LIMIT, else (None, spooled path) with the part
+    already read written first.
+    """
+    limit = app.config['WEBHOOK_PAYLOAD_INLINE_LIMIT']
+    body = b''
+    while len(body) <= limit:
+        chunk = stream.read(min(chunk_size, limit + 1 - len(body)))
+        if not chunk:
+            return body, None
+        body += chunk
+    return None, spool_payload(app, target, build_id, stream, chunk_size, prefix=body)
+
+
+def spool_payload(app, target, build_id, stream, chunk_size=64 * 1024, prefix=b''):
+    """Copy a request body stream to the build directory without buffering it. Returns the path."""
+    build_dir = os.path.join(app.config['BUILDS_FOLDER'], target['filename'])
+    os.makedirs(build_dir, exist_ok=True)
+    path = os.path.abspath(os.path.join(build_dir, f"{build_id}.payload.json"))
+    with open(path, 'wb') as f:
+        f.write(prefix)
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+    return path
+
+
+def _remove_payload(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def prune_payloads(app):
+    """
+    Remove spooled payloads of builds that finished more than
+    WEBHOOK_PAYLOAD_RETENTION_DAYS ago and clear their payload_path.
+    Returns how many were removed.
+    """
+    from extensions import db
+    from models.script import Build
+
+    days = app.config.get('WEBHOOK_PAYLOAD_RETENTION_DAYS', 0)
+    if not days:
+        return 0
+    with app.app_context():
+        builds = Build.query.filter(
+            Build.payload_path.isnot(None),
+            Build.finished_at < datetime.utcnow() - timedelta(days=days),
+        ).limit(1000).all()
+        for build in builds:
+            _remove_payload(build.payload_path)
+            build.payload_path = None
+        db.session.commit()
+        return len(builds)
+
+
+def schedule_payload_pruning(app):
+    """Register the hourly prune when WEBHOOK_PAYLOAD_RETENTION_DAYS is set. Called from create_app()."""
+    if not app.config.get('WEBHOOK_PAYLOAD_RETENTION_DAYS', 0):
+        return
+    from services.scheduler_service import scheduler
+    scheduler.add_job(
+        prune_payloads, 'interval', hours=1, args=[app],
+        id='webhook-payload-prune', replace_existing=True,
+    )
+
+
+def ingest(app, target, payload_json=None, delivery_id=None, build_id=None, payload_path=None):
+    """
+    Queue a webhook delivery for batched persistence and execution.
+    Pass either payload_json (inline) or payload_path (spooled).
+    Returns the build_id the Build row will be created with.
+    """
+    from services.script_runner import reserve_output_queue
+
+    build_id = build_id or str(uuid.uuid4())
+    reserve_output_queue(build_id)
+    _buffer.append({
+        'build_id': build_id,
+        'script_id': target['script_id'],
+        'filename': target['filename'],
+        'payload_json': payload_json,
+        'payload_path': payload_path,
+        'delivery_id': delivery_id,
+    })
+    _ensure_flusher(app)
+    _wakeup.set()
+    return build_id
+
+
+def _ensure_flusher(app):
+    global _flusher
+    if _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, args=(app,), name='webhook-flusher', daemon=True)
+            _flusher.start()
+
+
+def _flush_loop(app):
+    interval = app.config.get('WEBHOOK_FLUSH_INTERVAL', 0.05)
+    while True:
+        _wakeup.wait()
+        _wakeup.clear()
+        time.sleep(interval)  # Let a burst accumulate into one batch
+        while _buffer:
+            try:
+                flush(app)
+            except Exception as e:
+                print(f"Warning: webhook flush failed, retrying: {e}")
+                time.sleep(1)
+
+
+def _build_row(item):
+    from models.script import Build
+    return Build(
+        id=item['build_id'],
+        script_id=item['script_id'],
+        status='pending',
+        triggered_by='webhook',
+        webhook_payload=item['payload_json'],
+        payload_path=item['payload_path'],
+        delivery_id=item['delivery_id'],
+    )
+
+
+def _drop(item, error):
+    """Give up on a delivery whose Build can't be stored: end its stream and remove its payload."""
+    from services.script_runner import discard_output_queue
+
+    print(f"Warning: dropping webhook delivery {item['build_id']} for script {item['script_id']}: {error}")
+    if item['delivery_id']:
+        _forget_delivery(item['script_id'], item['delivery_id'], item['build_id'])
+    discard_output_queue(item['build_id'], f"ERROR: build could not be recorded: {error}\n")
+    if item['payload_path']:
+        _remove_payload(item['payload_path'])
+
+
+def _insert_each(app, batch):
+    """After a failed batch insert: insert row by row. Returns (inserted, still to retry)."""
+    from extensions import db
+
+    max_attempts = app.config.get('WEBHOOK_FLUSH_MAX_ATTEMPTS', 5)
+    inserted, retry = [], []
+    for item in batch:
+        try:
+            db.session.add(_build_row(item))
+            db.session.commit()
+            inserted.append(item)
+        except IntegrityError as e:
+            db.session.rollback()
+            _drop(item, e.orig)  # Duplicate delivery or the script is gone; retrying can't help
+        except Exception as e:
+            db.session.rollback()
+            item['attempts'] = item.get('attempts', 0) + 1
+            if item['attempts'] >= max_attempts:
+                _drop(item, e)
+            else:
+                retry.append(item)
+    return inserted, retry
+
+
+def flush(app):
+    """Insert up to WEBHOOK_FLUSH_BATCH buffered deliveries and start their builds."""
+    from services.script_runner import execute_script_async
+
+    batch = []
+    limit = app.config.get('WEBHOOK_FLUSH_BATCH', 200)
+    while _buffer and len(batch) < limit:
+        batch.append(_buffer.popleft())
+    if not batch:
+        return 0
+
+    retry = []
+    with app.app_context():
+        from extensions import db
+
+        try:
+            db.session.add_all([_build_row(item) for item in batch])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Warning: webhook batch insert failed, inserting one by one: {getattr(e, 'orig', e)}")
+            batch, retry = _insert_each(app, batch)
+
+    for item in batch:
+        build_dir = os.path.join(app.config['BUILDS_FOLDER'], item['filename'])
+        os.makedirs(build_dir, exist_ok=True)
+        script_path = os.path.join(app.config['SCRIPTS_FOLDER'], item['filename'])
+        env_vars = {
+            'BUILD_ID': item['build_id'],
+            'SCRIPT_ID': item['script_id'],
+        }
+        if item['payload_path']:
+            env_vars['WEBHOOK_PAYLOAD_FILE'] = item['payload_path']
+        else:
+            env_vars['WEBHOOK_PAYLOAD'] = item['payload_json']
+        execute_script_async(app, item['build_id'], script_path, build_dir,
+                             env_vars=env_vars, stdin_path=item['payload_path'])
+
+    if retry:
+        _buffer.extendleft(reversed(retry))  # Put back for _flush_loop to retry after a pause
+        raise RuntimeError(f"{len(retry)} webhook deliveries could not be stored")
+    return len(batch)
@@ -0,0 +1,191 @@
+"""
+Shared fixtures: a Flask app on a throwaway SQLite database (no background
+workers) and a local fake of the GitHub Gist API for the sync tests.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from extensions import db  # noqa: E402
+
+
+class FakeGistServer:
+    """
+    In-memory /gists API. Records every request as (method, path, headers,
+    body). fail[method] is a list of status codes returned (in order) before
+    requests of that method succeed again; rate_remaining is sent as
+    X-RateLimit-Remaining; on_request(method, path) runs before each reply.
+    """
+
+    def __init__(self):
+        self.gists = {}
+        self.requests = []
+        self.fail = {}
+        self.rate_remaining = 5000
+        self.on_request = None
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def calls(self, method=None):
+        return [r for r in self.requests if method is None or r[0] == method]
+
+    def add_gist(self, filename, content):
+        gist_id = uuid.uuid4().hex
+        self.gists[gist_id] = {'description': '', 'files': {filename: content}}
+        return gist_id, self.etag(gist_id)
+
+    def etag(self, gist_id):
+        gist = self.gists[gist_id]
+        return '"%s"' % hashlib.sha256(json.dumps(gist, sort_keys=True).encode()).hexdigest()[:32]
+
+    def _body(self, gist_id):
+        gist = self.gists[gist_id]
+        return {
+            'id': gist_id,
+            'html_url': f"https://gist.example/{gist_id}",
+            'description': gist['description'],
+            'files': {name: {'filename': name, 'content': content, 'truncated': False}
+                      for name, content in gist['files'].items()},
+        }
+
+    def _handle(self, method, path, headers, body):
+        with self.lock:
+            self.requests.append((method, path, headers, body))
+            pending = self.fail.get(method)
+            if pending:
+                return pending.pop(0), {'message': 'injected failure'}, {}
+        if self.on_request:
+            self.on_request(method, path)
+
+        with self.lock:
+            parts = path.strip('/').split('/')
+            if parts == ['gists'] and method == 'POST':
+                gist_id = uuid.uuid4().hex
+                self.gists[gist_id] = {'description': body.get('description', ''),
+                                       'files': {n: f['content'] for n, f in body['files'].items()}}
+                return 201, self._body(gist_id), {'ETag': self.etag(gist_id)}
+            if len(parts) != 2 or parts[0] != 'gists' or parts[1] not in self.gists:
+                return 404, {'message': 'Not Found'}, {}
+
+            gist_id = parts[1]
+            if method == 'GET':
+                etag = self.etag(gist_id)
+                if headers.get('If-None-Match') == etag:
+                    return 304, None, {'ETag': etag}
+                return 200, self._body(gist_id), {'ETag': etag}
+            if method == 'PATCH':
+                gist = self.gists[gist_id]
+                gist['description'] = body.get('description', gist['description'])
+                for name, change in body.get('files', {}).items():
+                    if change is None:
+                        gist['files'].pop(name, None)
+                    else:
+                        gist['files'][name] = change['content']
+                return 200, self._body(gist_id), {'ETag': self.etag(gist_id)}
+            if method == 'DELETE':
+                del self.gists[gist_id]
+                return 204, None, {}
+        return 405, {'message': 'Method not allowed'}, {}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, data, headers = fake._handle(self.command, self.path, dict(self.headers), body)
+                payload = json.dumps(data).encode() if data is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.send_header('X-RateLimit-Remaining', str(fake.rate_remaining))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _reply
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def fake_gist():
+    server = FakeGistServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def app(tmp_path, fake_gist):
+    from flask import Flask
+
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'app.db'}"
+        SCRIPTS_FOLDER = str(tmp_path / 'scripts')
+        SCRIPT_CACHE_FOLDER = str(tmp_path / 'script_cache')
+        GIST_API_URL = fake_gist.url
+        GIST_HTTP_TIMEOUT = (2, 5)
+        GIST_SYNC_DEBOUNCE = 0
+        GIST_SYNC_BACKOFF = 5
+        GIST_SYNC_MAX_ATTEMPTS = 2
+        GIST_RECONCILE_CONCURRENCY = 1
+        GIST_RECONCILE_RATE = 0
+        GIST_RECONCILE_MIN_REMAINING = 50
+
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    db.init_app(app)
+    # Import every model so create_all() makes all tables
+    from models import (api_key, artifact, collection, extraction_result, gist_outbox, lease,  # noqa: F401
+                        migration, pipeline, rule, schedule_change, script, script_version, setting, template)
+    from models.setting import Setting
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Setting(key='github_token', value='test-token'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_script(app):
+    """make_script(name, content, **fields) -> script id, content stored and synced to gist."""
+    from models.script import Script
+    from services.script_store import save_content
+
+    def make(name, content, **fields):
+        with app.app_context():
+            script = Script(name=name, filename=f"{name}.py", sync_to_gist=True, **fields)
+            db.session.add(script)
+            save_content(app, script, content)
+            db.session.commit()
+            return script.id
+
+    return make
@@ -0,0 +1,88 @@
+"""Bulk reconciliation (services.gist_reconcile) against the local fake Gist API."""
+from extensions import db
+from models.script import Script
+from services.gist_reconcile import reconcile
+from services.gist_sync import content_hash
+
+
+def _synced_script(fake_gist, make_script, name, content, remote=None):
+    """A script synced to its gist, which was then edited to hold `remote` (if given)."""
+    gist_id, etag = fake_gist.add_gist(f"{name}.py", content)
+    if remote is not None:
+        fake_gist.gists[gist_id]['files'][f"{name}.py"] = remote
+    return make_script(name, content, gist_id=gist_id, gist_filename=f"{name}.py", gist_etag=etag,
+                       gist_content_hash=content_hash(content)), gist_id
+
+
+def _script(app, script_id):
+    with app.app_context():
+        script = db.session.get(Script, script_id)
+        db.session.expunge(script)
+        return script
+
+
+def test_not_modified_and_same_hash_is_in_sync(app, fake_gist, make_script):
+    _, gist_id = _synced_script(fake_gist, make_script, 'same', 'a = 1\n')
+    summary = reconcile(app)
+    assert summary['counts'] == {'in_sync': 1}
+    assert summary['requests'] == 1
+    ((method, _, headers, _),) = fake_gist.requests
+    assert method == 'GET' and headers.get('If-None-Match') == fake_gist.etag(gist_id)
+
+
+def test_same_remote_content_is_in_sync_and_stores_etag(app, fake_gist, make_script):
+    script_id, gist_id = _synced_script(fake_gist, make_script, 'stale_etag', 'b = 2\n')
+    with app.app_context():
+        db.session.get(Script, script_id).gist_etag = '"outdated"'
+        db.session.commit()
+
+    summary = reconcile(app)
+    assert summary['counts'] == {'in_sync': 1}
+    assert fake_gist.calls('PATCH') == []
+    assert _script(app, script_id).gist_etag == fake_gist.etag(gist_id)
+
+
+def test_drift_is_patched(app, fake_gist, make_script):
+    script_id, gist_id = _synced_script(fake_gist, make_script, 'drifted', 'local\n', remote='edited on github\n')
+    summary = reconcile(app)
+    assert summary['counts'] == {'pushed': 1}
+    assert len(fake_gist.calls('PATCH')) == 1
+    assert fake_gist.gists[gist_id]['files'] == {'drifted.py': 'local\n'}
+    script = _script(app, script_id)
+    assert script.gist_etag == fake_gist.etag(gist_id)
+    assert script.gist_content_hash == content_hash('local\n')
+
+
+def test_deleted_gist_is_recreated(app, fake_gist, make_script):
+    script_id, gist_id = _synced_script(fake_gist, make_script, 'deleted', 'c = 3\n')
+    del fake_gist.gists[gist_id]
+
+    summary = reconcile(app)
+    assert summary['counts'] == {'recreated': 1}
+    assert len(fake_gist.calls('POST')) == 1
+    script = _script(app, script_id)
+    assert script.gist_id != gist_id
+    assert fake_gist.gists[script.gist_id]['files'] == {'deleted.py': 'c = 3\n'}
+
+
+def test_low_rate_limit_stops_pushing(app, fake_gist, make_script):
+    _synced_script(fake_gist, make_script, 'limited_a', 'new\n', remote='old\n')
+    _synced_script(fake_gist, make_script, 'limited_b', 'new\n', remote='old\n')
+    fake_gist.rate_remaining = app.config['GIST_RECONCILE_MIN_REMAINING'] - 1
+
+    summary = reconcile(app)
+    assert summary['counts'] == {'rate_limited': 2}
+    assert len(fake_gist.calls('GET')) == 1  # The second script isn't even checked
+    assert fake_gist.calls('PATCH') == [] and fake_gist.calls('POST') == []
+
+
+def test_dry_run_reports_drift_without_pushing(app, fake_gist, make_script):
+    script_id, gist_id = _synced_script(fake_gist, make_script, 'dry', 'local\n', remote='remote\n')
+    etag = _script(app, script_id).gist_etag
+
+    summary = reconcile(app, dry_run=True)
+    assert summary['counts'] == {'drifted': 1}
+    assert summary['changed'] == [{'script_id': script_id, 'name': 'dry', 'result': 'drifted'}]
+    assert fake_gist.calls('PATCH') == [] and fake_gist.calls('POST') == []
+    assert fake_gist.gists[gist_id]['files'] == {'dry.py': 'remote\n'}
+    assert _script(app, script_id).gist_etag == etag
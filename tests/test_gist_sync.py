@@ -0,0 +1,151 @@
+"""Gist sync outbox (services.gist_sync) against the local fake Gist API."""
+from datetime import datetime, timedelta
+
+from extensions import db
+from models.gist_outbox import GistSyncTask
+from models.script import Script
+from services.gist_sync import _claim, cancel_sync, enqueue_sync, process_due
+from services.script_store import save_content
+
+
+def _enqueue(app, script_id, debounce=None):
+    with app.app_context():
+        if debounce is not None:
+            app.config['GIST_SYNC_DEBOUNCE'] = debounce
+        enqueue_sync(app, script_id)
+        db.session.commit()
+
+
+def _task(app, script_id):
+    with app.app_context():
+        task = db.session.get(GistSyncTask, script_id)
+        return task.to_dict() if task else None
+
+
+def _make_due(app, script_id):
+    with app.app_context():
+        db.session.get(GistSyncTask, script_id).next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+
+def test_creates_gist_then_patches_it(app, fake_gist, make_script):
+    script_id = make_script('report', 'print(1)\n')
+    _enqueue(app, script_id)
+    assert process_due(app) == 1
+    assert len(fake_gist.calls('POST')) == 1
+
+    with app.app_context():
+        script = db.session.get(Script, script_id)
+        assert script.gist_id in fake_gist.gists
+        assert fake_gist.gists[script.gist_id]['files'] == {'report.py': 'print(1)\n'}
+        save_content(app, script, 'print(2)\n')
+        enqueue_sync(app, script_id)
+        db.session.commit()
+        gist_id = script.gist_id
+
+    assert _task(app, script_id) is not None
+    assert process_due(app) == 1
+    assert len(fake_gist.calls('POST')) == 1
+    assert len(fake_gist.calls('PATCH')) == 1
+    assert fake_gist.gists[gist_id]['files'] == {'report.py': 'print(2)\n'}
+    assert _task(app, script_id) is None
+
+
+def test_debounce_coalesces_saves(app, fake_gist, make_script):
+    script_id = make_script('burst', 'v1\n')
+    _enqueue(app, script_id, debounce=60)
+    with app.app_context():
+        script = db.session.get(Script, script_id)
+        for content in ('v2\n', 'v3\n'):
+            save_content(app, script, content)
+            enqueue_sync(app, script_id)
+            db.session.commit()
+
+    assert process_due(app) == 0  # Still inside the debounce window
+    assert fake_gist.requests == []
+
+    _make_due(app, script_id)
+    assert process_due(app) == 1
+    assert len(fake_gist.requests) == 1
+    (gist,) = fake_gist.gists.values()
+    assert gist['files'] == {'burst.py': 'v3\n'}
+
+
+def test_failures_back_off_then_mark_failed(app, fake_gist, make_script):
+    script_id = make_script('flaky', 'x = 1\n')
+    fake_gist.fail['POST'] = [500, 500]
+    _enqueue(app, script_id)
+
+    before = datetime.utcnow()
+    assert process_due(app) == 1
+    task = _task(app, script_id)
+    assert task['status'] == 'pending'
+    assert task['attempts'] == 1
+    assert 'Gist API Error 500' in task['last_error']
+    retry_at = datetime.fromisoformat(task['next_attempt_at'])
+    assert retry_at >= before + timedelta(seconds=app.config['GIST_SYNC_BACKOFF'])
+    assert process_due(app) == 0  # Backing off
+
+    _make_due(app, script_id)
+    assert process_due(app) == 1
+    task = _task(app, script_id)
+    assert task['status'] == 'failed'  # GIST_SYNC_MAX_ATTEMPTS is 2
+    assert task['attempts'] == 2
+
+    _make_due(app, script_id)
+    assert process_due(app) == 0  # Failed rows wait for the next save
+    _enqueue(app, script_id)
+    assert _task(app, script_id)['status'] == 'pending'
+    assert process_due(app) == 1
+    assert len(fake_gist.gists) == 1
+
+
+def test_post_is_not_retried_by_the_transport(app, fake_gist, make_script):
+    script_id = make_script('create_once', 'a = 1\n')
+    fake_gist.fail['POST'] = [502]
+    _enqueue(app, script_id)
+    process_due(app)
+    assert len(fake_gist.calls('POST')) == 1
+    assert fake_gist.gists == {}
+    assert _task(app, script_id)['attempts'] == 1
+
+
+def test_patch_is_retried_by_the_transport(app, fake_gist, make_script):
+    gist_id, _ = fake_gist.add_gist('patched.py', 'old\n')
+    script_id = make_script('patched', 'new\n', gist_id=gist_id, gist_filename='patched.py')
+    fake_gist.fail['PATCH'] = [502]
+    _enqueue(app, script_id)
+    assert process_due(app) == 1
+    assert len(fake_gist.calls('PATCH')) == 2
+    assert fake_gist.gists[gist_id]['files'] == {'patched.py': 'new\n'}
+    assert _task(app, script_id) is None
+
+
+def test_claimed_row_is_skipped_by_other_workers(app, fake_gist, make_script):
+    script_id = make_script('claimed', 'c = 1\n')
+    _enqueue(app, script_id)
+    with app.app_context():
+        now = datetime.utcnow()
+        assert _claim(script_id, now) is True
+        assert _claim(script_id, now) is False  # Second worker loses the race
+
+    assert process_due(app) == 0
+    assert fake_gist.requests == []
+
+
+def test_cancel_during_upload_keeps_gist_fields(app, fake_gist, make_script):
+    script_id = make_script('cancelled', 'c = 2\n')
+    _enqueue(app, script_id)
+
+    def cancel(method, path):
+        with app.app_context():
+            cancel_sync(script_id)
+            db.session.commit()
+
+    fake_gist.on_request = cancel
+    assert process_due(app) == 1
+    with app.app_context():
+        script = db.session.get(Script, script_id)
+        assert script.gist_id in fake_gist.gists
+        assert script.gist_etag
+    assert _task(app, script_id) is None